@@ -0,0 +1,93 @@
+"""
+Compare the classic and jsonpath SQL generators for jsonb filter trees.
+
+The jsonpath generator needs PostgreSQL 12 or later; on older servers only the classic
+generator is timed.
+"""
+import random
+
+from django.db import connection
+
+from grout.lookups import FilterTree, JsonPathFilterTree, JSONPATH_MIN_PG_VERSION
+from jsonb_field_testing.models import JsonBModel
+
+from benchmarks.utils import explain, print_table, time_query
+
+ROW_COUNT = 100000
+
+CAUSES = ['Mistake', 'Road defect', 'Vehicle defect', 'Weather', 'Other']
+SEVERITIES = ['Fatal', 'Injury', 'Property']
+
+FILTERS = (
+    ('containment', {
+        'Details': {'Main cause': {'_rule_type': 'containment', 'contains': ['Weather']}}
+    }),
+    ('containment, many values', {
+        'Details': {'Main cause': {'_rule_type': 'containment', 'contains': CAUSES[:4]}}
+    }),
+    ('containment_multiple', {
+        'Person': {'Injury': {'_rule_type': 'containment_multiple', 'contains': ['Fatal']}}
+    }),
+    ('intrange', {
+        'Details': {'Num vehicles': {'_rule_type': 'intrange', 'min': 2, 'max': 3}}
+    }),
+    ('containment AND intrange', {
+        'Details': {'Main cause': {'_rule_type': 'containment', 'contains': ['Weather']},
+                    'Num vehicles': {'_rule_type': 'intrange', 'min': 2, 'max': 3}}
+    }),
+    ('two containments', {
+        'Details': {'Main cause': {'_rule_type': 'containment', 'contains': ['Weather']},
+                    'Severity': {'_rule_type': 'containment', 'contains': ['Fatal']}}
+    }),
+    ('_or group', {
+        'Details': {'_or': [
+            {'Main cause': {'_rule_type': 'containment', 'contains': ['Weather']}},
+            {'Severity': {'_rule_type': 'containment', 'contains': ['Fatal']}},
+        ]}
+    }),
+)
+
+
+def make_data(rand):
+    return {
+        'Details': {
+            'Main cause': rand.choice(CAUSES),
+            'Severity': rand.choice(SEVERITIES),
+            'Num vehicles': str(rand.randint(1, 6)),
+        },
+        'Person': [{'Injury': rand.choice(SEVERITIES)} for _ in range(rand.randint(0, 3))],
+    }
+
+
+def load_rows():
+    rand = random.Random(0)
+    JsonBModel.objects.all().delete()
+    JsonBModel.objects.bulk_create((JsonBModel(data=make_data(rand)) for _ in range(ROW_COUNT)),
+                                   batch_size=5000)
+    table = JsonBModel._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE INDEX benchmark_data_gin ON {0} USING gin (data)'.format(table))
+        cursor.execute('ANALYZE {0}'.format(table))
+
+
+def run():
+    load_rows()
+
+    generators = [('classic', FilterTree)]
+    if connection.pg_version >= JSONPATH_MIN_PG_VERSION:
+        generators.append(('jsonpath', JsonPathFilterTree))
+    else:
+        print('PostgreSQL {0} does not support jsonpath; only timing the classic '
+              'generator.\n'.format(connection.pg_version))
+
+    table = JsonBModel._meta.db_table
+    rows = []
+    for label, tree in FILTERS:
+        for generator_name, generator in generators:
+            where, params = generator(tree, 'data').sql()
+            sql = 'SELECT count(*) FROM {0} WHERE {1}'.format(table, where)
+            uses_index = 'Bitmap Index Scan' in explain(sql, params)
+            rows.append((label, generator_name, '{0:.1f}'.format(time_query(sql, params)),
+                         'yes' if uses_index else 'no'))
+
+    print_table(('filter', 'generator', 'best ms', 'index scan'), rows)
@@ -0,0 +1,56 @@
+"""
+Compare the size and containment query latency of the jsonb_ops and jsonb_path_ops GIN
+operator classes for Record.data.
+"""
+import random
+
+from django.db import connection
+
+from grout.lookups import FilterTree
+from jsonb_field_testing.models import JsonBModel
+
+from benchmarks.filters import FILTERS, make_data
+from benchmarks.utils import explain, print_table, time_query
+
+ROW_COUNT = 200000
+
+INDEX_NAME = 'benchmark_data_gin'
+
+
+def index_size():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_size_pretty(pg_relation_size(%s::regclass))', [INDEX_NAME])
+        return cursor.fetchone()[0]
+
+
+def run():
+    rand = random.Random(1)
+    JsonBModel.objects.all().delete()
+    JsonBModel.objects.bulk_create((JsonBModel(data=make_data(rand)) for _ in range(ROW_COUNT)),
+                                   batch_size=5000)
+    table = JsonBModel._meta.db_table
+
+    # Only containment filters can use the index with both operator classes.
+    filters = [(label, tree) for label, tree in FILTERS if 'intrange' not in label]
+
+    size_rows = []
+    query_rows = []
+    for opclass in ('jsonb_ops', 'jsonb_path_ops'):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX IF EXISTS {0}'.format(INDEX_NAME))
+            cursor.execute('CREATE INDEX {0} ON {1} USING gin (data {2})'.format(INDEX_NAME,
+                                                                               table,
+                                                                               opclass))
+            cursor.execute('ANALYZE {0}'.format(table))
+        size_rows.append((opclass, index_size()))
+
+        for label, tree in filters:
+            where, params = FilterTree(tree, 'data').sql()
+            sql = 'SELECT count(*) FROM {0} WHERE {1}'.format(table, where)
+            uses_index = 'Bitmap Index Scan' in explain(sql, params)
+            query_rows.append((label, opclass, '{0:.1f}'.format(time_query(sql, params)),
+                               'yes' if uses_index else 'no'))
+
+    print_table(('opclass', 'index size'), size_rows)
+    print('')
+    print_table(('filter', 'opclass', 'best ms', 'index scan'), query_rows)
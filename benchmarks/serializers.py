@@ -0,0 +1,77 @@
+"""
+Compare serializing pages of Records with RecordSerializer, which builds a model instance
+for each Record, with RecordValuesSerializer, which works from rows of values (with or
+without decoding `data`), and with RecordSQLSerializer, which has PostgreSQL build the
+JSON for each page.
+
+All times include running the queries and rendering the page as JSON.
+"""
+import json
+import random
+
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from grout.models import Record, RecordSchema, RecordType
+from grout.renderers import RawJSONRenderer
+from grout.serializers import RecordSerializer, RecordSQLSerializer, RecordValuesSerializer
+
+from benchmarks.filters import make_data
+from benchmarks.utils import print_table, time_call
+
+ROW_COUNT = 20000
+PAGE_SIZES = (10, 100, 1000, 10000)
+
+
+def run():
+    rand = random.Random(1)
+    record_type = RecordType.objects.create(label='Benchmark', plural_label='Benchmarks')
+    schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+    now = timezone.now()
+    Record.objects.bulk_create(
+        (Record(schema=schema, record_type=record_type, data=make_data(rand),
+                occurred_from=now, occurred_to=now,
+                geom=Point(rand.uniform(-180, 180), rand.uniform(-90, 90)))
+         for _ in range(ROW_COUNT)),
+        batch_size=5000)
+
+    queryset = Record.objects.all()
+    renderer = JSONRenderer()
+    raw_renderer = RawJSONRenderer()
+    values_serializer = RecordValuesSerializer()
+    raw_values_serializer = RecordValuesSerializer(raw_json=True)
+    sql_serializer = RecordSQLSerializer()
+
+    def instances(page_size):
+        return renderer.render(RecordSerializer(queryset[:page_size], many=True).data)
+
+    def values(page_size):
+        rows = values_serializer.values(queryset)[:page_size]
+        return renderer.render(values_serializer.to_representation(rows))
+
+    def raw_values(page_size):
+        rows = raw_values_serializer.values(queryset)[:page_size]
+        return raw_renderer.render(raw_values_serializer.to_representation(rows))
+
+    def sql(page_size):
+        page = sql_serializer.values(queryset)[:page_size]
+        return raw_renderer.render(sql_serializer.to_representation(page))
+
+    rows = []
+    for page_size in PAGE_SIZES:
+        expected = instances(page_size)
+        assert values(page_size) == expected
+        # Raw jsonb text is formatted differently, but has to hold the same values.
+        assert json.loads(raw_values(page_size).decode('utf-8')) == json.loads(
+            expected.decode('utf-8'))
+        assert json.loads(sql(page_size).decode('utf-8')) == json.loads(
+            expected.decode('utf-8'))
+
+        slow = time_call(lambda: instances(page_size))
+        times = [time_call(lambda: engine(page_size)) for engine in (values, raw_values, sql)]
+        rows.append([page_size, '{0:.1f}'.format(slow)] +
+                    ['{0:.1f} ({1:.1f}x)'.format(time, slow / time) for time in times])
+
+    print_table(('page size', 'instances ms', 'values ms', 'raw values ms', 'sql ms'), rows)
@@ -0,0 +1,45 @@
+import timeit
+
+from django.db import connection
+
+
+def time_query(sql, params=(), repeat=5):
+    """
+    Run a query `repeat` times and return the fastest run time, in milliseconds.
+    """
+    def execute():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            cursor.fetchall()
+
+    execute()  # Warm up caches before timing.
+    return min(timeit.repeat(execute, number=1, repeat=repeat)) * 1000
+
+
+def time_call(func, repeat=5):
+    """
+    Call a function `repeat` times and return the fastest run time, in milliseconds.
+    """
+    func()  # Warm up caches before timing.
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def explain(sql, params=()):
+    """
+    Return the query plan that PostgreSQL chooses for a query, as a single string.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def print_table(header, rows):
+    """
+    Print rows of results as a plain-text table.
+    """
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    line = '  '.join('{{:<{0}}}'.format(width) for width in widths)
+    print(line.format(*header))
+    print(line.format(*['-' * width for width in widths]))
+    for row in rows:
+        print(line.format(*row))
@@ -9,3 +9,26 @@ class GroutAppConfig(AppConfig):
         # Load custom lookups. This import needs to be performed when the app
         # is ready in order for JSONField to register the custom JSONLookup.
         from grout import lookups
+
+        from django.db.models.signals import post_delete, post_save
+        from grout import result_cache, schema_registry, shards, sync
+
+        # Copy RecordTypes and RecordSchemas to every shard, if Records are sharded.
+        for model in (self.get_model('RecordType'), self.get_model('RecordSchema')):
+            post_save.connect(shards.copy_to_shards, sender=model)
+            post_delete.connect(shards.delete_from_shards, sender=model)
+
+        # Keep cached current schemas, and the validators of RecordTypes, up to date.
+        record_schema = self.get_model('RecordSchema')
+        post_save.connect(schema_registry.invalidate_schema, sender=record_schema)
+        post_delete.connect(schema_registry.invalidate_schema, sender=record_schema)
+        post_save.connect(schema_registry.touch_record_type, sender=record_schema)
+        post_delete.connect(schema_registry.touch_record_type, sender=record_schema)
+
+        # Invalidate cached Record listings when Records change.
+        record = self.get_model('Record')
+        post_save.connect(result_cache.bump_record_generation, sender=record)
+        post_delete.connect(result_cache.bump_record_generation, sender=record)
+
+        # Leave tombstones for deleted Records, for clients that sync changes.
+        post_delete.connect(sync.record_tombstone, sender=record)
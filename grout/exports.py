@@ -0,0 +1,629 @@
+"""
+Export Records as tables, with `data` flattened into a column for each field that the
+RecordSchemas of their RecordType describe: as CSV, streamed in the response, or as a
+GeoPackage or Shapefile, written by a RecordExport job outside of the request cycle.
+
+Each field is read from `data` by PostgreSQL (with `#>>`), so documents are never decoded
+in Python, and rows are read from a server-side cursor and written as they arrive, so
+that exports of any size run in constant memory.
+"""
+import csv
+import datetime
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+import six
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.postgres.aggregates import BoolOr
+from django.core.files import File
+from django.db import connections, transaction
+from django.db.models import (BigIntegerField, BinaryField, BooleanField, F, FloatField, Func,
+                              Q, TextField)
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+from rest_framework.request import Request
+from rest_framework_gis.fields import GeometryField
+
+from grout.indexes import resolve_ref
+from grout.models import RecordExport, RecordSchema, RecordType
+from grout.serializers import RecordSerializer
+
+logger = logging.getLogger(__name__)
+
+# How geometries are written: as WKT in a `geom` column, or as the latitude and longitude
+# of a point on them (the point itself, for Points) in `lat` and `lon` columns.
+WKT = 'wkt'
+LATLON = 'latlon'
+GEOMETRY_FORMATS = (WKT, LATLON)
+# Geometries are written to files as WKB.
+WKB = 'wkb'
+
+
+class JsonbPathText(Func):
+    """
+    The value at `path` (a list of keys) in a `jsonb` expression, as text. Strings are
+    unquoted, and objects and arrays are JSON.
+    """
+    template = '(%(expressions)s #>> %%s)'
+
+    def __init__(self, expression, path, **extra):
+        super(JsonbPathText, self).__init__(expression, output_field=TextField(), **extra)
+        self.path = path
+
+    def as_sql(self, compiler, connection):
+        sql, params = super(JsonbPathText, self).as_sql(compiler, connection)
+        return sql, list(params) + [self.path]
+
+
+# The `jsonb` type, SQL type and model field of the values of each JSON-Schema type that
+# typed tables read as something other than text, and, for numbers, the condition (on
+# the value as `numeric`) that it must meet to be cast without being rounded or going out
+# of the range of the SQL type.
+SCHEMA_TYPE_CASTS = {
+    'integer': ('number', 'bigint', BigIntegerField,
+                '{0} = trunc({0}) AND {0} BETWEEN -9223372036854775808 AND 9223372036854775807'),
+    'number': ('number', 'double precision', FloatField,
+               '({0} = 0 OR abs({0}) BETWEEN 2.2250738585072014e-308 AND 1.7976931348623157e308)'),
+    'boolean': ('boolean', 'boolean', BooleanField, None),
+}
+
+
+class JsonbPathValue(Func):
+    """
+    The value at `path` (a list of keys) in a `jsonb` expression, cast to the SQL type of
+    the JSON-Schema type `schema_type` (which must be in SCHEMA_TYPE_CASTS), or NULL if
+    it's missing, has a different type or can't be cast without being changed.
+    """
+
+    def __init__(self, expression, path, schema_type, **extra):
+        self.json_type, self.cast, output_field, self.guard = SCHEMA_TYPE_CASTS[schema_type]
+        extra.setdefault('output_field', output_field())
+        super(JsonbPathValue, self).__init__(expression, **extra)
+        self.path = path
+        self.schema_type = schema_type
+
+    def value_sql(self, compiler):
+        sql, params = compiler.compile(self.source_expressions[0])
+        params = list(params)
+        text, text_params = '({0} #>> %s)'.format(sql), params + [self.path]
+        if self.guard is None:
+            value, value_params = '{0}::{1}'.format(text, self.cast), text_params
+        else:
+            # Nested, so that the value is only read as a number if it is one.
+            number = text + '::numeric'
+            value = 'CASE WHEN {0} THEN {1}::{2} END'.format(
+                self.guard.format(number), number, self.cast)
+            value_params = text_params * (self.guard.count('{0}') + 1)
+        return ('CASE WHEN jsonb_typeof({0} #> %s) = %s THEN {1} END'.format(sql, value),
+                params + [self.path, self.json_type] + value_params)
+
+    def as_sql(self, compiler, connection):
+        return self.value_sql(compiler)
+
+
+class JsonbPathMismatch(JsonbPathValue):
+    """
+    Whether the value at `path` in a `jsonb` expression is there (and not null), but
+    can't be read as `schema_type` by JsonbPathValue.
+    """
+
+    def __init__(self, expression, path, schema_type, **extra):
+        super(JsonbPathMismatch, self).__init__(expression, path, schema_type,
+                                                output_field=BooleanField(), **extra)
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.source_expressions[0])
+        value, value_params = self.value_sql(compiler)
+        return ("(jsonb_typeof({0} #> %s) <> 'null' AND {1} IS NULL)".format(sql, value),
+                list(params) + [self.path] + value_params)
+
+
+def schema_columns(schema):
+    """
+    List the fields of a JSON-Schema, in the order that they're displayed in (by
+    `propertyOrder`, then by key). Arrays, like forms that a Record can have several of,
+    are a single field.
+
+    Returns:
+        list: Two-tuples of the path to each field and its JSON-Schema type (or None, if
+            it doesn't have one).
+    """
+    columns = []
+    stack = [([], schema)]
+    while stack:
+        path, node = stack.pop()
+        node = resolve_ref(schema, node)
+        if not isinstance(node, dict):
+            continue
+        if node.get('type') == 'object' or 'properties' in node:
+            properties = sorted(node.get('properties', {}).items(),
+                                key=lambda item: (property_order(schema, item[1]), item[0]))
+            for key, child in reversed(properties):
+                stack.append((path + [key], child))
+        elif path:
+            schema_type = node.get('type')
+            if isinstance(schema_type, list):
+                # Like ["integer", "null"].
+                schema_type = next((item for item in schema_type if item != 'null'), None)
+            columns.append((path, schema_type))
+    return columns
+
+
+def property_order(schema, node):
+    # A reference can carry its own `propertyOrder`, next to `$ref`.
+    for candidate in (node, resolve_ref(schema, node)):
+        order = candidate.get('propertyOrder') if isinstance(candidate, dict) else None
+        if isinstance(order, (int, float)):
+            return order
+    return float('inf')
+
+
+def record_type_columns(record_type):
+    """
+    List the fields in every version of a RecordType's schema, like `schema_columns`, with
+    the fields of the current version first.
+    """
+    columns = []
+    seen = set()
+    schemas = RecordSchema.objects.filter(record_type=record_type).order_by('-version')
+    for schema in schemas.values_list('schema', flat=True):
+        for path, schema_type in schema_columns(schema):
+            if tuple(path) not in seen:
+                seen.add(tuple(path))
+                columns.append((path, schema_type))
+    return columns
+
+
+class Echo(object):
+    """
+    A file-like object that returns what's written to it, so that `csv.writer` can
+    write one row at a time to a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def encode_row(row):
+    # Python 2's csv module only writes bytes.
+    if six.PY2:
+        return [value.encode('utf-8') if isinstance(value, six.text_type) else value
+                for value in row]
+    return row
+
+
+class RecordTable(object):
+    """
+    The Records of a queryset as rows of a table, with a column for each field of
+    `serializer_class` (written like the serializer writes it), except for `data`, which
+    has a column for each field in `data_columns` (as returned by `record_type_columns`),
+    and the geometry, which is written in `geometry_format`.
+
+    Values are text, except for numbers, booleans and geometries. A `typed` table also
+    reads the fields of `data` as the types that their schema gives them (see
+    `fall_back_to_text`), and keeps timestamps as datetimes. `types` holds the type of
+    each column: `string`, `integer`, `number`, `boolean`, `timestamp` or `binary`.
+    """
+
+    def __init__(self, serializer_class, data_columns, geometry_format=WKT, typed=False):
+        self.header = []
+        self.types = []
+        # The index of the geometry column, if it's a single column.
+        self.geometry_index = None
+        # The columns to select, and the function (if any) that converts values that
+        # aren't None.
+        self.columns = []
+        self.annotations = {}
+        model = serializer_class.Meta.model
+        for name, field in serializer_class().fields.items():
+            if name == 'data':
+                for index, (path, schema_type) in enumerate(data_columns):
+                    self.header.append('.'.join(path))
+                    if typed and schema_type in SCHEMA_TYPE_CASTS:
+                        expression = JsonbPathValue(field.source, path, schema_type)
+                        self.types.append(schema_type)
+                    else:
+                        expression = JsonbPathText(field.source, path)
+                        self.types.append('string')
+                    self.annotations['data_{0}'.format(index)] = expression
+                    self.columns.append(('data_{0}'.format(index), None))
+            elif isinstance(field, GeometryField) and geometry_format == LATLON:
+                point = Func(Func(F(field.source), function='ST_PointOnSurface'), 4326,
+                             function='ST_Transform')
+                for column, function in (('lat', 'ST_Y'), ('lon', 'ST_X')):
+                    self.header.append(column)
+                    self.types.append('number')
+                    self.annotations[name + '_' + column] = Func(
+                        point, function=function, output_field=FloatField())
+                    self.columns.append((name + '_' + column, None))
+            elif isinstance(field, GeometryField):
+                self.geometry_index = len(self.header)
+                self.header.append(name)
+                if geometry_format == WKB:
+                    self.types.append('binary')
+                    self.annotations[name + '_wkb'] = Func(
+                        F(field.source), function='ST_AsBinary', output_field=BinaryField())
+                    self.columns.append((name + '_wkb', bytes))
+                else:
+                    self.types.append('string')
+                    self.annotations[name + '_wkt'] = Func(
+                        F(field.source), function='ST_AsText', output_field=TextField())
+                    self.columns.append((name + '_wkt', None))
+            else:
+                self.header.append(name)
+                column = field.source
+                convert = field.to_representation
+                column_type = 'string'
+                if isinstance(field, RelatedField):
+                    # Related fields are written as the primary key, which is what the
+                    # foreign key column holds.
+                    column = model._meta.get_field(field.source).attname
+                    convert = six.text_type
+                elif isinstance(field, serializers.BooleanField):
+                    convert = None
+                    column_type = 'boolean'
+                elif typed and isinstance(field, serializers.DateTimeField):
+                    convert = None
+                    column_type = 'timestamp'
+                self.types.append(column_type)
+                self.columns.append((column, convert))
+
+    def fall_back_to_text(self, queryset):
+        """
+        Read the typed fields of `data` that have values (in any of the Records in
+        `queryset`) that their type can't hold, like numbers stored as strings, as text
+        instead, so that no values are lost.
+        """
+        checks = {}
+        for name, _ in self.columns:
+            expression = self.annotations.get(name)
+            if isinstance(expression, JsonbPathValue):
+                source = expression.get_source_expressions()[0]
+                checks[name] = BoolOr(JsonbPathMismatch(source, expression.path,
+                                                        expression.schema_type))
+        if not checks:
+            return
+        mismatches = queryset.order_by().aggregate(**checks)
+        for index, (name, _) in enumerate(self.columns):
+            if mismatches.get(name):
+                expression = self.annotations[name]
+                self.annotations[name] = JsonbPathText(
+                    expression.get_source_expressions()[0], expression.path)
+                self.types[index] = 'string'
+
+    def rows(self, queryset):
+        """
+        Yield a row for each Record in `queryset`, reading them from a server-side cursor.
+        """
+        rows = queryset.annotate(**self.annotations).values_list(
+            *[column for column, _ in self.columns])
+        for row in rows.iterator():
+            yield [value if value is None or convert is None else convert(value)
+                   for (_, convert), value in zip(self.columns, row)]
+
+
+def csv_response(table, queryset, filename):
+    """
+    Stream the rows of `table` for the Records in `queryset` as a CSV file.
+    """
+    writer = csv.writer(Echo())
+    rows = itertools.chain([table.header], table.rows(queryset))
+    response = StreamingHttpResponse((writer.writerow(encode_row(row)) for row in rows),
+                                     content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+
+def filter_records(record_type, query):
+    """
+    Return the Records of `record_type` that match `query`, a dict of Records query
+    parameters, with the same filters as the Records endpoint.
+    """
+    # grout.views imports this module.
+    from grout.views import RecordViewSet
+
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for key, value in query.items():
+        http_request.GET[key] = value
+    http_request.GET['record_type'] = str(record_type.pk)
+    view = RecordViewSet(request=Request(http_request), action='export', format_kwarg=None,
+                         args=(), kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+# The OGR drivers that write each RecordExport file format, and the geometry types that
+# each RecordType geometry type is written as.
+OGR_DRIVERS = {
+    RecordExport.FileFormats.GEOPACKAGE: 'GPKG',
+    RecordExport.FileFormats.SHAPEFILE: 'ESRI Shapefile',
+}
+OGR_GEOMETRY_TYPES = {
+    RecordType.GeometryType.POINT: 'wkbPoint',
+    RecordType.GeometryType.POLYGON: 'wkbPolygon',
+    RecordType.GeometryType.MULTIPOLYGON: 'wkbMultiPolygon',
+    RecordType.GeometryType.LINESTRING: 'wkbLineString',
+    RecordType.GeometryType.NONE: 'wkbNone',
+}
+
+# How many features are written in each transaction, between updates of the progress of
+# an export.
+EXPORT_BATCH_SIZE = 1000
+
+# How long an export can go without a heartbeat (which is sent with each update of its
+# progress, and by a Heartbeat thread in between) before it's assumed that the process
+# running it has died, and another process may claim it, in seconds.
+DEFAULT_EXPORT_TIMEOUT = 600
+
+
+def import_ogr():
+    try:
+        from osgeo import ogr, osr
+    except ImportError:
+        raise ImproperlyConfigured('Exporting files requires the Python bindings for GDAL. '
+                                   'Install them with `pip install grout[exports]`.')
+    ogr.UseExceptions()
+    osr.UseExceptions()
+    return ogr, osr
+
+
+def write_features(export, table, queryset, path):
+    """
+    Write the Records in `queryset` to a new file at `path` with OGR, in batches,
+    recording the progress of `export` after each batch.
+    """
+    ogr, osr = import_ogr()
+    data_source = ogr.GetDriverByName(OGR_DRIVERS[export.file_format]).CreateDataSource(path)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(settings.GROUT['SRID'])
+    if hasattr(srs, 'SetAxisMappingStrategy'):
+        # GDAL 3 would otherwise swap the coordinates of geographic systems.
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    geometry_type = getattr(ogr, OGR_GEOMETRY_TYPES[export.record_type.geometry_type])
+    layer = data_source.CreateLayer(str(slugify(export.record_type.plural_label) or 'records'),
+                                    srs, geometry_type)
+    # Every other column is written as text. Fields are set by index, since formats like
+    # Shapefile shorten their names.
+    indexes = [index for index in range(len(table.header)) if index != table.geometry_index]
+    for index in indexes:
+        layer.CreateField(ogr.FieldDefn(str(table.header[index]), ogr.OFTString))
+
+    written = 0
+    layer.StartTransaction()
+    for row in table.rows(queryset):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        for field_index, index in enumerate(indexes):
+            if row[index] is not None:
+                feature.SetField(field_index, six.text_type(row[index]))
+        if table.geometry_index is not None and row[table.geometry_index] is not None:
+            feature.SetGeometry(ogr.CreateGeometryFromWkb(row[table.geometry_index]))
+        layer.CreateFeature(feature)
+        written += 1
+        if written % EXPORT_BATCH_SIZE == 0:
+            layer.CommitTransaction()
+            record_progress(export, written)
+            layer.StartTransaction()
+    layer.CommitTransaction()
+    # Closes the file.
+    data_source = None
+    return written
+
+
+# The Arrow type of each type of RecordTable column.
+ARROW_TYPES = {
+    'string': 'string',
+    'integer': 'int64',
+    'number': 'float64',
+    'boolean': 'bool_',
+    'binary': 'binary',
+}
+
+# GeoParquet's names for the geometry types of RecordTypes.
+GEOPARQUET_GEOMETRY_TYPES = {
+    RecordType.GeometryType.POINT: ['Point'],
+    RecordType.GeometryType.POLYGON: ['Polygon'],
+    RecordType.GeometryType.MULTIPOLYGON: ['MultiPolygon'],
+    RecordType.GeometryType.LINESTRING: ['LineString'],
+    RecordType.GeometryType.NONE: [],
+}
+
+# How many Records are written in each Arrow record batch (and Parquet row group).
+ARROW_BATCH_SIZE = 65536
+
+
+def import_arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured('Exporting Parquet and Arrow files requires pyarrow. '
+                                   'Install it with `pip install grout[exports]`.')
+    return pyarrow
+
+
+def arrow_schema(export, table):
+    """
+    Return the Arrow schema of the columns of `table`. If geometries are stored in WGS 84,
+    the schema has GeoParquet metadata, so that tools like GeoPandas read them as
+    geometries rather than as WKB.
+    """
+    pyarrow = import_arrow()
+    fields = []
+    for name, column_type in zip(table.header, table.types):
+        if column_type == 'timestamp':
+            fields.append(pyarrow.field(name, pyarrow.timestamp('us', tz='UTC')))
+        else:
+            fields.append(pyarrow.field(name, getattr(pyarrow, ARROW_TYPES[column_type])()))
+    metadata = None
+    if table.geometry_index is not None and settings.GROUT['SRID'] == 4326:
+        geometry_column = table.header[table.geometry_index]
+        metadata = {b'geo': json.dumps({
+            'version': '1.0.0',
+            'primary_column': geometry_column,
+            'columns': {geometry_column: {
+                'encoding': 'WKB',
+                'geometry_types': GEOPARQUET_GEOMETRY_TYPES[export.record_type.geometry_type],
+            }},
+        }).encode('utf-8')}
+    return pyarrow.schema(fields, metadata=metadata)
+
+
+def write_batches(export, table, queryset, path):
+    """
+    Write the Records in `queryset` to a new Parquet or Arrow IPC file at `path`, in
+    record batches, recording the progress of `export` after each batch.
+    """
+    pyarrow = import_arrow()
+    schema = arrow_schema(export, table)
+    if export.file_format == RecordExport.FileFormats.PARQUET:
+        writer = pyarrow.parquet.ParquetWriter(path, schema, compression='snappy')
+
+        def write_batch(batch):
+            # Each batch is a row group.
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+        write_batch = writer.write_batch
+
+    written = 0
+    rows = table.rows(queryset)
+    try:
+        while True:
+            batch = list(itertools.islice(rows, ARROW_BATCH_SIZE))
+            if not batch:
+                break
+            # Transpose the rows into columns.
+            arrays = [pyarrow.array(list(values), type=field.type)
+                      for values, field in zip(zip(*batch), schema)]
+            write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            written += len(batch)
+            record_progress(export, written)
+    finally:
+        writer.close()
+    return written
+
+
+def export_timeout():
+    return settings.GROUT.get('EXPORT_TIMEOUT', DEFAULT_EXPORT_TIMEOUT)
+
+
+def record_progress(export, written):
+    RecordExport.objects.filter(pk=export.pk).update(written=written, heartbeat=timezone.now())
+
+
+def touch_heartbeat(export_id):
+    running = RecordExport.objects.filter(pk=export_id,
+                                          status=RecordExport.StatusTypes.PROCESSING)
+    running.update(heartbeat=timezone.now())
+
+
+class Heartbeat(threading.Thread):
+    """
+    A thread that updates the heartbeat of a RecordExport several times per
+    `EXPORT_TIMEOUT` while it's running, so that steps that don't record progress (like
+    counting the Records, or a slow query before the first batch) can't make it look
+    abandoned.
+    """
+
+    def __init__(self, export):
+        super(Heartbeat, self).__init__(name='grout-export-{0}'.format(export.pk))
+        self.daemon = True
+        self.export_id = export.pk
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(export_timeout() / 3.0):
+                touch_heartbeat(self.export_id)
+        finally:
+            # Close the connection that this thread opened.
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_export(export):
+    """
+    Write the file of a RecordExport, and save it along with the result of the export.
+    Projects that run background tasks (with Celery, for example) can call this from a
+    task; otherwise, the `grout_exports` management command runs pending exports.
+    """
+    export.status = RecordExport.StatusTypes.PROCESSING
+    export.heartbeat = timezone.now()
+    export.save()
+    heartbeat = Heartbeat(export)
+    heartbeat.start()
+    temp_dir = tempfile.mkdtemp()
+    try:
+        queryset = filter_records(export.record_type, export.query)
+        export.total = queryset.count()
+        export.heartbeat = timezone.now()
+        export.save()
+
+        data_columns = record_type_columns(export.record_type)
+        name = slugify(export.record_type.plural_label) or 'records'
+        path = os.path.join(temp_dir, '{0}.{1}'.format(name, export.file_format))
+        if export.file_format in OGR_DRIVERS:
+            table = RecordTable(RecordSerializer, data_columns, WKB)
+            export.written = write_features(export, table, queryset, path)
+        else:
+            table = RecordTable(RecordSerializer, data_columns, WKB, typed=True)
+            table.fall_back_to_text(queryset)
+            export.written = write_batches(export, table, queryset, path)
+
+        if export.file_format == RecordExport.FileFormats.SHAPEFILE:
+            # A Shapefile is several files, which are zipped together.
+            filenames = os.listdir(temp_dir)
+            path = os.path.join(temp_dir, name + '.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for filename in filenames:
+                    archive.write(os.path.join(temp_dir, filename), filename)
+        with open(path, 'rb') as exported:
+            export.file.save(os.path.basename(path), File(exported), save=False)
+        export.status = RecordExport.StatusTypes.COMPLETE
+        export.save()
+    except Exception as e:
+        logger.exception('Export %s failed', export.pk)
+        export.errors = {'message': str(e)}
+        export.status = RecordExport.StatusTypes.ERROR
+        export.save()
+    finally:
+        heartbeat.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def claim_export():
+    """
+    Mark the oldest pending RecordExport as processing and return it, or return None if
+    none are pending. Exports that other processes are claiming are skipped.
+
+    Exports that are processing, but whose heartbeat is older than `EXPORT_TIMEOUT`
+    seconds, are pending again: the process that was running them must have died.
+    """
+    stale = timezone.now() - datetime.timedelta(seconds=export_timeout())
+    abandoned = Q(status=RecordExport.StatusTypes.PROCESSING) & (
+        Q(heartbeat__lt=stale) | Q(heartbeat__isnull=True, modified__lt=stale))
+    with transaction.atomic():
+        export = (RecordExport.objects.select_for_update(skip_locked=True)
+                  .filter(Q(status=RecordExport.StatusTypes.PENDING) | abandoned)
+                  .order_by('created').first())
+        if export is not None:
+            export.status = RecordExport.StatusTypes.PROCESSING
+            export.heartbeat = timezone.now()
+            export.save()
+    return export
@@ -0,0 +1,149 @@
+"""
+Sparse fieldsets for Record responses, for clients (like map views) that only need a few
+fields of each Record.
+
+The `fields` query parameter is a comma-separated list of the top-level fields to return,
+and `data_fields` is a comma-separated list of dotted paths into `data` (like
+`Details.Name`) to return instead of the whole document. The paths are projected in SQL,
+with `jsonb_build_object`, into an object that nests the values at those paths the way
+`data` does, and columns that no requested field reads are deferred, so they're neither
+read nor sent.
+"""
+from collections import OrderedDict
+
+from django.contrib.postgres.fields import JSONField
+from django.db.models import Func
+
+from grout import exceptions
+
+FIELDS_PARAM = 'fields'
+DATA_FIELDS_PARAM = 'data_fields'
+
+# The annotation that holds the projection of `data`.
+PROJECTED_DATA = 'projected_data'
+
+
+class JsonbProjection(Func):
+    """
+    An object built from the values at `paths` in a `jsonb` expression, nested the same
+    way. `paths` is a tree of keys, as returned by `parse_data_fields`. Values that are
+    missing from the expression are null.
+    """
+
+    def __init__(self, expression, paths, **extra):
+        super(JsonbProjection, self).__init__(expression, output_field=JSONField(), **extra)
+        self.paths = paths
+
+    def as_sql(self, compiler, connection):
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        return self.build_object(self.paths, [], column_sql, list(column_params))
+
+    def build_object(self, paths, prefix, column_sql, column_params):
+        pairs = []
+        params = []
+        for key, subpaths in paths.items():
+            path = prefix + [key]
+            if subpaths is None:
+                pairs.append('%s, ({0} #> %s)'.format(column_sql))
+                params.extend([key] + column_params + [path])
+            else:
+                sql, subparams = self.build_object(subpaths, path, column_sql, column_params)
+                pairs.append('%s, ' + sql)
+                params.extend([key] + subparams)
+        return 'jsonb_build_object({0})'.format(', '.join(pairs)), params
+
+
+def parse_fields(value, allowed):
+    """
+    Return the field names in the comma-separated list `value`, in the order of
+    `allowed`, or None if there aren't any.
+    """
+    names = set(name.strip() for name in value.split(',') if name.strip())
+    if not names:
+        return None
+    if not names.issubset(allowed):
+        raise exceptions.QueryParameterException(
+            FIELDS_PARAM, 'a comma-separated list of: ' + ', '.join(allowed))
+    return [name for name in allowed if name in names]
+
+
+def parse_data_fields(value):
+    """
+    Return the comma-separated list of dotted paths in `value` as a tree: an OrderedDict
+    from each key to the tree of the paths below it, or to None if the whole value at
+    that key was requested. Returns None if there aren't any paths.
+    """
+    paths = OrderedDict()
+    for dotted_path in value.split(','):
+        dotted_path = dotted_path.strip()
+        if not dotted_path:
+            continue
+        keys = dotted_path.split('.')
+        if not all(keys):
+            raise exceptions.QueryParameterException(
+                DATA_FIELDS_PARAM, 'a comma-separated list of dotted paths, like a.b,c')
+        node = paths
+        for key in keys[:-1]:
+            node = node.setdefault(key, OrderedDict())
+            if node is None:
+                # The whole value at a shorter path was already requested.
+                break
+        else:
+            node[keys[-1]] = None
+    return paths or None
+
+
+class Fieldset(object):
+    """
+    The fields of `serializer_class` to return (all of them, if `fields` is None), and
+    the tree of paths to project `data` to (the whole of it, if `data_paths` is None).
+    """
+
+    def __init__(self, serializer_class, fields=None, data_paths=None):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.data_paths = data_paths
+        if data_paths is not None and fields is not None and 'data' not in fields:
+            allowed = list(serializer_class().fields)
+            self.fields = [name for name in allowed if name in fields or name == 'data']
+
+    @classmethod
+    def from_query_params(cls, query_params, serializer_class):
+        fields = query_params.get(FIELDS_PARAM)
+        if fields is not None:
+            fields = parse_fields(fields, list(serializer_class().fields))
+        data_paths = query_params.get(DATA_FIELDS_PARAM)
+        if data_paths is not None:
+            data_paths = parse_data_fields(data_paths)
+        return cls(serializer_class, fields, data_paths)
+
+    def serializer_kwargs(self):
+        """
+        Return the arguments that restrict a serializer to this fieldset.
+        """
+        kwargs = {}
+        if self.fields is not None:
+            kwargs['fields'] = self.fields
+        if self.data_paths is not None:
+            kwargs['data_source'] = PROJECTED_DATA
+        return kwargs
+
+    def apply(self, queryset):
+        """
+        Annotate `queryset` with the projection of `data`, if any, and defer the columns
+        that aren't in this fieldset.
+        """
+        if self.data_paths is not None:
+            queryset = queryset.annotate(**{PROJECTED_DATA: JsonbProjection('data',
+                                                                            self.data_paths)})
+        if self.fields is None and self.data_paths is None:
+            return queryset
+        serializer = self.serializer_class(**self.serializer_kwargs())
+        model = queryset.model
+        # The primary key and modification time are always read, for the validators that
+        # ConditionalGetMixin sends.
+        columns = set([model._meta.pk.name, 'modified'])
+        for field in serializer.fields.values():
+            if field.source != PROJECTED_DATA:
+                columns.add(field.source)
+        return queryset.only(*columns)
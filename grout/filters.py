@@ -3,6 +3,7 @@ import django_filters
 
 from django.contrib.gis.geos import GEOSGeometry
 from dateutil.parser import parse
+from psycopg2.extras import DateTimeTZRange
 
 from django.core.exceptions import ImproperlyConfigured
 from django.contrib.gis.db import models as gis_models
@@ -16,6 +17,7 @@ from rest_framework_gis.filterset import GeoFilterSet
 
 from grout import models
 from grout.models import Boundary, BoundaryPolygon, Record, RecordType
+from grout.lookups import normalize_tree
 from grout.exceptions import QueryParameterException, DATETIME_FORMAT_ERROR
 
 
@@ -45,7 +47,7 @@ class RecordFilter(GeoFilterSet):
         e.g. /api/records/?record_type=44a51b83-470f-4e3d-b71b-e3770ec79772
 
         """
-        return queryset.filter(schema__record_type=value)
+        return queryset.filter(record_type=value)
 
     def filter_polygon(self, queryset, field_name, geojson):
         """ Method filter for arbitrary polygon, sent in as geojson.
@@ -100,13 +102,15 @@ class RecordFilter(GeoFilterSet):
             # top of the range is <= the minimum date. For a detailed explanation
             # of why this works, see:
             # https://github.com/azavea/grout/pull/9#discussion_r206903954
-            return queryset.filter(occurred_to__gte=min_date)
+            # Expressing this as an overlap with the `occurred` range lets the query
+            # use its GiST index.
+            return queryset.filter(occurred__overlap=DateTimeTZRange(min_date, None, '[]'))
 
     def filter_occurred_max(self, queryset, field_name, value):
         """Add an upper bound for datetime ranges."""
         if not value:
             # Provide a hardcoded maximum date of 9999AD.
-            min_date = parse('9999-12-31T23:59:59.999999+00:00')
+            max_date = parse('9999-12-31T23:59:59.999999+00:00')
         else:
             try:
                 max_date = parse(value)
@@ -121,7 +125,10 @@ class RecordFilter(GeoFilterSet):
             # bottom of the range is >= the maximum date. For a detailed explanation
             # of why this works, see:
             # https://github.com/azavea/grout/pull/9#discussion_r206903954
-            return queryset.filter(occurred_from__lte=max_date)
+            # The condition on `occurred_from` is implied by the overlap, but lets the
+            # planner prune partitions when Records are partitioned by month.
+            return queryset.filter(occurred__overlap=DateTimeTZRange(None, max_date, '[]'),
+                                   occurred_from__lte=max_date)
 
     class Meta:
         model = Record
@@ -136,7 +143,7 @@ class RecordTypeFilter(django_filters.FilterSet):
     def type_for_record(self, queryset, field_name, record_id):
         """ Filter down to only the record type that corresponds to the given record. """
         record_type_id = Record.objects.filter(pk=record_id).values_list(
-            'schema__record_type_id', flat=True).first()
+            'record_type_id', flat=True).first()
         return queryset.filter(pk=record_type_id)
 
     class Meta:
@@ -213,9 +220,16 @@ class JsonBFilterBackend(BaseFilterBackend):
         except ValueError as e:
             raise ParseError(str(e))
 
-        if isinstance(json_data, dict):
-            queryset = queryset.filter(Q(**{filter_key: json_data}))
-        else:
+        if not isinstance(json_data, dict):
             raise ParseError('Lookup must be an object')
 
+        # The lookup isn't compiled until the queryset is evaluated, so check the
+        # structure of the tree up front in order to report errors as a bad request.
+        try:
+            normalize_tree(json_data)
+        except ValueError as e:
+            raise ParseError(str(e))
+
+        queryset = queryset.filter(Q(**{filter_key: json_data}))
+
         return queryset
@@ -0,0 +1,144 @@
+"""
+FlatGeobuf (https://flatgeobuf.org/) output for Records and BoundaryPolygons.
+
+Files are built by PostGIS, with `ST_AsFlatGeobuf`, and start with a packed Hilbert
+R-tree index of their features. Clients that request byte ranges of a file (see
+`parse_range`) can read just the index and then the features in a bounding box, and
+other clients can draw features as they arrive.
+
+Files are built in memory, rather than streamed. If the `FLATGEOBUF_CACHE` key of the
+`GROUT` setting names a cache, built files are cached by their ETag (see `file_cache`),
+so that the range requests that clients read a file with are served without building it
+again.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from rest_framework.exceptions import NotAcceptable
+
+# The first PostGIS version (in the format of `connection.ops.spatial_version`) with
+# `ST_AsFlatGeobuf`.
+FLATGEOBUF_MIN_POSTGIS_VERSION = (3, 2, 0)
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+DEFAULT_FLATGEOBUF_CACHE_TIMEOUT = 300
+
+FILE_KEY = 'grout:flatgeobuf:{etag}'
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Raised for a `Range` header whose range has no bytes in common with the content.
+    """
+
+
+def file_cache():
+    """
+    Return the cache that holds built FlatGeobuf files, or None if the cache is off.
+    """
+    alias = settings.GROUT.get('FLATGEOBUF_CACHE')
+    return caches[alias] if alias else None
+
+
+def file_cache_timeout():
+    return settings.GROUT.get('FLATGEOBUF_CACHE_TIMEOUT', DEFAULT_FLATGEOBUF_CACHE_TIMEOUT)
+
+
+def cached_flatgeobuf(etag, build):
+    """
+    Return the FlatGeobuf file with the ETag `etag` from the file cache, or build it with
+    `build` (a function that takes no arguments) and cache it, if the cache is on.
+    """
+    cache = file_cache()
+    if cache is None:
+        return build()
+    key = FILE_KEY.format(etag=etag.strip('"'))
+    content = cache.get(key)
+    if content is None:
+        content = build()
+        cache.set(key, content, file_cache_timeout())
+    return content
+
+
+def check_postgis_version(using):
+    if connections[using].ops.spatial_version < FLATGEOBUF_MIN_POSTGIS_VERSION:
+        raise NotAcceptable('FlatGeobuf output requires PostGIS {0} or later.'.format(
+            '.'.join(str(part) for part in FLATGEOBUF_MIN_POSTGIS_VERSION)))
+
+
+def flatgeobuf(queryset, columns, geometry_field='geom'):
+    """
+    Return the objects in `queryset` that have a geometry as a FlatGeobuf file, with a
+    spatial index.
+
+    Args:
+        queryset: The objects to write.
+        columns (list): Two-tuples of the name of each property to write and the model
+            field (or annotation) that it's read from. UUIDs and foreign keys are written
+            as text, since FlatGeobuf has no type for them.
+        geometry_field (str): The name of the geometry field.
+
+    Returns:
+        bytes: The file.
+    """
+    check_postgis_version(queryset.db)
+    quote_name = connections[queryset.db].ops.quote_name
+    opts = queryset.model._meta
+    selected = []
+    select_list = []
+    for name, source in list(columns) + [(geometry_field, geometry_field)]:
+        try:
+            field = opts.get_field(source)
+        except FieldDoesNotExist:
+            # An annotation, which is selected under its own name.
+            selected.append(source)
+            select_list.append('page.{0} AS {1}'.format(quote_name(source), quote_name(name)))
+            continue
+        selected.append(field.attname)
+        column = 'page.' + quote_name(field.column)
+        if field.is_relation or field.get_internal_type() == 'UUIDField':
+            column += '::text'
+        select_list.append('{0} AS {1}'.format(column, quote_name(name)))
+
+    # The index orders the features, so the queryset doesn't need to.
+    rows = queryset.filter(**{geometry_field + '__isnull': False}).order_by().values_list(
+        *selected)
+    sql, params = rows.query.get_compiler(using=rows.db).as_sql()
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute('SELECT ST_AsFlatGeobuf(features, true, %s) '
+                       'FROM (SELECT {0} FROM ({1}) page) features'.format(
+                           ', '.join(select_list), sql), [geometry_field] + list(params))
+        content = cursor.fetchone()[0]
+    return bytes(content) if content is not None else b''
+
+
+def parse_range(header, length):
+    """
+    Return the first and last byte (inclusive) of the single range in the `Range` header
+    `header` of a request for `length` bytes, or None if there's no valid single range,
+    in which case the whole content is sent.
+
+    Raises:
+        RangeNotSatisfiable: If the range starts after the content ends, or is a suffix
+            of no bytes.
+    """
+    match = RANGE_PATTERN.match(header or '')
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # The last `end` bytes.
+        if int(end) == 0:
+            raise RangeNotSatisfiable()
+        start, end = max(length - int(end), 0), length - 1
+    else:
+        if end and int(end) < int(start):
+            return None
+        start, end = int(start), min(int(end), length - 1) if end else length - 1
+    if start >= length:
+        raise RangeNotSatisfiable()
+    return start, end
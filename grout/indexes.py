@@ -0,0 +1,238 @@
+"""
+Propose, create and drop expression indexes on Record.data, based on the fields described
+by current RecordSchemas and, optionally, on a log of the filters that clients send.
+
+The indexed expressions are built by the same functions that grout.lookups uses to
+compile filters, so that the planner can match filters to these indexes exactly.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from django.db import connection
+
+from grout.lookups import GROUP_OPERATORS, intrange_expression, text_expression
+from grout.models import Record, RecordSchema
+from grout.partitions import is_partitioned
+
+# Prefix for the names of indexes managed by this module. Indexes without this prefix
+# are never dropped.
+INDEX_PREFIX = 'grout_idx_'
+
+# Kinds of expression index, mapped to the filter rules that they can serve.
+BTREE = 'btree'  # `intrange` rules
+TRIGRAM = 'trigram'  # text patterns
+
+
+class IndexProposal(namedtuple('IndexProposal', ['kind', 'path', 'uses'])):
+    """
+    An expression index on the value at `path` (a list of keys in Record.data).
+    `uses` is the number of filters in the usage log that the index would serve, or None
+    if no log was provided.
+    """
+    __slots__ = ()
+
+    @property
+    def name(self):
+        digest = hashlib.md5(json.dumps(self.path).encode('utf-8')).hexdigest()[:12]
+        return '{prefix}{kind}_{digest}'.format(prefix=INDEX_PREFIX, kind=self.kind,
+                                                digest=digest)
+
+    def expression(self, cursor):
+        """
+        Render the indexed expression with the same SQL that psycopg2 sends for a filter.
+        """
+        column = Record._meta.get_field('data').column
+        if self.kind == BTREE:
+            template = intrange_expression([column] + self.path)
+        else:
+            template = text_expression([column] + self.path)
+        return cursor.mogrify(template, self.path).decode('utf-8')
+
+    def create_sql(self, cursor, concurrently=True):
+        """
+        Indexes on a partitioned Record table can't be built concurrently, so pass
+        `concurrently=False` for one.
+        """
+        if self.kind == BTREE:
+            indexed = '({0})'.format(self.expression(cursor))
+            method = 'btree'
+        else:
+            indexed = '{0} gin_trgm_ops'.format(self.expression(cursor))
+            method = 'gin'
+        return ('CREATE INDEX {concurrently}IF NOT EXISTS {name} '
+                'ON {table} USING {method} ({indexed})').format(
+            concurrently='CONCURRENTLY ' if concurrently else '', name=self.name,
+            table=Record._meta.db_table, method=method, indexed=indexed)
+
+
+def resolve_ref(schema, node):
+    """
+    Follow a local JSON-Schema reference like `#/definitions/form`.
+    """
+    ref = node.get('$ref') if isinstance(node, dict) else None
+    if not ref or not ref.startswith('#/'):
+        return node
+    for key in ref[2:].split('/'):
+        schema = schema.get(key, {})
+    return schema
+
+
+def schema_fields(schema):
+    """
+    List the fields of a JSON-Schema that can be filtered on with an expression index.
+
+    Fields inside arrays (forms that a Record can have several of) are skipped, since a
+    single expression can't index every element of an array. Fields flagged with
+    `"isSearchable": false` are skipped too.
+
+    Returns:
+        list: Two-tuples of the path to the field and the index kind that serves it.
+    """
+    fields = []
+    stack = [([], schema)]
+    while stack:
+        path, node = stack.pop()
+        node = resolve_ref(schema, node)
+        if not isinstance(node, dict) or node.get('isSearchable') is False:
+            continue
+
+        if node.get('type') == 'object' or 'properties' in node:
+            for key, child in sorted(node.get('properties', {}).items(), reverse=True):
+                stack.append((path + [key], child))
+        elif not path:
+            continue
+        elif node.get('type') == 'integer':
+            fields.append((path, BTREE))
+        elif node.get('type') == 'string' and 'enum' not in node:
+            # Fields with an enum are filtered by containment, which the GIN index on
+            # the whole document serves already.
+            fields.append((path, TRIGRAM))
+    return fields
+
+
+def filter_usage(filter_trees):
+    """
+    Count how many filters use each kind of rule on each path.
+
+    Args:
+        filter_trees (iterable): Filter trees, as sent in the `jsonb` query parameter.
+
+    Returns:
+        dict: Counts keyed by two-tuples of a path (as a tuple) and an index kind.
+    """
+    usage = {}
+    for tree in filter_trees:
+        used = set()
+        stack = [([], tree)]
+        while stack:
+            path, node = stack.pop()
+            if isinstance(node, list):
+                stack.extend((path, subtree) for subtree in node)
+            elif not isinstance(node, dict):
+                continue
+            elif '_rule_type' in node:
+                if node['_rule_type'] == 'intrange':
+                    used.add((tuple(path), BTREE))
+                if node.get('pattern'):
+                    used.add((tuple(path), TRIGRAM))
+            else:
+                for key, child in node.items():
+                    # Group nodes don't add a step to the path of their subtrees.
+                    stack.append((path if key in GROUP_OPERATORS else path + [key], child))
+        for key in used:
+            usage[key] = usage.get(key, 0) + 1
+    return usage
+
+
+def read_usage_log(lines):
+    """
+    Parse a usage log containing one JSON filter tree per line. Blank lines and lines
+    that aren't JSON objects are ignored.
+    """
+    for line in lines:
+        try:
+            tree = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(tree, dict):
+            yield tree
+
+
+def propose_indexes(usage=None, min_uses=1):
+    """
+    Propose expression indexes for the fields of the current schema of every RecordType.
+
+    Args:
+        usage (dict): Output of `filter_usage`. If given, only fields used by at least
+                      `min_uses` filters are proposed.
+        min_uses (int): See `usage`.
+
+    Returns:
+        list: IndexProposal objects, most used first.
+    """
+    candidates = set()
+    for schema in RecordSchema.objects.filter(next_version=None).values_list('schema', flat=True):
+        for path, kind in schema_fields(schema):
+            candidates.add((tuple(path), kind))
+
+    proposals = []
+    for path, kind in sorted(candidates):
+        uses = None
+        if usage is not None:
+            uses = usage.get((path, kind), 0)
+            if uses < min_uses:
+                continue
+        proposals.append(IndexProposal(kind, list(path), uses))
+    return sorted(proposals, key=lambda proposal: -(proposal.uses or 0))
+
+
+def existing_indexes():
+    """
+    Return the names and scan counts of indexes managed by this module. The scans of an
+    index on a partitioned Record table are the sum of the scans of its partitions.
+
+    Returns:
+        dict: Number of scans since statistics were last reset, keyed by index name.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname, COALESCE(s.idx_scan, ('
+                       '    SELECT sum(p.idx_scan) FROM pg_inherits i'
+                       '    JOIN pg_stat_user_indexes p ON p.indexrelid = i.inhrelid'
+                       '    WHERE i.inhparent = c.oid), 0) '
+                       'FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid '
+                       'LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = x.indexrelid '
+                       'WHERE x.indrelid = %s::regclass AND c.relname LIKE %s',
+                       [Record._meta.db_table, INDEX_PREFIX + '%'])
+        return {name: int(scans) for name, scans in cursor.fetchall()}
+
+
+def create_indexes(proposals):
+    """
+    Build the proposed indexes concurrently (unless the Record table is partitioned),
+    skipping any that already exist. This can't run inside of a transaction.
+    """
+    with connection.cursor() as cursor:
+        if any(proposal.kind == TRIGRAM for proposal in proposals):
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        concurrently = not is_partitioned(cursor)
+        for proposal in proposals:
+            cursor.execute(proposal.create_sql(cursor, concurrently))
+
+
+def drop_unused_indexes(keep=()):
+    """
+    Concurrently drop managed indexes that have never been scanned and aren't in `keep`.
+
+    Returns:
+        list: The names of the dropped indexes.
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        concurrently = '' if is_partitioned(cursor) else 'CONCURRENTLY '
+        for name, scans in sorted(existing_indexes().items()):
+            if scans == 0 and name not in keep:
+                cursor.execute('DROP INDEX {concurrently}IF EXISTS {name}'.format(
+                    concurrently=concurrently, name=name))
+                dropped.append(name)
+    return dropped
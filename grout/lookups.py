@@ -2,10 +2,49 @@
 from __future__ import unicode_literals
 import json
 import re
+import threading
+from collections import OrderedDict
 
+import six
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import Lookup
 from django.contrib.postgres.fields import JSONField
 
+# Boolean group nodes that can appear as keys anywhere in a filter tree, mapped to the
+# SQL operator used to combine their subtrees.
+GROUP_OPERATORS = {
+    '_and': 'AND',
+    '_or': 'OR',
+    '_not': 'NOT',
+}
+
+# Rough relative cost of evaluating each kind of predicate. Containment (`@>`) can be
+# answered by the GIN index on the field, while range checks need a cast per row and
+# text patterns need a regex match per row.
+CONTAINMENT_COST = 1
+INTRANGE_COST = 2
+PATTERN_COST = 4
+
+# The first PostgreSQL version (in the format of `connection.pg_version`) that supports
+# SQL/JSON path expressions.
+JSONPATH_MIN_PG_VERSION = 120000
+
+# Jsonpath expressions are evaluated in strict mode (see
+# JsonPathFilterTree.jsonpath_containment_filter).
+JSONPATH_FILTER_PREFIX = 'strict $ ? ('
+
+# Operators that each GIN operator class for jsonb can answer with an index scan.
+GIN_OPCLASS_OPERATORS = {
+    'jsonb_ops': ('@>', '?', '?|', '?&', '@?', '@@'),
+    'jsonb_path_ops': ('@>', '@?', '@@'),
+}
+
+# Default number of compiled filter trees to keep in memory; override with the
+# `FILTER_CACHE_SIZE` key of the `GROUT` setting.
+DEFAULT_FILTER_CACHE_SIZE = 256
+
 
 class FilterTree(object):
     """
@@ -17,9 +56,16 @@ class FilterTree(object):
 
     Check out the jsonb_field_testing test module for some real examples.
     """
+    # Operators emitted by this class that rely on the GIN index of the field.
+    indexed_operators = ('@>',)
+
+    # The first PostgreSQL version (in the format of `connection.pg_version`) that
+    # supports all of the operators emitted by this class.
+    min_pg_version = 0
+
     def __init__(self, tree, field):
         self.field = field  # The JSONField to filter on.
-        self.tree = tree  # The nested dictionary representing the query.
+        self.tree = normalize_tree(tree)  # The nested dictionary representing the query.
 
         # Map the available filter types to their corresponding classmethod.
         self.sql_generators = {
@@ -28,7 +74,16 @@ class FilterTree(object):
             "containment_multiple": self.multiple_containment_filter
         }
 
+        # Estimated relative cost of each filter type, used to order predicates so that
+        # cheap, GIN-indexable containment checks come before casts and regex matches.
+        self.rule_costs = {
+            "intrange": INTRANGE_COST,
+            "containment": CONTAINMENT_COST,
+            "containment_multiple": CONTAINMENT_COST
+        }
+
         self.rules = self.get_rules(self.tree)  # Parse and save the query directive.
+        self.groups = self.get_groups(self.tree)  # Parse and save any boolean groups.
 
     def is_rule(self, obj):
         """
@@ -46,9 +101,18 @@ class FilterTree(object):
             return True
         return False
 
+    @staticmethod
+    def is_group(key):
+        """
+        Check to see if a key introduces a boolean group node (`_and`, `_or` or `_not`)
+        rather than a step in the path to a field.
+        """
+        return key in GROUP_OPERATORS
+
     def get_rules(self, obj, current_path=[]):
         """
-        Recursively crawl a dictionary to look for filtering rules.
+        Crawl a dictionary to look for filtering rules. Rules nested inside of
+        boolean groups are not returned; see `get_groups`.
 
         Args:
             obj (dict): The dictionary to be crawled.
@@ -59,19 +123,59 @@ class FilterTree(object):
                   will be the path to the value in question, while the second
                   element will be the rule to apply for the filter.
         """
-        # If node isn't a rule or dictionary
-        if type(obj) != dict:
-            return []
-
-        # If node is a rule return its location and its details
-        if self.is_rule(obj):
-            return [([self.field] + current_path, obj)]
-
         rules = []
-        for path, val in obj.items():
-            rules = rules + self.get_rules(val, current_path + [path])
+        # Walk the tree depth-first with an explicit stack, so that wide trees
+        # don't repeatedly copy the list of rules found so far.
+        stack = [(obj, current_path)]
+        while stack:
+            node, path = stack.pop()
+
+            # If node isn't a rule or dictionary
+            if not isinstance(node, dict):
+                continue
+
+            # If node is a rule record its location and its details
+            if self.is_rule(node):
+                rules.append(([self.field] + path, node))
+                continue
+
+            children = [(val, path + [key]) for key, val in node.items()
+                        if not self.is_group(key)]
+            stack.extend(reversed(children))
         return rules
 
+    def get_groups(self, obj, current_path=[]):
+        """
+        Crawl a dictionary to look for boolean group nodes.
+
+        A group node is a key of `_and`, `_or` or `_not` mapping to a list of subtrees
+        (`normalize_tree` wraps a single `_not` subtree in a list). The paths in each
+        subtree are relative to the location of the group node.
+
+        Args:
+            obj (dict): The dictionary to be crawled.
+            current_path (list): The branch of the tree leading up to this point.
+
+        Returns:
+            list: A list of three-tuples representing groups: the group operator, the
+                  path to the location of the group, and the list of subtrees it combines.
+        """
+        groups = []
+        stack = [(obj, current_path)]
+        while stack:
+            node, path = stack.pop()
+            if not isinstance(node, dict) or self.is_rule(node):
+                continue
+
+            children = []
+            for key, val in node.items():
+                if self.is_group(key):
+                    groups.append((key, path, val))
+                else:
+                    children.append((val, path + [key]))
+            stack.extend(reversed(children))
+        return groups
+
     @staticmethod
     def split_search_pattern(pattern):
         # Split pattern word by word, but make sure to keep quoted words together
@@ -99,22 +203,75 @@ class FilterTree(object):
             of parameters for compiling that template. (This is the output that
             Django expects for compiling a SQL query.)
         """
+        filter_string, params, cost = self.conjunction_sql(self.rules, self.groups)
+        return (filter_string, tuple(params))
+
+    def node_sql(self, obj, current_path):
+        """
+        Compile the subtree `obj`, located at `current_path`, into a single predicate.
+
+        Returns:
+            tuple: The SQL template, its parameters and its estimated cost.
+        """
+        return self.conjunction_sql(self.get_rules(obj, current_path),
+                                    self.get_groups(obj, current_path))
+
+    def group_sql(self, operator, path, subtrees):
+        """
+        Compile a boolean group node into a single predicate.
+
+        Args:
+            operator (str): The group key; one of `_and`, `_or` or `_not`.
+            path (list): The location of the group node in the tree.
+            subtrees (list): The subtrees combined by the group.
+
+        Returns:
+            tuple: The SQL template, its parameters and its estimated cost, or None if
+                   none of the subtrees produced a predicate.
+        """
+        compiled = [self.node_sql(subtree, path) for subtree in subtrees]
+        compiled = sorted([spec for spec in compiled if spec[0] != ''], key=lambda spec: spec[2])
+        if not compiled:
+            return None
+
+        params = [param for spec in compiled for param in spec[1]]
+        cost = sum(spec[2] for spec in compiled)
+
+        if operator == '_not':
+            # A record that lacks the field entirely makes the inner predicate NULL; it
+            # should still be counted as not matching the negated subtree.
+            inner = ' AND '.join([spec[0] for spec in compiled])
+            return ('(NOT COALESCE(' + inner + ', false))', params, cost)
+
+        joiner = ' {0} '.format(GROUP_OPERATORS[operator])
+        return ('(' + joiner.join([spec[0] for spec in compiled]) + ')', params, cost)
+
+    def conjunction_sql(self, rules, groups):
+        """
+        AND together a set of rules and groups found in the same subtree.
+
+        Rules and groups are ordered by their estimated cost, while text patterns are
+        collected across all of the rules: each pattern must match in at least one field.
+
+        Returns:
+            tuple: The SQL template, its parameters and its estimated cost.
+        """
         rule_specs = []
 
         patterns = {}
         pattern_specs = []
 
-        # It's safe to unpack `self.get_rules` because it can only
+        # It's safe to unpack `rules` because `self.get_rules` can only
         # return A) an empty list or B) a list of two-tuples with two elements in
         # them (the path and the rule for each query directive).
-        for path, rule in self.rules:
+        for path, rule in rules:
             # Don't parse if this is not a properly registered rule type.
             if not self.is_rule(rule):
                 pass
             rule_type = rule['_rule_type']
             sql_tuple = self.sql_generators[rule_type](path, rule)
             if sql_tuple is not None:
-                rule_specs.append(sql_tuple)
+                rule_specs.append(sql_tuple + (self.rule_costs[rule_type],))
 
             # The check on 'pattern' here allows us to apply a pattern filter on top of others
             if 'pattern' in rule:
@@ -124,6 +281,15 @@ class FilterTree(object):
                     # add to the list of rules generated for this pattern (one per field)
                     patterns.setdefault(pattern, []).append(sql_tuple)
 
+        rule_specs = self.combine_rule_specs(rule_specs)
+
+        for operator, path, subtrees in groups:
+            group_spec = self.group_sql(operator, path, subtrees)
+            if group_spec is not None:
+                rule_specs.append(group_spec)
+
+        # `sorted` is stable, so predicates of equal cost keep their original order.
+        rule_specs = sorted(rule_specs, key=lambda spec: spec[2])
         rule_string = ' AND '.join([rule[0] for rule in rule_specs])
 
         pattern_rules = patterns.values()
@@ -150,8 +316,17 @@ class FilterTree(object):
         rule_paths = [item for sublist in rule_paths_first
                       for item in sublist]
 
-        outcome = (filter_string, tuple(rule_paths))
-        return outcome
+        cost = (sum(spec[2] for spec in rule_specs) +
+                PATTERN_COST * len(pattern_specs))
+        return (filter_string, rule_paths, cost)
+
+    def combine_rule_specs(self, rule_specs):
+        """
+        Hook for subclasses to merge the predicates generated for the rules of a single
+        conjunction before they are ANDed together. Each element of `rule_specs` is a
+        tuple of the SQL template, its parameters and its estimated cost.
+        """
+        return rule_specs
 
     # Filters
     @classmethod
@@ -259,7 +434,7 @@ class FilterTree(object):
                    with the containment query in the first position and the
                    parameters in the second.
         """
-        traversed_int = "(" + extract_value_at_path(path) + ")::int"
+        traversed_int = intrange_expression(path)
         has_min = 'min' in rule and rule['min'] is not None
         has_max = 'max' in rule and rule['max'] is not None
 
@@ -316,9 +491,9 @@ class FilterTree(object):
             return None
 
         if path_multiple:
-            traversed_text = "(" + extract_value_at_path(path[:-1]) + ")"
+            traversed_text = text_expression(path[:-1])
         else:
-            traversed_text = "(" + extract_value_at_path(path) + ")"
+            traversed_text = text_expression(path)
 
         sql_template = ("{traversed_text}::text ~* %s"
                         .format(traversed_text=traversed_text))
@@ -331,11 +506,157 @@ class FilterTree(object):
             return (sql_template, path[1:] + [re.escape(pattern)])
 
 
+class JsonPathFilterTree(FilterTree):
+    """
+    A FilterTree that compiles containment rules into SQL/JSON path expressions, which
+    are available in PostgreSQL 12 and later. All of the containment rules ANDed
+    together in a subtree are evaluated by a single `<field> @? <jsonpath>` predicate,
+    which can be answered by a GIN index on the field using either the `jsonb_ops` or the
+    `jsonb_path_ops` operator class.
+
+    Range rules, text patterns and containment rules for non-scalar values are compiled
+    the same way as by FilterTree. A GIN index can't answer range comparisons anyway, and
+    this keeps their expressions identical to the ones indexed by grout.indexes.
+    """
+    indexed_operators = ('@>', '@?')
+    min_pg_version = JSONPATH_MIN_PG_VERSION
+
+    def combine_rule_specs(self, rule_specs):
+        """
+        Merge every jsonpath predicate in `rule_specs` into one predicate.
+        """
+        template = jsonpath_template(self.field)
+        jsonpath_specs = [spec for spec in rule_specs if spec[0] == template]
+        if len(jsonpath_specs) < 2:
+            return rule_specs
+
+        conditions = [jsonpath_condition(spec[1][0]) for spec in jsonpath_specs]
+        combined = (template,
+                    [jsonpath_filter(' && '.join(conditions))],
+                    min(spec[2] for spec in jsonpath_specs))
+        return [combined] + [spec for spec in rule_specs if spec[0] != template]
+
+    @classmethod
+    def containment_filter(cls, path, rule):
+        """
+        Filter for objects where the value at `path` equals one of the scalars in the
+        rule, or is an array that contains every value of one of the lists in the rule.
+
+        Registered on the 'containment' rule type.
+        """
+        return cls.jsonpath_containment_filter(path, rule, None, jsonpath_accessor(path[1:]),
+                                               super(JsonPathFilterTree, cls).containment_filter)
+
+    @classmethod
+    def multiple_containment_filter(cls, path, rule):
+        """
+        Filter for objects where any of the objects in the list that contains the
+        final key in `path` matches one of the values in the rule.
+
+        Registered on the 'containment_multiple' rule type.
+        """
+        branch = path[1:]
+        fallback = super(JsonPathFilterTree, cls).multiple_containment_filter
+        if len(branch) < 2:
+            # There's no list to search (see reconstruct_object_multiple).
+            return cls.jsonpath_containment_filter(path, rule, None, jsonpath_accessor(branch),
+                                                   fallback)
+        return cls.jsonpath_containment_filter(path, rule, jsonpath_accessor(branch[:-1]),
+                                               jsonpath_accessor(branch[-1:]), fallback)
+
+    @classmethod
+    def jsonpath_containment_filter(cls, path, rule, list_accessor, accessor, fallback):
+        """
+        Build a containment predicate on the values found by `accessor` (in any element
+        of the array found by `list_accessor`, if it isn't None), or defer to the classic
+        `fallback` generator if the rule contains values that can't be compared in a
+        jsonpath expression.
+
+        Expressions are evaluated in strict mode, so that they match the same documents
+        as `@>` does: arrays are only searched where `@>` would search them, rather than
+        wherever they're found along the path, as they would be in lax mode.
+        """
+        all_contained = rule.get('contains')
+        if not all_contained:
+            return None
+
+        alternatives = []
+        for contained in all_contained:
+            values = contained if isinstance(contained, list) else [contained]
+            if not values or not all(is_jsonpath_scalar(value) for value in values):
+                return fallback(path, rule)
+            if isinstance(contained, list):
+                # A list of values matches arrays which contain every one of the values.
+                condition = ' && '.join(['exists(@' + accessor + '[*] ? (@ == ' +
+                                         jsonpath_literal(value) + '))' for value in values])
+            else:
+                condition = '@' + accessor + ' == ' + jsonpath_literal(contained)
+            if list_accessor is not None:
+                condition = 'exists(@' + list_accessor + '[*] ? (' + condition + '))'
+            alternatives.append(condition)
+
+        condition = ' || '.join(['(' + alternative + ')' for alternative in alternatives])
+        return (jsonpath_template(path[0]), [jsonpath_filter(condition)])
+
+
 # Utility functions
+def jsonpath_template(field):
+    return field + ' @? %s'
+
+
+def jsonpath_filter(condition):
+    """
+    Build a jsonpath expression that matches documents satisfying `condition`.
+    """
+    return JSONPATH_FILTER_PREFIX + condition + ')'
+
+
+def jsonpath_condition(expression):
+    """
+    Extract the condition from an expression built by `jsonpath_filter`.
+    """
+    return '(' + expression[len(JSONPATH_FILTER_PREFIX):-1] + ')'
+
+
+def jsonpath_accessor(path):
+    """
+    Build the chain of member accessors for a list of keys, like '."a"."b"'.
+    """
+    return ''.join(['.' + jsonpath_literal(key) for key in path])
+
+
+def jsonpath_literal(value):
+    """
+    Format a scalar value as a jsonpath literal. Jsonpath string escapes are a
+    superset of JSON's, so JSON encoding produces valid literals.
+    """
+    return json.dumps(value, ensure_ascii=False)
+
+
+def is_jsonpath_scalar(value):
+    return value is None or isinstance(value, six.string_types + six.integer_types + (float, bool))
+
+
 def extract_value_at_path(path):
     return operator_at_traversal_path(path, '->>')
 
 
+# The expressions below are shared with grout.indexes, so that the expression indexes it
+# builds match the filters generated here exactly.
+def intrange_expression(path):
+    """
+    The expression compared against the boundaries of an `intrange` rule.
+    """
+    return "(" + extract_value_at_path(path) + ")::int"
+
+
+def text_expression(path):
+    """
+    The expression matched against text patterns.
+    """
+    return "(" + extract_value_at_path(path) + ")"
+
+
 # N.B. This only returns useful query snippets if the parent path
 # exists. That is, if you try to query "a"->"b"?"c" but your objects don't have a
 # "b" key, you will always get zero rows back, whereas if they do have a "b" key, then
@@ -384,6 +705,240 @@ def reconstruct_object_multiple(path):
         return '{{%s: {recons}}}'.format(recons=reconstruct_object_multiple(path[1:]))
 
 
+def canonical_json(obj):
+    """
+    Serialize a JSON-like object with sorted keys, so that equal objects always produce
+    equal strings.
+    """
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+
+def unique(values):
+    """
+    Remove duplicate JSON values from a list, keeping the first occurrence of each.
+    """
+    seen = set()
+    result = []
+    for value in values:
+        key = canonical_json(value)
+        if key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
+
+
+def normalize_tree(tree):
+    """
+    Convert a filter tree into its canonical form: keys are sorted, duplicate values
+    and subtrees are removed, `_not` always holds a list of subtrees, and the subtrees of
+    `_and` groups are merged into their parent wherever they don't conflict with it
+    (intersecting any ranges that apply to the same path). Subtrees with text patterns
+    aren't merged into a parent that has text patterns of its own, since each pattern
+    only has to match one of the fields of the tree it's in.
+
+    Raises:
+        ValueError: If a boolean group node is malformed.
+    """
+    if not isinstance(tree, dict):
+        return tree
+
+    if '_rule_type' in tree:
+        return normalize_rule(tree)
+
+    node = {}
+    conjuncts = []
+    for key, val in tree.items():
+        if key == '_not' and isinstance(val, dict):
+            val = [val]
+        if key in GROUP_OPERATORS:
+            if not isinstance(val, list) or not all(isinstance(sub, dict) for sub in val):
+                raise ValueError('Value of {0} must be a list of objects'.format(key))
+            subtrees = unique([normalize_tree(subtree) for subtree in val])
+            if key == '_and':
+                conjuncts = subtrees
+            elif subtrees:
+                node[key] = subtrees
+        else:
+            node[key] = normalize_tree(val)
+
+    # An `_and` group is equivalent to its parent node with each subtree merged in.
+    residual = []
+    for subtree in conjuncts:
+        if has_patterns(node) and has_patterns(subtree):
+            merged = None
+        else:
+            merged = merge_trees(node, subtree)
+        if merged is None:
+            residual.append(subtree)
+        else:
+            node = merged
+    if residual:
+        node['_and'] = residual
+
+    return OrderedDict(sorted(node.items()))
+
+
+def has_patterns(tree):
+    """
+    Return whether any of the rules of a filter tree, outside of its boolean groups, has
+    a text pattern.
+    """
+    for key, val in tree.items():
+        if key in GROUP_OPERATORS or not isinstance(val, dict):
+            continue
+        if ('pattern' in val) if '_rule_type' in val else has_patterns(val):
+            return True
+    return False
+
+
+def normalize_rule(rule):
+    """
+    Convert a filter rule into its canonical form.
+    """
+    rule = OrderedDict(sorted(rule.items()))
+    if isinstance(rule.get('contains'), list):
+        rule['contains'] = unique(rule['contains'])
+    return rule
+
+
+def merge_trees(target, source):
+    """
+    Merge the normalized filter tree `source` into `target` such that the result matches
+    the objects that match both trees.
+
+    Returns:
+        dict: The merged tree, or None if the trees can't be merged into a single tree.
+    """
+    result = OrderedDict(target)
+    for key, val in source.items():
+        if key not in result:
+            result[key] = val
+            continue
+
+        existing = result[key]
+        if key in GROUP_OPERATORS or not (isinstance(existing, dict) and isinstance(val, dict)):
+            return None
+        elif '_rule_type' in existing and '_rule_type' in val:
+            merged = merge_rules(existing, val)
+        elif '_rule_type' not in existing and '_rule_type' not in val:
+            merged = merge_trees(existing, val)
+        else:
+            merged = None
+
+        if merged is None:
+            return None
+        result[key] = merged
+    return OrderedDict(sorted(result.items()))
+
+
+def merge_rules(first, second):
+    """
+    Combine two rules that apply to the same path into a single equivalent rule.
+
+    Returns:
+        dict: The merged rule, or None if the rules can't be represented by a single rule.
+    """
+    if canonical_json(first) == canonical_json(second):
+        return first
+
+    is_range = (first['_rule_type'] == second['_rule_type'] == 'intrange' and
+                'pattern' not in first and 'pattern' not in second)
+    if not is_range:
+        return None
+
+    minimums = [rule['min'] for rule in (first, second) if rule.get('min') is not None]
+    maximums = [rule['max'] for rule in (first, second) if rule.get('max') is not None]
+    return normalize_rule({
+        '_rule_type': 'intrange',
+        'min': max(minimums) if minimums else None,
+        'max': min(maximums) if maximums else None,
+    })
+
+
+class LRUCache(object):
+    """
+    A small thread-safe mapping that discards its least recently used entries once it
+    holds more than `maxsize` of them.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return None
+            # Re-insert the entry to mark it as the most recently used.
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+compiled_filter_cache = LRUCache(settings.GROUT.get('FILTER_CACHE_SIZE',
+                                                    DEFAULT_FILTER_CACHE_SIZE))
+
+
+def jsonb_index_opclass():
+    """
+    Return the GIN operator class used to index jsonb fields, as configured by the
+    `JSONB_INDEX_OPCLASS` key of the `GROUT` setting.
+    """
+    opclass = settings.GROUT.get('JSONB_INDEX_OPCLASS', 'jsonb_ops')
+    if opclass not in GIN_OPCLASS_OPERATORS:
+        raise ImproperlyConfigured('GROUT["JSONB_INDEX_OPCLASS"] must be one of: ' +
+                                   ', '.join(sorted(GIN_OPCLASS_OPERATORS)))
+    return opclass
+
+
+def filter_tree_class(connection):
+    """
+    Choose the SQL generator for a database connection: the most capable generator
+    that the server supports and whose operators the configured index can answer.
+    """
+    pg_version = connection.pg_version if connection is not None else 0
+    supported_operators = GIN_OPCLASS_OPERATORS[jsonb_index_opclass()]
+    for tree_class in (JsonPathFilterTree, FilterTree):
+        if (pg_version >= tree_class.min_pg_version and
+                set(tree_class.indexed_operators) <= set(supported_operators)):
+            return tree_class
+    return FilterTree
+
+
+def compile_filter_tree(tree, field, connection=None):
+    """
+    Compile a filter tree into SQL for the given field, reusing the result of any
+    previous compilation of an equivalent tree.
+
+    Returns:
+        tuple: The SQL template and a tuple of its parameters.
+    """
+    tree_class = filter_tree_class(connection)
+    normalized = normalize_tree(tree)
+    key = (tree_class.__name__, field, canonical_json(normalized))
+
+    compiled = compiled_filter_cache.get(key)
+    if compiled is None:
+        compiled = tree_class(normalized, field).sql()
+        compiled_filter_cache.set(key, compiled)
+    return compiled
+
+
 @JSONField.register_lookup
 class JSONLookup(Lookup):
     """
@@ -408,4 +963,4 @@ class JSONLookup(Lookup):
         # and revert it back to a Python dict for tree parsing.
         tree = rhs_params[0].adapted
 
-        return FilterTree(tree, field).sql()
+        return compile_filter_tree(tree, field, connection)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from grout import exports
+
+
+class Command(BaseCommand):
+    help = ('Run pending Record exports. Several of these commands can run at once, and '
+            'each export is only run by one of them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep waiting for new exports instead of exiting once '
+                                 'none are pending.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='With --loop, how many seconds to wait between checks for '
+                                 'new exports. Defaults to 5.')
+
+    def handle(self, *args, **options):
+        while True:
+            export = exports.claim_export()
+            if export is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            self.stdout.write('Exporting {0}'.format(export.pk))
+            exports.run_export(export)
+            self.stdout.write('{0}: {1}'.format(export.pk, export.status))
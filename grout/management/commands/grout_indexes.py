@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from grout import indexes
+from grout.partitions import is_partitioned
+
+
+class Command(BaseCommand):
+    help = ('Propose expression indexes on Record.data for the fields of current '
+            'RecordSchemas, and optionally create them or drop unused ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usage-log',
+                            help='File of JSON filter trees (one per line) sent in the '
+                                 '`jsonb` query parameter. Only fields used by these '
+                                 'filters are proposed.')
+        parser.add_argument('--min-uses', type=int, default=1,
+                            help='Minimum number of filters in the usage log that must use '
+                                 'a field for it to be proposed. Defaults to 1.')
+        parser.add_argument('--create', action='store_true',
+                            help='Build the proposed indexes concurrently.')
+        parser.add_argument('--drop-unused', action='store_true',
+                            help='Concurrently drop indexes built by this command that '
+                                 'are not proposed and have never been scanned.')
+
+    def handle(self, *args, **options):
+        usage = None
+        if options['usage_log']:
+            try:
+                with open(options['usage_log']) as usage_log:
+                    usage = indexes.filter_usage(indexes.read_usage_log(usage_log))
+            except IOError as e:
+                raise CommandError(str(e))
+
+        proposals = indexes.propose_indexes(usage, options['min_uses'])
+        existing = indexes.existing_indexes()
+
+        if not proposals:
+            self.stdout.write('No expression indexes to propose.')
+        with connection.cursor() as cursor:
+            concurrently = not is_partitioned(cursor)
+            for proposal in proposals:
+                status = 'exists' if proposal.name in existing else 'proposed'
+                uses = '' if proposal.uses is None else ' ({0} uses)'.format(proposal.uses)
+                self.stdout.write('[{status}] {path}{uses}\n    {sql};'.format(
+                    status=status, path=' -> '.join(proposal.path), uses=uses,
+                    sql=proposal.create_sql(cursor, concurrently)))
+
+        if options['create']:
+            missing = [proposal for proposal in proposals if proposal.name not in existing]
+            indexes.create_indexes(missing)
+            self.stdout.write(self.style.SUCCESS('Created {0} index(es).'.format(len(missing))))
+
+        if options['drop_unused']:
+            dropped = indexes.drop_unused_indexes(keep=[proposal.name for proposal in proposals])
+            for name in dropped:
+                self.stdout.write('Dropped {0}'.format(name))
+            self.stdout.write(self.style.SUCCESS('Dropped {0} index(es).'.format(len(dropped))))
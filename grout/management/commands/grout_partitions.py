@@ -0,0 +1,50 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from grout import partitions
+
+
+class Command(BaseCommand):
+    help = ('List the partitions of the Record table, and optionally create partitions '
+            'for upcoming months and for Records waiting in the default partition.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partition', action='store_true',
+                            help='Partition the Record table, if it isn\'t partitioned yet. '
+                                 'Records can\'t be read or written until this finishes.')
+        parser.add_argument('--create', action='store_true',
+                            help='Create missing partitions, moving their Records out of '
+                                 'the default partition.')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='When partitioning by month, the number of months after '
+                                 'the current one to create partitions for. Defaults to 3.')
+
+    def handle(self, *args, **options):
+        strategy = partitions.partition_strategy()
+        with connection.cursor() as cursor:
+            if (options['partition'] and strategy is not None and
+                    not partitions.is_partitioned(cursor)):
+                partitions.check_pg_version(connection)
+                try:
+                    with transaction.atomic():
+                        partitions.partition_table(cursor, strategy, options['months_ahead'])
+                except ImproperlyConfigured as e:
+                    raise CommandError(str(e))
+                self.stdout.write(self.style.SUCCESS('Partitioned the Record table.'))
+
+            if strategy is None or not partitions.is_partitioned(cursor):
+                raise CommandError('The Record table is not partitioned. Set '
+                                   'GROUT["PARTITION_RECORDS"] and run migrations first.')
+
+            if options['create']:
+                with transaction.atomic():
+                    created = partitions.maintain_partitions(cursor, strategy,
+                                                             options['months_ahead'])
+                for name in created:
+                    self.stdout.write('Created {0}'.format(name))
+                self.stdout.write(self.style.SUCCESS(
+                    'Created {0} partition(s).'.format(len(created))))
+
+            for name, bounds in partitions.list_partitions(cursor):
+                self.stdout.write('{name}: {bounds}'.format(name=name, bounds=bounds))
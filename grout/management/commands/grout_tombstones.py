@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from grout import sync
+
+
+class Command(BaseCommand):
+    help = ('Delete the tombstones of Records that were deleted before the oldest sync '
+            'token that clients can still use (see GROUT["SYNC_TOKEN_MAX_AGE"]).')
+
+    def handle(self, *args, **options):
+        pruned = sync.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS('Deleted {0} tombstone(s).'.format(pruned)))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from grout.lookups import jsonb_index_opclass
+
+
+DEFAULT_INDEX = 'grout_record_data_gin'
+PATH_OPS_INDEX = 'grout_record_data_gin_path_ops'
+
+create_index_sql = ('CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} '
+                    'ON grout_record USING gin(data {opclass})')
+drop_index_sql = 'DROP INDEX CONCURRENTLY IF EXISTS {index_name}'
+
+
+def use_path_ops_index(apps, schema_editor):
+    """
+    Replace the default GIN index on Record.data with a smaller jsonb_path_ops index, if
+    the project has opted in to it with the JSONB_INDEX_OPCLASS setting.
+    """
+    if jsonb_index_opclass() != 'jsonb_path_ops':
+        return
+    # Build the new index before dropping the old one, so that filters never go without
+    # an index.
+    schema_editor.execute(create_index_sql.format(index_name=PATH_OPS_INDEX,
+                                                  opclass='jsonb_path_ops'))
+    schema_editor.execute(drop_index_sql.format(index_name=DEFAULT_INDEX))
+
+
+def use_default_index(apps, schema_editor):
+    schema_editor.execute(create_index_sql.format(index_name=DEFAULT_INDEX, opclass=''))
+    schema_editor.execute(drop_index_sql.format(index_name=PATH_OPS_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    # Indexes can only be built concurrently outside of a transaction.
+    atomic = False
+
+    dependencies = [
+        ('grout', '0025_auto_20180730_2038'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_path_ops_index, use_default_index),
+    ]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.ranges
+from django.conf import settings
+from django.db import migrations
+
+
+OCCURRED_INDEX = 'grout_record_occurred_gist'
+SPACETIME_INDEX = 'grout_record_geom_occurred_gist'
+
+create_trigger_sql = """
+CREATE OR REPLACE FUNCTION grout_record_set_occurred() RETURNS trigger AS $$
+BEGIN
+    IF NEW.occurred_from IS NULL OR NEW.occurred_to IS NULL THEN
+        NEW.occurred := NULL;
+    ELSE
+        NEW.occurred := tstzrange(NEW.occurred_from, NEW.occurred_to, '[]');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER grout_record_set_occurred
+    BEFORE INSERT OR UPDATE OF occurred_from, occurred_to ON grout_record
+    FOR EACH ROW EXECUTE PROCEDURE grout_record_set_occurred();
+"""
+
+drop_trigger_sql = """
+DROP TRIGGER IF EXISTS grout_record_set_occurred ON grout_record;
+DROP FUNCTION IF EXISTS grout_record_set_occurred();
+"""
+
+backfill_sql = """
+UPDATE grout_record SET occurred = tstzrange(occurred_from, occurred_to, '[]')
+WHERE occurred_from IS NOT NULL AND occurred_to IS NOT NULL
+"""
+
+create_index_sql = ('CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} '
+                    'ON grout_record USING gist({columns})')
+drop_index_sql = 'DROP INDEX CONCURRENTLY IF EXISTS {index_name}'
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Index the occurred range and, if the project has opted in to it with the
+    SPACETIME_INDEX setting, the combination of the geometry and the occurred range.
+    """
+    schema_editor.execute(create_index_sql.format(index_name=OCCURRED_INDEX,
+                                                  columns='occurred'))
+    if settings.GROUT.get('SPACETIME_INDEX', False):
+        schema_editor.execute(create_index_sql.format(index_name=SPACETIME_INDEX,
+                                                      columns='geom, occurred'))
+
+
+def drop_indexes(apps, schema_editor):
+    schema_editor.execute(drop_index_sql.format(index_name=SPACETIME_INDEX))
+    schema_editor.execute(drop_index_sql.format(index_name=OCCURRED_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    # Indexes can only be built concurrently outside of a transaction.
+    atomic = False
+
+    dependencies = [
+        ('grout', '0026_record_data_gin_path_ops'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='occurred',
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(create_trigger_sql, drop_trigger_sql),
+        migrations.RunSQL(backfill_sql, migrations.RunSQL.noop),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
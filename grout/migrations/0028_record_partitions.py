@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from grout.partitions import MONTH, PARTITION_KEYS, migrate, unmigrate
+
+
+def partition_records(apps, schema_editor):
+    """
+    Partition the Record table by month, if the project has opted in to it with the
+    PARTITION_RECORDS setting and the table is empty. Partitioning by RecordType waits
+    for `Record.record_type`, in migration 0037.
+    """
+    migrate(schema_editor.connection, [MONTH])
+
+
+def unpartition_records(apps, schema_editor):
+    unmigrate(schema_editor.connection, PARTITION_KEYS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0027_record_occurred'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_records, unpartition_records),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BATCH_SIZE = 10000
+
+backfill_sql = """
+UPDATE grout_record r SET record_type_id = s.record_type_id
+FROM grout_recordschema s
+WHERE r.schema_id = s.uuid AND r.uuid IN (
+    SELECT uuid FROM grout_record WHERE record_type_id IS NULL LIMIT %s
+)
+"""
+
+
+def backfill_record_type(apps, schema_editor):
+    """
+    Copy the RecordType of each Record's schema onto the Record, in batches that each
+    commit separately so that large tables aren't locked for the whole backfill.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(backfill_sql, [BATCH_SIZE])
+            if cursor.rowcount < BATCH_SIZE:
+                break
+
+
+class Migration(migrations.Migration):
+
+    # Run each batch of the backfill in its own transaction.
+    atomic = False
+
+    dependencies = [
+        ('grout', '0028_record_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='record_type',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='grout.RecordType'),
+        ),
+        migrations.RunPython(backfill_record_type, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='record',
+            name='record_type',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='grout.RecordType'),
+        ),
+    ]
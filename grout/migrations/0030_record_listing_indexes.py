@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from grout.partitions import is_partitioned
+
+
+# Indexes that serve the default listing of Records (newest first, usually limited to
+# Records that aren't archived and to a single RecordType) without sorting.
+LISTING_INDEXES = (
+    ('grout_record_active_created', '(created DESC) WHERE archived = false'),
+    ('grout_record_type_active_created', '(record_type_id, created DESC) WHERE archived = false'),
+    ('grout_record_type_created', '(record_type_id, created DESC)'),
+)
+
+create_index_sql = 'CREATE INDEX {concurrently}IF NOT EXISTS {index_name} ON grout_record {columns}'
+drop_index_sql = 'DROP INDEX {concurrently}IF EXISTS {index_name}'
+
+
+def concurrently(schema_editor):
+    # Indexes on a partitioned table can't be built or dropped concurrently.
+    with schema_editor.connection.cursor() as cursor:
+        return '' if is_partitioned(cursor) else 'CONCURRENTLY '
+
+
+def create_listing_indexes(apps, schema_editor):
+    option = concurrently(schema_editor)
+    for index_name, columns in LISTING_INDEXES:
+        schema_editor.execute(create_index_sql.format(concurrently=option,
+                                                      index_name=index_name, columns=columns))
+
+
+def drop_listing_indexes(apps, schema_editor):
+    option = concurrently(schema_editor)
+    for index_name, _ in LISTING_INDEXES:
+        schema_editor.execute(drop_index_sql.format(concurrently=option, index_name=index_name))
+
+
+class Migration(migrations.Migration):
+
+    # Indexes can only be built concurrently outside of a transaction.
+    atomic = False
+
+    dependencies = [
+        ('grout', '0029_record_record_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_listing_indexes, drop_listing_indexes),
+    ]
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from grout.partitions import (RECORD_TABLE, change_trigger_sql, is_partitioned,
+                              list_partitions)
+
+
+BATCH_SIZE = 10000
+
+CHANGE_INDEX = 'grout_record_change_txid'
+
+create_function_sql = """
+CREATE OR REPLACE FUNCTION grout_set_change_txid() RETURNS trigger AS $$
+BEGIN
+    -- Rows that are copied into a new table (when partitioning it, for example) already
+    -- have a transaction ID, and keep it so that they don't look changed.
+    IF TG_OP = 'UPDATE' OR NEW.change_txid IS NULL THEN
+        NEW.change_txid := txid_current();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+drop_function_sql = 'DROP FUNCTION IF EXISTS grout_set_change_txid()'
+
+create_tombstone_trigger_sql = ('CREATE TRIGGER grout_recordtombstone_set_change_txid '
+                                'BEFORE INSERT OR UPDATE ON grout_recordtombstone '
+                                'FOR EACH ROW EXECUTE PROCEDURE grout_set_change_txid()')
+
+drop_tombstone_trigger_sql = ('DROP TRIGGER IF EXISTS grout_recordtombstone_set_change_txid '
+                              'ON grout_recordtombstone')
+
+drop_record_trigger_sql = 'DROP TRIGGER IF EXISTS grout_record_set_change_txid ON {table}'
+
+backfill_sql = """
+UPDATE grout_record SET change_txid = txid_current()
+WHERE uuid IN (SELECT uuid FROM grout_record WHERE change_txid IS NULL LIMIT %s)
+"""
+
+create_index_sql = ('CREATE INDEX {concurrently}IF NOT EXISTS {index_name} '
+                    'ON grout_record (change_txid, uuid)')
+drop_index_sql = 'DROP INDEX {concurrently}IF EXISTS {index_name}'
+
+
+def trigger_tables(cursor):
+    """
+    Return the tables that need the Record trigger: row triggers can't be defined on a
+    partitioned table, so a partitioned Record table needs it on every partition.
+    """
+    if is_partitioned(cursor):
+        return [name for name, _ in list_partitions(cursor)]
+    return [RECORD_TABLE]
+
+
+def create_record_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in trigger_tables(cursor):
+            cursor.execute(change_trigger_sql.format(table=table))
+
+
+def drop_record_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in trigger_tables(cursor):
+            cursor.execute(drop_record_trigger_sql.format(table=table))
+
+
+def backfill_change_txid(apps, schema_editor):
+    """
+    Stamp existing Records, in batches that each commit separately so that large tables
+    aren't locked for the whole backfill.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            cursor.execute(backfill_sql, [BATCH_SIZE])
+            if cursor.rowcount < BATCH_SIZE:
+                break
+
+
+def concurrently(schema_editor):
+    # Indexes on a partitioned table can't be built or dropped concurrently.
+    with schema_editor.connection.cursor() as cursor:
+        return '' if is_partitioned(cursor) else 'CONCURRENTLY '
+
+
+def create_change_index(apps, schema_editor):
+    schema_editor.execute(create_index_sql.format(concurrently=concurrently(schema_editor),
+                                                  index_name=CHANGE_INDEX))
+
+
+def drop_change_index(apps, schema_editor):
+    schema_editor.execute(drop_index_sql.format(concurrently=concurrently(schema_editor),
+                                                index_name=CHANGE_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    # Run each batch of the backfill in its own transaction, and build the index
+    # concurrently.
+    atomic = False
+
+    dependencies = [
+        ('grout', '0030_record_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordTombstone',
+            fields=[
+                ('uuid', models.UUIDField(primary_key=True, serialize=False)),
+                ('record_type', models.UUIDField()),
+                ('deleted', models.DateTimeField(auto_now=True)),
+                ('change_txid', models.BigIntegerField(editable=False, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recordtombstone',
+            index=models.Index(fields=['change_txid', 'uuid'], name='grout_tombstone_change_txid'),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunSQL(create_function_sql, drop_function_sql),
+        migrations.RunSQL(create_tombstone_trigger_sql, drop_tombstone_trigger_sql),
+        migrations.RunPython(create_record_triggers, drop_record_triggers),
+        migrations.RunPython(backfill_change_txid, migrations.RunPython.noop),
+        migrations.RunPython(create_change_index, drop_change_index),
+    ]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Notify listeners (see grout.notifications) of changes to Records and Boundaries. These
+# are AFTER triggers, which (unlike BEFORE triggers) a partitioned Record table passes on
+# to its partitions.
+create_triggers_sql = """
+CREATE OR REPLACE FUNCTION grout_notify_record() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('grout_records', OLD.record_type_id::text);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('grout_records', NEW.record_type_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION grout_notify_boundary() RETURNS trigger AS $$
+DECLARE
+    changed record;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    IF TG_TABLE_NAME = 'grout_boundary' THEN
+        PERFORM pg_notify('grout_boundaries', changed.uuid::text);
+    ELSIF changed.boundary_id IS NOT NULL THEN
+        PERFORM pg_notify('grout_boundaries', changed.boundary_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER grout_record_notify
+    AFTER INSERT OR UPDATE OR DELETE ON grout_record
+    FOR EACH ROW EXECUTE PROCEDURE grout_notify_record();
+
+CREATE TRIGGER grout_boundary_notify
+    AFTER INSERT OR UPDATE OR DELETE ON grout_boundary
+    FOR EACH ROW EXECUTE PROCEDURE grout_notify_boundary();
+
+CREATE TRIGGER grout_boundarypolygon_notify
+    AFTER INSERT OR UPDATE OR DELETE ON grout_boundarypolygon
+    FOR EACH ROW EXECUTE PROCEDURE grout_notify_boundary();
+"""
+
+drop_triggers_sql = """
+DROP TRIGGER IF EXISTS grout_boundarypolygon_notify ON grout_boundarypolygon;
+DROP TRIGGER IF EXISTS grout_boundary_notify ON grout_boundary;
+DROP TRIGGER IF EXISTS grout_record_notify ON grout_record;
+DROP FUNCTION IF EXISTS grout_notify_boundary();
+DROP FUNCTION IF EXISTS grout_notify_record();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0031_record_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunSQL(create_triggers_sql, drop_triggers_sql),
+    ]
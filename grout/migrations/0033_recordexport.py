@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0032_notify_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordExport',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('query', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict)),
+                ('file_format', models.CharField(choices=[('gpkg', 'GeoPackage'), ('shp', 'Shapefile')], default='gpkg', max_length=4)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('ERROR', 'Error'), ('COMPLETE', 'Complete')], default='PENDING', max_length=10)),
+                ('total', models.PositiveIntegerField(blank=True, null=True)),
+                ('written', models.PositiveIntegerField(default=0)),
+                ('errors', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, upload_to='exports/%Y/%m/%d')),
+                ('record_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='grout.RecordType')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0033_recordexport'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recordexport',
+            name='file_format',
+            field=models.CharField(choices=[('gpkg', 'GeoPackage'), ('shp', 'Shapefile'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], default='gpkg', max_length=8),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0034_recordexport_columnar_formats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recordtombstone',
+            name='deleted',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddIndex(
+            model_name='recordtombstone',
+            index=models.Index(fields=['deleted'], name='grout_tombstone_deleted'),
+        ),
+    ]
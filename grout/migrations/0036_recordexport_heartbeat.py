@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0035_recordtombstone_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recordexport',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from grout.partitions import RECORD_TYPE, migrate, unmigrate
+
+
+def partition_records(apps, schema_editor):
+    """
+    Partition the Record table by RecordType, if the project has opted in to it with the
+    PARTITION_RECORDS setting and the table is empty.
+    """
+    migrate(schema_editor.connection, [RECORD_TYPE])
+
+
+def unpartition_records(apps, schema_editor):
+    unmigrate(schema_editor.connection, [RECORD_TYPE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grout', '0036_recordexport_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_records, unpartition_records),
+    ]
@@ -5,13 +5,15 @@ import uuid
 from django.conf import settings
 from django.contrib.gis.db import models
 from django.contrib.gis.gdal import DataSource as GDALDataSource
-from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields import DateTimeRangeField, JSONField
 from django.core.validators import MinLengthValidator
+from psycopg2.extras import DateTimeTZRange
 from rest_framework import serializers
 
 import jsonschema
 import jsonschema.exceptions
 
+from grout import schema_registry, shards
 from grout.imports.shapefile import (extract_zip_to_temp_dir,
                                      get_shapefiles_in_dir,
                                      make_multipolygon)
@@ -59,8 +61,7 @@ class RecordType(GroutModel):
     temporal = models.BooleanField(default=True)
 
     def get_current_schema(self):
-        schemas = self.schemas.order_by('-version')
-        return schemas[0] if len(schemas) > 0 else None
+        return schema_registry.get_current_schema(self.pk)
 
 
 class RecordSchema(GroutModel):
@@ -103,12 +104,21 @@ class Record(GroutModel):
     schema defined by a certain RecordSchema.
     """
     schema = models.ForeignKey('RecordSchema', on_delete=models.CASCADE)
+    # The RecordType of `schema`, stored on the Record so that filtering by RecordType
+    # doesn't need a join.
+    record_type = models.ForeignKey('RecordType', on_delete=models.CASCADE, editable=False)
     data = JSONField(blank=True)  # `blank` lets us store empty dicts ({}).
     archived = models.BooleanField(default=False)
     occurred_from = models.DateTimeField(null=True, blank=True)
     occurred_to = models.DateTimeField(null=True, blank=True)
+    # The inclusive range between `occurred_from` and `occurred_to`, maintained by a
+    # database trigger so that date range filters can use a GiST index.
+    occurred = DateTimeRangeField(null=True, blank=True, editable=False)
     geom = models.GeometryField(srid=settings.GROUT['SRID'], null=True, blank=True)
     location_text = models.CharField(max_length=200, null=True, blank=True)
+    # The ID of the transaction that last changed the Record, set by a database trigger
+    # for the change feed in grout.sync.
+    change_txid = models.BigIntegerField(null=True, editable=False)
 
     class Meta(object):
         ordering = ('-created',)
@@ -121,7 +131,7 @@ class Record(GroutModel):
         :return: None if schema validates; otherwise, returns an error dict in the
                  format {'geom': '<error message>'}
         """
-        expected_geotype = self.schema.record_type.get_geometry_type_display()
+        expected_geotype = self.record_type.get_geometry_type_display()
 
         if self.geom:
             incoming_geotype = self.geom.geom_type
@@ -131,7 +141,7 @@ class Record(GroutModel):
         if incoming_geotype != expected_geotype:
             return {'geom': GEOMETRY_TYPE_ERROR.format(incoming=incoming_geotype,
                                                        expected=expected_geotype,
-                                                       uuid=self.schema.record_type.uuid)}
+                                                       uuid=self.record_type.uuid)}
         else:
             return None
 
@@ -145,7 +155,7 @@ class Record(GroutModel):
                  format {'occurred_from': '<error_message>', 'occurred_to': '<error_message>'}
         """
         errors = {}
-        datetime_required = self.schema.record_type.temporal
+        datetime_required = self.record_type.temporal
 
         if datetime_required:
             if self.occurred_from is None or self.occurred_to is None:
@@ -153,11 +163,11 @@ class Record(GroutModel):
                 # Record.
                 if self.occurred_from is None:
                     errors['occurred_from'] = DATETIME_REQUIRED.format(
-                        uuid=self.schema.record_type.uuid
+                        uuid=self.record_type.uuid
                     )
                 if self.occurred_to is None:
                     errors['occurred_to'] = DATETIME_REQUIRED.format(
-                        uuid=self.schema.record_type.uuid
+                        uuid=self.record_type.uuid
                     )
             else:
                 # `occurred_from` cannot be a later date than `occurred_to`.
@@ -171,11 +181,11 @@ class Record(GroutModel):
         else:
             if self.occurred_from is not None:
                 errors['occurred_from'] = DATETIME_NOT_PERMITTED.format(
-                    uuid=self.schema.record_type.uuid
+                    uuid=self.record_type.uuid
                 )
             if self.occurred_to is not None:
                 errors['occurred_to'] = DATETIME_NOT_PERMITTED.format(
-                    uuid=self.schema.record_type.uuid
+                    uuid=self.record_type.uuid
                 )
 
         if errors.keys():
@@ -205,6 +215,11 @@ class Record(GroutModel):
         """
         errors = {}
 
+        # Keep the RecordType in step with the schema, which changes when a Record moves
+        # to a new schema version.
+        if self.record_type_id != self.schema.record_type_id:
+            self.record_type = self.schema.record_type
+
         # Make sure that incoming geometry matches the geometry_type of the
         # RecordType for this Record.
         geom_error = self.clean_geom()
@@ -233,9 +248,83 @@ class Record(GroutModel):
         Extend the model's save method to run custom field validators.
         """
         self.clean()
+        # The database trigger sets the same value; mirror it so that the instance stays
+        # in sync without being reloaded.
+        if self.occurred_from is None or self.occurred_to is None:
+            self.occurred = None
+        else:
+            self.occurred = DateTimeTZRange(self.occurred_from, self.occurred_to, '[]')
+        if shards.is_sharded():
+            # Records always live in the shard of their RecordType.
+            kwargs['using'] = shards.shard_for_record_type(self.record_type_id)
         return super(Record, self).save(*args, **kwargs)
 
 
+class RecordTombstone(models.Model):
+    """
+    Marks a deleted Record, so that the change feed in grout.sync can report the deletion.
+    """
+    uuid = models.UUIDField(primary_key=True)
+    # Not a foreign key, since tombstones outlive the RecordTypes of their Records.
+    record_type = models.UUIDField()
+    deleted = models.DateTimeField(auto_now_add=True)
+    # Set by a database trigger, like `Record.change_txid`.
+    change_txid = models.BigIntegerField(null=True, editable=False)
+
+    class Meta(object):
+        indexes = [
+            models.Index(fields=['change_txid', 'uuid'], name='grout_tombstone_change_txid'),
+            models.Index(fields=['deleted'], name='grout_tombstone_deleted'),
+        ]
+
+
+class RecordExport(GroutModel):
+    """
+    A job that exports the Records of a RecordType that match the Records query parameters
+    in `query` to a file, which grout.exports writes outside of the request cycle.
+    """
+
+    class StatusTypes(object):
+        PENDING = 'PENDING'
+        PROCESSING = 'PROCESSING'
+        ERROR = 'ERROR'
+        COMPLETE = 'COMPLETE'
+        CHOICES = (
+            (PENDING, 'Pending'),
+            (PROCESSING, 'Processing'),
+            (ERROR, 'Error'),
+            (COMPLETE, 'Complete'),
+        )
+
+    class FileFormats(object):
+        GEOPACKAGE = 'gpkg'
+        SHAPEFILE = 'shp'
+        PARQUET = 'parquet'
+        ARROW = 'arrow'
+        CHOICES = (
+            (GEOPACKAGE, 'GeoPackage'),
+            (SHAPEFILE, 'Shapefile'),
+            (PARQUET, 'Parquet'),
+            (ARROW, 'Arrow IPC'),
+        )
+
+    record_type = models.ForeignKey('RecordType', on_delete=models.CASCADE)
+    query = JSONField(default=dict, blank=True)
+    file_format = models.CharField(max_length=8, choices=FileFormats.CHOICES,
+                                   default=FileFormats.GEOPACKAGE)
+    status = models.CharField(max_length=10,
+                              choices=StatusTypes.CHOICES,
+                              default=StatusTypes.PENDING)
+    # The number of Records to export, once the job has started, and the number written.
+    total = models.PositiveIntegerField(null=True, blank=True)
+    written = models.PositiveIntegerField(default=0)
+    errors = JSONField(blank=True, null=True)
+    # When the process running the export last reported progress (see
+    # grout.exports.claim_export).
+    heartbeat = models.DateTimeField(null=True, blank=True, editable=False)
+    file = models.FileField(upload_to='exports/%Y/%m/%d', blank=True)
+
+
 class Boundary(GroutModel):
     """ MultiPolygon objects which contain related geometries for filtering/querying """
 
@@ -0,0 +1,189 @@
+"""
+Notifications of changes to Records and Boundaries, so that clients can wait for a change
+instead of polling for one.
+
+Database triggers send a NOTIFY on the `grout_records` channel with the UUID of the
+RecordType of every Record that's written or deleted, and on the `grout_boundaries`
+channel with the UUID of every Boundary that's written or deleted (or whose polygons
+are). PostgreSQL folds identical notifications sent by one transaction, so a bulk update
+sends one notification per RecordType, and delivers them when the transaction commits.
+
+Each process runs a thread per database that stores Records, which LISTENs on its own
+connection and remembers when it last heard about each RecordType and Boundary. Requests
+that wait for changes wait on those threads, rather than holding connections of their
+own. Times are compared across processes, so their clocks should be synchronized.
+"""
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+RECORDS_CHANNEL = 'grout_records'
+BOUNDARIES_CHANNEL = 'grout_boundaries'
+CHANNELS = (RECORDS_CHANNEL, BOUNDARIES_CHANNEL)
+
+DEFAULT_WAIT_SECONDS = 25
+MAX_WAIT_SECONDS = 60
+
+# How long a listener waits for notifications before checking that its connection is
+# still alive, and how long it waits before reconnecting after losing it.
+KEEPALIVE_SECONDS = 30
+RECONNECT_SECONDS = 5
+
+# Guards the state below, and is notified whenever it changes.
+condition = threading.Condition()
+# When each listener last heard about each changed key on each channel: a dict from
+# (channel, key) to a timestamp. The key None stands for any key on the channel.
+changes = {}
+# The listener for each database alias.
+listeners = {}
+
+
+class Listener(threading.Thread):
+    """
+    A thread that LISTENs for notifications from one database.
+    """
+
+    def __init__(self, using):
+        super(Listener, self).__init__(name='grout-listener-{0}'.format(using))
+        self.daemon = True
+        self.using = using
+        # When the listener started listening on its current connection, or None while it
+        # isn't connected. It may have missed notifications sent before then.
+        self.listening_since = None
+        self.stopping = False
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+    def connect(self):
+        connection = psycopg2.connect(**connections[self.using].get_connection_params())
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            for channel in CHANNELS:
+                cursor.execute('LISTEN {0}'.format(channel))
+        return connection
+
+    def run(self):
+        while not self.stopping:
+            try:
+                connection = self.connect()
+            except psycopg2.Error:
+                logger.exception('Could not listen for changes in database %s', self.using)
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            with condition:
+                self.listening_since = time.time()
+                condition.notify_all()
+            try:
+                self.listen(connection)
+            except psycopg2.Error:
+                logger.exception('Stopped listening for changes in database %s', self.using)
+            finally:
+                with condition:
+                    self.listening_since = None
+                connection.close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+    def listen(self, connection):
+        while not self.stopping:
+            ready, _, _ = select.select([connection, self.wakeup_read], [], [],
+                                        KEEPALIVE_SECONDS)
+            if not ready:
+                # Notifications that arrive while this runs are read along with it.
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            elif connection in ready:
+                connection.poll()
+            if not connection.notifies:
+                continue
+            received = time.time()
+            with condition:
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    changes[(notify.channel, notify.payload)] = received
+                    changes[(notify.channel, None)] = received
+                condition.notify_all()
+
+    def stop(self):
+        self.stopping = True
+        os.write(self.wakeup_write, b'x')
+
+
+def start_listeners(aliases):
+    """
+    Start listening to every database in `aliases` that isn't being listened to yet.
+    """
+    with condition:
+        for alias in aliases:
+            if alias not in listeners or not listeners[alias].is_alive():
+                listeners[alias] = Listener(alias)
+                listeners[alias].start()
+
+
+def stop_listeners():
+    with condition:
+        stopping = list(listeners.values())
+        listeners.clear()
+    for listener in stopping:
+        listener.stop()
+        listener.join()
+
+
+def wait_for_listeners(aliases, deadline):
+    """
+    Wait until the listeners for `aliases` are connected, or until the time `deadline`.
+    Must be called with `condition` held.
+    """
+    while any(listeners[alias].listening_since is None for alias in aliases):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        condition.wait(remaining)
+    return True
+
+
+def changed_since(aliases, channel, key, since):
+    """
+    Return whether `key` (or, if it's None, anything) on `channel` may have changed in
+    any database in `aliases` since the timestamp `since`. Must be called with
+    `condition` held.
+    """
+    for alias in aliases:
+        listening_since = listeners[alias].listening_since
+        if listening_since is None or listening_since > since:
+            return True
+    return changes.get((channel, key), 0) > since
+
+
+def wait_for_change(channel, key=None, since=None, timeout=DEFAULT_WAIT_SECONDS,
+                    aliases=(DEFAULT_DB_ALIAS,)):
+    """
+    Wait up to `timeout` seconds for a change to `key` (or, if it's None, to anything) on
+    `channel` after `since` (by default, now).
+
+    Returns:
+        tuple: Whether anything changed, and the time at which that was checked, to use
+            as `since` the next time.
+    """
+    deadline = time.time() + timeout
+    start_listeners(aliases)
+    with condition:
+        # Give new listeners a chance to connect, so that a client that hasn't waited
+        # before doesn't hear about changes that the listeners missed.
+        wait_for_listeners(aliases, deadline)
+        if since is None:
+            since = time.time()
+        while not changed_since(aliases, channel, key, since):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            condition.wait(remaining)
+        return changed_since(aliases, channel, key, since), time.time()
@@ -0,0 +1,351 @@
+"""
+Optional declarative partitioning of the Record table.
+
+When the `PARTITION_RECORDS` key of the `GROUT` setting is `'month'`, Records are
+partitioned by the month of `occurred_from`; when it is `'record_type'`, they are
+partitioned by `record_type_id`, so that the Records of each RecordType are stored apart
+from those of every other type. Records that don't belong in any partition (nontemporal
+Records, or Records for a month or RecordType that has no partition yet) are kept in a
+default partition until `maintain_partitions` moves them out.
+
+A partitioned table can't have a primary key that leaves out the partition key, so the
+primary key on `uuid` is enforced per partition rather than across the whole table. UUIDs
+are generated by Grout (`uuid` is read-only in the API), so they can only collide if
+Records are written to the table some other way.
+
+The functions here take a cursor so that they can run from migrations as well as from the
+`grout_partitions` management command.
+"""
+import datetime
+import sys
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# The first PostgreSQL version (in the format of `connection.pg_version`) with default
+# partitions, foreign keys on partitioned tables and indexes that cascade to partitions.
+PARTITION_MIN_PG_VERSION = 110000
+
+MONTH = 'month'
+RECORD_TYPE = 'record_type'
+
+# The partition key for each strategy, and the SQL predicate selecting the rows for a
+# single partition, which takes the same parameters as the partition bounds.
+PARTITION_KEYS = {
+    MONTH: ('RANGE (occurred_from)', 'occurred_from >= %s AND occurred_from < %s'),
+    RECORD_TYPE: ('LIST (record_type_id)', 'record_type_id = %s'),
+}
+
+RECORD_TABLE = 'grout_record'
+RECORD_TYPE_TABLE = 'grout_recordtype'
+DEFAULT_PARTITION = RECORD_TABLE + '_default'
+
+# The trigger that keeps `occurred` in sync with `occurred_from` and `occurred_to`. Row
+# triggers can't be defined on a partitioned table before PostgreSQL 13, so it has to be
+# created on every partition.
+occurred_trigger_sql = ('CREATE TRIGGER grout_record_set_occurred '
+                        'BEFORE INSERT OR UPDATE OF occurred_from, occurred_to ON {table} '
+                        'FOR EACH ROW EXECUTE PROCEDURE grout_record_set_occurred()')
+
+# The trigger that stamps Records with the transaction that last changed them, for
+# grout.sync. Its function is created by a later migration than the one that first
+# partitions the table, so it's only created once that function exists.
+CHANGE_TRIGGER_FUNCTION = 'grout_set_change_txid'
+change_trigger_sql = ('CREATE TRIGGER grout_record_set_change_txid '
+                      'BEFORE INSERT OR UPDATE ON {table} '
+                      'FOR EACH ROW EXECUTE PROCEDURE grout_set_change_txid()')
+
+# The trigger that notifies listeners (see grout.notifications) of changes to Records.
+# It's an AFTER trigger, which a partitioned table passes on to its partitions, so it's
+# only created on the Record table itself.
+NOTIFY_TRIGGER_FUNCTION = 'grout_notify_record'
+notify_trigger_sql = ('CREATE TRIGGER grout_record_notify '
+                      'AFTER INSERT OR UPDATE OR DELETE ON {table} '
+                      'FOR EACH ROW EXECUTE PROCEDURE grout_notify_record()')
+
+
+def partition_strategy():
+    """
+    Return the partitioning strategy configured by the `PARTITION_RECORDS` key of the
+    `GROUT` setting, or None if Records shouldn't be partitioned.
+    """
+    strategy = settings.GROUT.get('PARTITION_RECORDS')
+    if strategy is not None and strategy not in PARTITION_KEYS:
+        raise ImproperlyConfigured('GROUT["PARTITION_RECORDS"] must be one of: ' +
+                                   ', '.join(sorted(PARTITION_KEYS)))
+    return strategy
+
+
+def check_pg_version(connection):
+    if connection.pg_version < PARTITION_MIN_PG_VERSION:
+        raise ImproperlyConfigured('Partitioning Records requires PostgreSQL 11 or later.')
+
+
+def add_months(month, months):
+    """
+    Return the first day of the month `months` after the month starting on `month`.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def month_partition(month):
+    """
+    Return the name and bounds of the partition for the month starting on `month`.
+    """
+    name = '{table}_y{year:04d}m{month:02d}'.format(table=RECORD_TABLE, year=month.year,
+                                                    month=month.month)
+    # Bounds have to be plain literals, so pass them as strings rather than dates (which
+    # psycopg2 would send as casts).
+    bounds = [str(month) + ' 00:00:00+00', str(add_months(month, 1)) + ' 00:00:00+00']
+    return name, bounds
+
+
+def record_type_partition(record_type_id):
+    """
+    Return the name and bounds of the partition for the Records of a RecordType.
+    """
+    record_type_id = str(record_type_id)
+    name = '{table}_type_{id}'.format(table=RECORD_TABLE, id=record_type_id.replace('-', ''))
+    return name, [record_type_id]
+
+
+def bounds_sql(strategy):
+    if strategy == MONTH:
+        return 'FROM (%s) TO (%s)'
+    return 'IN (%s)'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [RECORD_TABLE])
+    return cursor.fetchone()[0]
+
+
+def partition_key(cursor):
+    cursor.execute('SELECT pg_get_partkeydef(%s::regclass)', [RECORD_TABLE])
+    return cursor.fetchone()[0]
+
+
+def list_partitions(cursor):
+    """
+    Return the names and bounds of the partitions of the Record table.
+
+    Returns:
+        list: Two-tuples of the name of a partition and its bounds, as SQL.
+    """
+    cursor.execute('SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) '
+                   'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                   'WHERE i.inhparent = %s::regclass ORDER BY c.relname', [RECORD_TABLE])
+    return cursor.fetchall()
+
+
+def table_indexes(cursor, table):
+    """
+    Return the definitions of the indexes on a table that aren't backing a unique or
+    primary key constraint.
+    """
+    cursor.execute('SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+                   'WHERE indrelid = %s::regclass AND NOT indisunique ORDER BY indexrelid',
+                   [table])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def table_foreign_keys(cursor, table):
+    cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                   "WHERE conrelid = %s::regclass AND contype = 'f' ORDER BY conname", [table])
+    return cursor.fetchall()
+
+
+def inbound_foreign_keys(cursor, table):
+    """
+    Return the names of the foreign keys that reference a table, with the names of the
+    tables that they're on.
+    """
+    cursor.execute("SELECT conrelid::regclass::text, conname FROM pg_constraint "
+                   "WHERE confrelid = %s::regclass AND contype = 'f' ORDER BY 1, 2", [table])
+    return cursor.fetchall()
+
+
+def has_records(cursor):
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM {table})'.format(table=RECORD_TABLE))
+    return cursor.fetchone()[0]
+
+
+def function_exists(cursor, name):
+    cursor.execute('SELECT to_regproc(%s) IS NOT NULL', [name])
+    return cursor.fetchone()[0]
+
+
+def create_triggers(cursor, table):
+    """
+    Create the row triggers of the Record table on `table`, which is either the Record
+    table itself or one of its partitions. The BEFORE triggers are created on every
+    partition, and the notification trigger on the Record table, partitioned or not.
+    """
+    if table != RECORD_TABLE or not is_partitioned(cursor):
+        cursor.execute(occurred_trigger_sql.format(table=table))
+        if function_exists(cursor, CHANGE_TRIGGER_FUNCTION):
+            cursor.execute(change_trigger_sql.format(table=table))
+    if table == RECORD_TABLE and function_exists(cursor, NOTIFY_TRIGGER_FUNCTION):
+        cursor.execute(notify_trigger_sql.format(table=table))
+
+
+def wanted_partitions(cursor, strategy, source, months_ahead):
+    """
+    List the partitions needed for the Records in the table `source`, plus (when
+    partitioning by month) partitions for the current month and `months_ahead` more.
+
+    Returns:
+        list: Two-tuples of the name and bounds of each partition.
+    """
+    if strategy == MONTH:
+        cursor.execute("SELECT DISTINCT date_trunc('month', occurred_from AT TIME ZONE 'UTC') "
+                       "FROM {table} WHERE occurred_from IS NOT NULL".format(table=source))
+        months = set(row[0].date() for row in cursor.fetchall())
+        this_month = datetime.datetime.utcnow().date().replace(day=1)
+        months.update(add_months(this_month, ahead) for ahead in range(months_ahead + 1))
+        return [month_partition(month) for month in sorted(months)]
+    cursor.execute('SELECT uuid FROM {table} ORDER BY created'.format(table=RECORD_TYPE_TABLE))
+    return [record_type_partition(row[0]) for row in cursor.fetchall()]
+
+
+def create_partition(cursor, strategy, name, bounds):
+    """
+    Create a partition of the Record table, moving any of its rows out of the default
+    partition first: a partition can't be attached while the default partition holds
+    rows that belong in it.
+    """
+    cursor.execute('CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'.format(
+        name=name, table=RECORD_TABLE))
+    cursor.execute('WITH moved AS (DELETE FROM {default} WHERE {predicate} RETURNING *) '
+                   'INSERT INTO {name} SELECT * FROM moved'.format(
+                       default=DEFAULT_PARTITION, predicate=PARTITION_KEYS[strategy][1],
+                       name=name), bounds)
+    cursor.execute('ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}'.format(
+        table=RECORD_TABLE, name=name, bounds=bounds_sql(strategy)), bounds)
+    cursor.execute('ALTER TABLE {name} ADD PRIMARY KEY (uuid)'.format(name=name))
+    create_triggers(cursor, name)
+
+
+def maintain_partitions(cursor, strategy, months_ahead=3, source=DEFAULT_PARTITION):
+    """
+    Create any missing partitions for the Records in `source` (by default, the Records
+    that are waiting in the default partition) and for upcoming months.
+
+    Returns:
+        list: The names of the partitions that were created.
+    """
+    existing = set(name for name, _ in list_partitions(cursor))
+    created = []
+    for name, bounds in wanted_partitions(cursor, strategy, source, months_ahead):
+        if name not in existing:
+            create_partition(cursor, strategy, name, bounds)
+            created.append(name)
+    return created
+
+
+def rebuild_table(cursor, create_sql, primary_key, prepare):
+    """
+    Replace the Record table with a new one created by `create_sql`, copying over its
+    rows, indexes and foreign keys. `prepare` is called with the name of the old table
+    once the new one exists, and before any rows are copied into it.
+
+    Index definitions are read before the old table is renamed, so that they can be
+    applied to the new table unchanged. The Record table is locked until the transaction
+    that this runs in ends, so Records can't be read or written while they're copied.
+
+    Raises:
+        ImproperlyConfigured: If other tables have foreign keys to the Record table.
+    """
+    old_table = RECORD_TABLE + '_old'
+    # The old table can't be dropped while other tables reference it, and a partitioned
+    # table has no primary key for them to reference instead.
+    inbound = inbound_foreign_keys(cursor, RECORD_TABLE)
+    if inbound:
+        raise ImproperlyConfigured(
+            'The Record table can\'t be rebuilt while other tables have foreign keys to it. '
+            'Drop these constraints first: ' + ', '.join(
+                '{0} on {1}'.format(name, table) for table, name in inbound))
+    indexes = table_indexes(cursor, RECORD_TABLE)
+    foreign_keys = table_foreign_keys(cursor, RECORD_TABLE)
+
+    cursor.execute('ALTER TABLE {table} RENAME TO {old}'.format(table=RECORD_TABLE,
+                                                                old=old_table))
+    cursor.execute(create_sql.format(table=RECORD_TABLE, old=old_table))
+    prepare(old_table)
+    cursor.execute('INSERT INTO {table} SELECT * FROM {old}'.format(table=RECORD_TABLE,
+                                                                     old=old_table))
+    cursor.execute('DROP TABLE {old}'.format(old=old_table))
+
+    # Build indexes after loading the rows, which is much faster than maintaining them.
+    if primary_key:
+        cursor.execute('ALTER TABLE {table} ADD PRIMARY KEY (uuid)'.format(table=RECORD_TABLE))
+    for index_sql in indexes:
+        cursor.execute(index_sql)
+    for name, definition in foreign_keys:
+        cursor.execute('ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'.format(
+            table=RECORD_TABLE, name=name, definition=definition))
+
+
+def migrate(connection, strategies):
+    """
+    Partition the Record table from a migration, if the project has opted in to one of
+    `strategies` with the PARTITION_RECORDS setting and the table is empty.
+
+    Copying Records into a partitioned table locks the Record table for as long as the
+    copy takes, so existing Records are left to the `grout_partitions` command, to be run
+    when the site can spare the downtime.
+    """
+    strategy = partition_strategy()
+    if strategy not in strategies:
+        return
+    check_pg_version(connection)
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+        if has_records(cursor):
+            sys.stdout.write('\n  The Record table already holds Records, so it was not '
+                             'partitioned. Run `django-admin grout_partitions --partition` '
+                             'to partition it.\n')
+            return
+        partition_table(cursor, strategy)
+
+
+def unmigrate(connection, strategies):
+    """
+    Undo `migrate`, converting the Record table back into a single table if it's
+    partitioned with one of `strategies`.
+    """
+    keys = [PARTITION_KEYS[strategy][0] for strategy in strategies]
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor) and partition_key(cursor) in keys:
+            unpartition_table(cursor)
+
+
+def partition_table(cursor, strategy, months_ahead=3):
+    """
+    Convert the Record table into a table partitioned according to `strategy`.
+    """
+    def create_partitions(old_table):
+        create_triggers(cursor, RECORD_TABLE)
+        cursor.execute('CREATE TABLE {default} PARTITION OF {table} DEFAULT'.format(
+            default=DEFAULT_PARTITION, table=RECORD_TABLE))
+        cursor.execute('ALTER TABLE {default} ADD PRIMARY KEY (uuid)'.format(
+            default=DEFAULT_PARTITION))
+        create_triggers(cursor, DEFAULT_PARTITION)
+        maintain_partitions(cursor, strategy, months_ahead, source=old_table)
+
+    create_sql = ('CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY ' +
+                  PARTITION_KEYS[strategy][0])
+    rebuild_table(cursor, create_sql, primary_key=False, prepare=create_partitions)
+
+
+def unpartition_table(cursor):
+    """
+    Convert a partitioned Record table back into a single table.
+    """
+    def create_record_triggers(old_table):
+        create_triggers(cursor, RECORD_TABLE)
+
+    rebuild_table(cursor, 'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)',
+                  primary_key=True, prepare=create_record_triggers)
@@ -0,0 +1,91 @@
+import json
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class RawJSON(object):
+    """
+    JSON text, like the text of a `jsonb` value read straight from the database, to
+    include in a response without decoding and encoding it again.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and other.text == self.text
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'RawJSON({0!r})'.format(self.text)
+
+    def decode(self):
+        return json.loads(self.text)
+
+
+# Stands in for a RawJSON value while the rest of a response is encoded. Strings read from
+# PostgreSQL can't contain NUL characters, so no other string encodes to this.
+RAW_PLACEHOLDER = u'\x00raw:{0}\x00'
+RAW_PLACEHOLDER_PATTERN = re.compile(br'"\\u0000raw:(\d+)\\u0000"')
+
+
+class RawJSONRenderer(JSONRenderer):
+    """
+    A JSONRenderer that splices RawJSON values into the response as they are.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        raw_values = []
+        ensure_ascii = self.ensure_ascii
+
+        class RawJSONEncoder(JSONRenderer.encoder_class):
+            def default(self, obj):
+                if not isinstance(obj, RawJSON):
+                    return super(RawJSONEncoder, self).default(obj)
+                if ensure_ascii:
+                    # PostgreSQL doesn't escape non-ASCII characters, so this has to.
+                    return obj.decode()
+                raw_values.append(obj.text)
+                return RAW_PLACEHOLDER.format(len(raw_values) - 1)
+
+        self.encoder_class = RawJSONEncoder
+        rendered = super(RawJSONRenderer, self).render(data, accepted_media_type,
+                                                       renderer_context)
+        if not raw_values:
+            return rendered
+
+        def splice(match):
+            # Escape the same characters that JSONRenderer escapes in the rest of the
+            # response.
+            text = raw_values[int(match.group(1))]
+            return text.replace(u'\u2028', u'\\u2028').replace(u'\u2029', u'\\u2029').encode(
+                'utf-8')
+
+        return RAW_PLACEHOLDER_PATTERN.sub(splice, rendered)
+
+
+class GeoJSONRenderer(RawJSONRenderer):
+    """
+    Renders GeoJSON built by RecordGeoJSONSerializer, for `?format=geojson` or an `Accept`
+    header of `application/geo+json`.
+    """
+    media_type = 'application/geo+json'
+    format = 'geojson'
+
+
+class FlatGeobufRenderer(BaseRenderer):
+    """
+    Renders a FlatGeobuf file built by `grout.flatgeobuf.flatgeobuf`, for `?format=fgb` or
+    an `Accept` header of `application/flatgeobuf`. Errors are rendered as JSON, by
+    FlatGeobufMixin.
+    """
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
@@ -0,0 +1,121 @@
+"""
+An optional cache of Record listings.
+
+To turn it on, set the `RESULT_CACHE` key of the `GROUT` setting to the alias of a cache
+in `CACHES`. Listings are cached by their query parameters (with `jsonb` filter trees
+normalized, so that equivalent filters share an entry) and by user, for
+`RESULT_CACHE_TIMEOUT` seconds.
+
+Instead of deleting entries when Records change, every entry is keyed by a generation
+counter for the RecordType that the listing is limited to (or for all Records). Saving or
+deleting a Record bumps the counters for its RecordType and for all Records, so that
+later requests miss the stale entries, which then expire on their own. Updates that skip
+`Record.save()`, like `QuerySet.update()`, have to call `bump_generation` themselves.
+"""
+import hashlib
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from grout.lookups import canonical_json, normalize_tree
+
+DEFAULT_RESULT_CACHE_TIMEOUT = 300
+
+ALL_RECORD_TYPES = 'all'
+
+GENERATION_KEY = 'grout:generation:{record_type_id}'
+RESULT_KEY = 'grout:records:{generation}:{digest}'
+
+
+def result_cache():
+    """
+    Return the cache that holds Record listings, or None if the cache is off.
+    """
+    alias = settings.GROUT.get('RESULT_CACHE')
+    return caches[alias] if alias else None
+
+
+def result_cache_timeout():
+    return settings.GROUT.get('RESULT_CACHE_TIMEOUT', DEFAULT_RESULT_CACHE_TIMEOUT)
+
+
+def get_generation(cache, record_type_id):
+    key = GENERATION_KEY.format(record_type_id=record_type_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the current time rather than from 0, so that a counter that was
+        # evicted doesn't start over and match entries from before the eviction.
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(record_type_id, using=DEFAULT_DB_ALIAS):
+    """
+    Invalidate cached listings that include Records of a RecordType. This happens both
+    immediately and once the transaction on the database `using` commits, so that a
+    request that reads the old Records before the commit can't cache them under the new
+    generation.
+    """
+    cache = result_cache()
+    if cache is None:
+        return
+    increment_generation(cache, record_type_id)
+    transaction.on_commit(lambda: increment_generation(cache, record_type_id), using=using)
+
+
+def increment_generation(cache, record_type_id):
+    for counter in (record_type_id, ALL_RECORD_TYPES):
+        key = GENERATION_KEY.format(record_type_id=counter)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter doesn't exist yet, so nothing is cached under it.
+            pass
+
+
+def bump_record_generation(sender, instance, using, **kwargs):
+    bump_generation(instance.record_type_id, using)
+
+
+def cache_key(request):
+    """
+    Return the key of the cached listing for a request, or None if the cache is off or
+    the request can't be cached.
+    """
+    cache = result_cache()
+    if cache is None:
+        return None
+
+    params = {}
+    for name, values in request.query_params.lists():
+        if name == 'jsonb':
+            try:
+                values = [canonical_json(normalize_tree(json.loads(value))) for value in values]
+            except ValueError:
+                # Let the filter backend report the error.
+                return None
+        params[name] = sorted(values)
+
+    # A listing is only served to the user that it was built for.
+    user = request.user.pk if request.user.is_authenticated else None
+    digest = hashlib.md5(json.dumps([request.path, request.accepted_media_type, params,
+                                     user], sort_keys=True).encode('utf-8')).hexdigest()
+    return RESULT_KEY.format(generation=get_generation(cache, generation_id(request)),
+                             digest=digest)
+
+
+def generation_id(request):
+    """
+    Return the ID of the generation counter that a request's listing depends on: the
+    canonical form of its `record_type` parameter, which `bump_generation` is called
+    with, or ALL_RECORD_TYPES if it doesn't have a valid one.
+    """
+    try:
+        return str(uuid.UUID(request.query_params.get('record_type')))
+    except (TypeError, ValueError):
+        return ALL_RECORD_TYPES
@@ -0,0 +1,102 @@
+"""
+Database routers for Grout models: `ReplicaRouter` routes reads to read replicas, and
+`ShardRouter` supports storing Records in several databases (see grout.shards).
+
+Add the router to your settings and list the aliases of your replica databases in the
+`READ_REPLICAS` key of the `GROUT` setting:
+
+    DATABASE_ROUTERS = ['grout.routers.ReplicaRouter']
+    GROUT = {'SRID': 4326, 'READ_REPLICAS': ['replica']}
+
+Only requests that Grout viewsets mark as replica reads (see `ReplicaReadMixin` in
+grout.views) use a replica; every other query goes to the primary database. Once a
+client writes, its reads are pinned to the primary database for `REPLICA_PIN_SECONDS`,
+so that it reads its own writes despite replication lag.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from grout.shards import shard_aliases
+
+# The cookie that pins a client's reads to the primary database after a write.
+PIN_COOKIE = 'grout_pin_primary'
+
+DEFAULT_REPLICA_PIN_SECONDS = 15
+
+# The replica that Grout models are read from on the current thread, if any.
+state = threading.local()
+
+
+def read_replicas():
+    return settings.GROUT.get('READ_REPLICAS', [])
+
+
+def replica_pin_seconds():
+    return settings.GROUT.get('REPLICA_PIN_SECONDS', DEFAULT_REPLICA_PIN_SECONDS)
+
+
+def start_replica_reads(pinned=False):
+    """
+    Send reads of Grout models on this thread to a randomly chosen replica, unless
+    `pinned` is True or no replicas are configured.
+    """
+    replicas = read_replicas()
+    state.replica = random.choice(replicas) if replicas and not pinned else None
+
+
+def stop_replica_reads():
+    """
+    Send reads on this thread back to the primary database.
+    """
+    state.replica = None
+
+
+def replica_for_read():
+    return getattr(state, 'replica', None)
+
+
+class ReplicaRouter(object):
+    """
+    Route reads of Grout models to the replica chosen for the current thread.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'grout':
+            return None
+        return replica_for_read()
+
+    def db_for_write(self, model, **hints):
+        # Read the rest of the request from the primary database, so that it sees this
+        # write.
+        stop_replica_reads()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary database, so objects read from any of
+        # them can be related.
+        databases = set([DEFAULT_DB_ALIAS] + list(read_replicas()))
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in read_replicas():
+            return False
+        return None
+
+
+class ShardRouter(object):
+    """
+    Allow Records stored in a shard to relate to the copies of RecordTypes and
+    RecordSchemas in other databases. Queries for a Record's relations already go to the
+    Record's own database, and `Record.save()` picks the shard to write to.
+    """
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = shard_aliases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
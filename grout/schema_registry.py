@@ -0,0 +1,72 @@
+"""
+A cache of the current RecordSchema of each RecordType.
+
+The registry is off by default. To turn it on, set the `SCHEMA_CACHE` key of the `GROUT`
+setting to the alias of a cache in `CACHES`: a local-memory cache keeps schemas in
+process, while a shared cache like Memcached or Redis lets every process see a new
+schema version as soon as it's created. Entries are invalidated whenever a RecordSchema
+is saved or deleted.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+CACHE_KEY = 'grout:current_schema:{record_type_id}'
+
+
+def schema_cache():
+    """
+    Return the cache that holds current schemas, or None if the registry is off.
+    """
+    alias = settings.GROUT.get('SCHEMA_CACHE')
+    return caches[alias] if alias else None
+
+
+def lookup_current_schema(record_type_id):
+    from grout.models import RecordSchema
+    return RecordSchema.objects.filter(record_type_id=record_type_id).order_by('-version').first()
+
+
+def get_current_schema(record_type_id):
+    """
+    Return the current RecordSchema of a RecordType, or None if it has no schemas.
+    """
+    cache = schema_cache()
+    if cache is None:
+        return lookup_current_schema(record_type_id)
+
+    key = CACHE_KEY.format(record_type_id=record_type_id)
+    schema = cache.get(key)
+    if schema is None:
+        schema = lookup_current_schema(record_type_id)
+        if schema is not None:
+            cache.set(key, schema, None)
+    return schema
+
+
+def invalidate(record_type_id):
+    cache = schema_cache()
+    if cache is not None:
+        cache.delete(CACHE_KEY.format(record_type_id=record_type_id))
+
+
+def invalidate_schema(sender, instance, using, **kwargs):
+    """
+    Drop the cached current schema of a RecordSchema's RecordType. This happens both
+    immediately and once the transaction commits, so that a request that reads the old
+    schema before the commit can't leave it in the cache.
+    """
+    invalidate(instance.record_type_id)
+    transaction.on_commit(lambda: invalidate(instance.record_type_id), using=using)
+
+
+def touch_record_type(sender, instance, using, **kwargs):
+    """
+    Update the modification time of a RecordSchema's RecordType, whose current schema may
+    have changed, so that clients holding validators for the RecordType (see
+    ConditionalGetMixin) read it again.
+    """
+    from grout.models import RecordType
+    RecordType.objects.using(using).filter(pk=instance.record_type_id).update(
+        modified=timezone.now())
@@ -6,27 +6,318 @@ import datetime
 import json
 import pytz
 import requests
+import six
+from collections import OrderedDict
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import connection, connections
+from django.db.models import TextField
+from django.db.models.functions import Cast
 
 from rest_framework import serializers
+from rest_framework.relations import RelatedField
 from rest_framework.serializers import ModelSerializer
+from rest_framework_gis.fields import GeometryField
 from rest_framework_gis.serializers import GeoFeatureModelSerializer, GeoModelSerializer
 
-from grout.models import Boundary, BoundaryPolygon, Record, RecordType, RecordSchema
+from grout.models import (Boundary, BoundaryPolygon, Record, RecordExport, RecordTombstone,
+                          RecordType, RecordSchema)
+from grout.renderers import RawJSON
 from grout.serializer_fields import JsonBField, JsonSchemaField, GeomBBoxField
 
 logger = logging.getLogger(__name__)
 
+# The number of decimal places in coordinates that PostGIS writes to GeoJSON. GDAL, which
+# converts geometries to GeoJSON for GeoModelSerializers, writes this many too.
+GEOJSON_PRECISION = 15
+
+# A timestamptz column in UTC, formatted like DRF formats datetimes in UTC: ISO 8601, with
+# microseconds only if there are any, and with a Z. Percent signs are doubled, since the
+# SQL is run with parameters.
+utc_timestamp_sql = (
+    "to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+    "CASE WHEN date_part('microseconds', {column})::integer %% 1000000 = 0 THEN '' "
+    "ELSE to_char({column}, '.US') END || 'Z'"
+)
+
+PYTHON = 'python'
+SQL = 'sql'
+RECORD_LIST_ENGINES = (PYTHON, SQL)
+
+
+def record_list_engine():
+    """
+    Return where Record listings are serialized, according to the `RECORD_LIST_ENGINE` key
+    of the `GROUT` setting: in Python (by RecordValuesSerializer) or in SQL (by
+    RecordSQLSerializer).
+    """
+    engine = settings.GROUT.get('RECORD_LIST_ENGINE', PYTHON)
+    if engine not in RECORD_LIST_ENGINES:
+        raise ImproperlyConfigured('GROUT["RECORD_LIST_ENGINE"] must be one of: ' +
+                                   ', '.join(RECORD_LIST_ENGINES))
+    return engine
+
 
 class RecordSerializer(GeoModelSerializer):
+    """
+    Takes the sparse fieldset arguments built by grout.fieldsets: `fields`, the names of
+    the only fields to include, and `data_source`, the attribute to read `data` from
+    (when it's been projected to some of its paths).
+    """
 
     data = JsonBField()
 
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        data_source = kwargs.pop('data_source', None)
+        super(RecordSerializer, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if data_source is not None and 'data' in self.fields:
+            self.fields['data'] = JsonBField(source=data_source, read_only=True)
+
     class Meta:
         model = Record
-        fields = '__all__'
+        # These fields duplicate `occurred_from`, `occurred_to` and `schema` for indexing
+        # purposes, or are internal to the change feed.
+        exclude = ('occurred', 'record_type', 'change_txid')
         read_only_fields = ('uuid',)
 
 
+def geojson_geometry(text):
+    """
+    Decode GeoJSON written by PostGIS. GDAL, which writes the geometries of
+    RecordSerializer, writes every coordinate as a float, but PostGIS writes integral
+    coordinates as integers, so they're read as floats.
+    """
+    return json.loads(text, parse_int=float)
+
+
+class RecordValuesSerializer(object):
+    """
+    A read-only fast path for serializing lists of Records exactly like RecordSerializer.
+
+    Rather than building a model instance for each Record and serializing it field by
+    field, this fetches `values_list()` rows, with geometries already converted to
+    GeoJSON by PostGIS, and builds the representation of each row directly.
+
+    With `raw_json`, `jsonb` fields are read as text and passed through as RawJSON
+    values, which RawJSONRenderer includes in the response without decoding them. Other
+    keyword arguments are passed on to `serializer_class`.
+    """
+    serializer_class = RecordSerializer
+
+    def __init__(self, raw_json=False, **serializer_kwargs):
+        model = self.serializer_class.Meta.model
+        # Each field of the serializer, with the column that it's read from and the
+        # function (if any) that converts values that aren't None.
+        self.columns = []
+        # Expressions for the columns that aren't read from the model's fields as they are.
+        self.annotations = {}
+        for name, field in self.serializer_class(**serializer_kwargs).fields.items():
+            if isinstance(field, GeometryField):
+                self.annotations[name + '_geojson'] = AsGeoJSON(field.source,
+                                                                precision=GEOJSON_PRECISION)
+                self.columns.append((name, name + '_geojson', geojson_geometry))
+            elif raw_json and isinstance(field, JsonBField):
+                self.annotations[name + '_json'] = Cast(field.source, TextField())
+                self.columns.append((name, name + '_json', RawJSON))
+            elif isinstance(field, RelatedField):
+                # Related fields are represented by the primary key, which is what the
+                # foreign key column holds.
+                self.columns.append((name, model._meta.get_field(field.source).attname, None))
+            else:
+                self.columns.append((name, field.source, field.to_representation))
+
+    def values(self, queryset):
+        """
+        Return the rows of `queryset` that `to_representation` takes.
+        """
+        return queryset.annotate(**self.annotations).values_list(
+            *[column for _, column, _ in self.columns])
+
+    def to_representation(self, rows):
+        return [OrderedDict((name, value if value is None or convert is None else convert(value))
+                            for (name, _, convert), value in zip(self.columns, row))
+                for row in rows]
+
+
+class RecordSQLSerializer(object):
+    """
+    Serialize Records like RecordSerializer inside PostgreSQL, which builds the JSON for
+    each page of Records (with `json_build_object` and `json_agg`) and returns it as a
+    single text value. Pages are returned as RawJSON values, for RawJSONRenderer.
+
+    Timestamps are written in UTC, which is how RecordSerializer writes them as long as
+    the `TIME_ZONE` setting is `'UTC'`. Keyword arguments are passed on to
+    `serializer_class`.
+    """
+
+    serializer_class = RecordSerializer
+
+    def __init__(self, **serializer_kwargs):
+        quote_name = connection.ops.quote_name
+        self.model_columns = []
+        self.json_columns = []
+        for name, field in self.serializer_class(**serializer_kwargs).fields.items():
+            try:
+                model_field = self.serializer_class.Meta.model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                # The field reads an annotation, like the projection of `data` in a sparse
+                # fieldset, which is selected under its own name.
+                self.model_columns.append(field.source)
+                self.json_columns.append((name, 'page.' + quote_name(field.source)))
+                continue
+            column = 'page.' + quote_name(model_field.column)
+            if isinstance(field, GeometryField):
+                column = self.geometry_sql(column)
+            elif isinstance(field, serializers.DateTimeField):
+                column = utc_timestamp_sql.format(column=column)
+            self.model_columns.append(model_field.attname)
+            self.json_columns.append((name, column))
+
+    def geometry_sql(self, column):
+        return 'ST_AsGeoJSON({0}, {1}, 0)::json'.format(column, GEOJSON_PRECISION)
+
+    def object_sql(self):
+        """
+        Return the SQL for the JSON of the Record in each row of a page, and its parameters.
+        """
+        pairs = ', '.join('%s, {0}'.format(column) for _, column in self.json_columns)
+        return 'json_build_object({0})'.format(pairs), [name for name, _ in self.json_columns]
+
+    def values(self, queryset):
+        return SQLPages(self, queryset)
+
+    def to_representation(self, pages):
+        return first_page(pages)
+
+    def page(self, queryset):
+        """
+        Return the JSON for all of the Records in `queryset`, as RawJSON.
+        """
+        object_sql, object_params = self.object_sql()
+        # The aggregate keeps the order of the sorted subquery.
+        return self.execute("SELECT coalesce(json_agg({0}), '[]')::text".format(object_sql),
+                            object_params, queryset)
+
+    def detail(self, queryset):
+        """
+        Return the JSON for the first Record in `queryset`, as RawJSON.
+        """
+        object_sql, object_params = self.object_sql()
+        return self.execute('SELECT {0}::text'.format(object_sql), object_params,
+                            queryset[:1])
+
+    def execute(self, select_sql, select_params, queryset):
+        page = queryset.values_list(*self.model_columns)
+        sql, params = page.query.get_compiler(using=page.db).as_sql()
+        with connections[page.db].cursor() as cursor:
+            cursor.execute('{0} FROM ({1}) page'.format(select_sql, sql),
+                           list(select_params) + list(params))
+            row = cursor.fetchone()
+            return RawJSON(row[0]) if row else None
+
+
+class RecordGeoJSONSerializer(RecordSQLSerializer):
+    """
+    Serialize Records as GeoJSON Features inside PostgreSQL, like RecordSQLSerializer, and
+    lists of them as a FeatureCollection. The `uuid` of each Record is the `id` of its
+    Feature, `geom` is its geometry, and the other fields are its properties.
+
+    Coordinates are written with `precision` decimal places and, if `srid` is given,
+    transformed to that spatial reference system, which is named in each geometry.
+    """
+
+    # The fields that every Feature has, whichever fields are requested.
+    id_field = 'uuid'
+    geometry_field = 'geom'
+
+    def __init__(self, precision=GEOJSON_PRECISION, srid=None, **serializer_kwargs):
+        self.precision = precision
+        self.srid = srid
+        if serializer_kwargs.get('fields') is not None:
+            serializer_kwargs['fields'] = (list(serializer_kwargs['fields']) +
+                                           [self.id_field, self.geometry_field])
+        super(RecordGeoJSONSerializer, self).__init__(**serializer_kwargs)
+
+    def geometry_sql(self, column):
+        if self.srid is None:
+            return 'ST_AsGeoJSON({0}, {1}, 0)::json'.format(column, self.precision)
+        # Option 2 adds a short (EPSG:<srid>) CRS member to each geometry.
+        return 'ST_AsGeoJSON(ST_Transform({0}, {1}), {2}, 2)::json'.format(
+            column, self.srid, self.precision)
+
+    def object_sql(self):
+        columns = dict(self.json_columns)
+        properties = [(name, column) for name, column in self.json_columns
+                      if name not in (self.id_field, self.geometry_field)]
+        sql = ("json_build_object('type', 'Feature', 'id', {id}, 'geometry', {geometry}, "
+               "'properties', json_build_object({pairs}))").format(
+                   id=columns[self.id_field], geometry=columns[self.geometry_field],
+                   pairs=', '.join('%s, {0}'.format(column) for _, column in properties))
+        return sql, [name for name, _ in properties]
+
+    def to_representation(self, pages):
+        return OrderedDict((('type', 'FeatureCollection'), ('features', first_page(pages))))
+
+
+def first_page(pages):
+    """
+    Return the JSON of the page in `pages`, a slice of SQLPages, or of an empty page if
+    there's none, which is what paginators return for pages past the last Record.
+    """
+    pages = list(pages)
+    return pages[0] if pages else RawJSON('[]')
+
+
+class SQLPages(object):
+    """
+    Stand in for a queryset of Records when paginating it, but return slices of it as a
+    list holding the JSON for the slice, built by a RecordSQLSerializer.
+    """
+
+    def __init__(self, serializer, queryset):
+        self.serializer = serializer
+        self.queryset = queryset
+
+    def count(self):
+        return self.queryset.count()
+
+    def __getitem__(self, key):
+        return [self.serializer.page(self.queryset[key])]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class RecordTombstoneSerializer(ModelSerializer):
+
+    class Meta:
+        model = RecordTombstone
+        exclude = ('change_txid',)
+
+
+class RecordExportSerializer(ModelSerializer):
+
+    query = JsonBField(required=False)
+    errors = JsonBField(read_only=True, allow_null=True)
+
+    def validate_query(self, value):
+        if not isinstance(value, dict) or not all(
+                isinstance(item, six.string_types) for item in value.values()):
+            raise serializers.ValidationError('An object of Records query parameters, with '
+                                              'string values, is required')
+        return value
+
+    class Meta:
+        model = RecordExport
+        fields = '__all__'
+        read_only_fields = ('uuid', 'status', 'total', 'written', 'file')
+
+
 class RecordTypeSerializer(ModelSerializer):
 
     current_schema = serializers.SerializerMethodField()
@@ -36,11 +327,13 @@ class RecordTypeSerializer(ModelSerializer):
         fields = '__all__'
 
     def get_current_schema(self, obj):
-        current_schema = obj.get_current_schema()
-        uuid = None
-        if current_schema:
-            uuid = str(current_schema.uuid)
-        return uuid
+        # RecordTypeViewSet annotates the current schema, to avoid a query per RecordType.
+        if hasattr(obj, 'current_schema_uuid'):
+            uuid = obj.current_schema_uuid
+        else:
+            current_schema = obj.get_current_schema()
+            uuid = current_schema.uuid if current_schema else None
+        return str(uuid) if uuid else None
 
 
 class RecordSchemaSerializer(ModelSerializer):
@@ -0,0 +1,127 @@
+"""
+Optionally store the Records of different RecordTypes in different databases.
+
+List the aliases of the databases that store Records (besides `default`) in the `SHARDS`
+key of the `GROUT` setting, and map RecordTypes to them with `SHARD_PLACEMENT`: either a
+dict from RecordType UUIDs to database aliases, or the dotted path to a function that
+takes a RecordType UUID and returns an alias. RecordTypes that aren't placed anywhere keep
+their Records in `default`.
+
+RecordTypes and RecordSchemas are written to `default` and copied to every shard, so that
+each shard can enforce the foreign keys of its Records.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import six
+from django.utils.module_loading import import_string
+
+
+def shard_aliases():
+    """
+    Return the aliases of every database that stores Records.
+    """
+    return [DEFAULT_DB_ALIAS] + list(settings.GROUT.get('SHARDS', []))
+
+
+def is_sharded():
+    return bool(settings.GROUT.get('SHARDS'))
+
+
+def shard_for_record_type(record_type_id):
+    """
+    Return the alias of the database that stores the Records of a RecordType.
+    """
+    placement = settings.GROUT.get('SHARD_PLACEMENT', {})
+    if isinstance(placement, six.string_types):
+        alias = import_string(placement)(record_type_id)
+    else:
+        alias = placement.get(str(record_type_id))
+    return alias or DEFAULT_DB_ALIAS
+
+
+class FanOutQuerySet(object):
+    """
+    Run a Record queryset on every shard and merge the results, newest first.
+
+    This supports the parts of the QuerySet API that Grout's views and pagination use:
+    counting, slicing, iterating and getting a single Record.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.model = queryset.model
+
+    def shard_querysets(self):
+        return [self.queryset.using(alias) for alias in shard_aliases()]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.shard_querysets())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        # Each shard has to return enough Records to fill the slice on its own, since the
+        # newest Records could all be on one shard.
+        records = []
+        for queryset in self.shard_querysets():
+            records.extend(queryset[:key.stop] if key.stop is not None else queryset)
+        records.sort(key=lambda record: record.created, reverse=True)
+        return records[start:key.stop]
+
+    def get(self, *args, **kwargs):
+        for queryset in self.shard_querysets():
+            try:
+                return queryset.get(*args, **kwargs)
+            except self.model.DoesNotExist:
+                continue
+        raise self.model.DoesNotExist('Record matching query does not exist.')
+
+
+def bulk_create_records(records, batch_size=None):
+    """
+    Insert Records in bulk, each in the shard of its RecordType. Like
+    `QuerySet.bulk_create`, this skips `Record.save()` and its validation.
+    """
+    from grout.models import Record
+    from grout.result_cache import bump_generation
+
+    by_shard = {}
+    for record in records:
+        record.record_type_id = record.schema.record_type_id
+        by_shard.setdefault(shard_for_record_type(record.record_type_id), []).append(record)
+    created = []
+    for alias, shard_records in sorted(by_shard.items()):
+        created.extend(Record.objects.using(alias).bulk_create(shard_records,
+                                                               batch_size=batch_size))
+        for record_type_id in set(record.record_type_id for record in shard_records):
+            bump_generation(record_type_id, alias)
+    return created
+
+
+def copy_to_shards(sender, instance, using, **kwargs):
+    """
+    Copy a RecordType or RecordSchema saved to `default` to every shard.
+    """
+    if not is_sharded() or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shard_aliases()[1:]:
+        instance.save(using=alias)
+    # Saving to a shard moves the instance there; move it back.
+    instance._state.db = using
+
+
+def delete_from_shards(sender, instance, using, **kwargs):
+    """
+    Delete a RecordType or RecordSchema deleted from `default` from every shard.
+    """
+    if not is_sharded() or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shard_aliases()[1:]:
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
@@ -0,0 +1,182 @@
+"""
+A feed of the Records that changed since a client last synced, for clients that keep
+their own copy of Records (like offline data collectors).
+
+A database trigger stamps every Record that's inserted or updated with the ID of the
+transaction that wrote it, and deleting a Record leaves a RecordTombstone that's stamped
+the same way. A sync returns the Records and tombstones stamped after the position in
+its `since` token, in order, along with a token for the next sync.
+
+Transaction IDs are used rather than `modified` because transactions don't commit in the
+order that they start in: a Record written by a long transaction could appear after a
+client had already synced past its timestamp. Instead, a sync only returns changes made
+by transactions older than the oldest transaction that is still running (the `xmin` of
+its snapshot), which have all finished, and picks up later changes the next time.
+
+Tokens expire after `SYNC_TOKEN_MAX_AGE` seconds, so that tombstones older than that
+can be deleted (by `prune_tombstones`) without any client missing a deletion. Clients
+with an expired token have to sync from the start.
+"""
+import base64
+import datetime
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from grout import exceptions, shards
+
+DEFAULT_SYNC_LIMIT = 1000
+
+DEFAULT_SYNC_TOKEN_MAX_AGE = 30 * 24 * 60 * 60
+
+# How much older than the oldest usable token a tombstone has to be to be deleted. A
+# tombstone is stamped when its Record is deleted, but a token only covers it once its
+# transaction has finished, which can be a while later.
+TOMBSTONE_PRUNE_MARGIN = datetime.timedelta(days=1)
+
+# The names of the two streams of changes, which are read separately.
+RECORDS = 'records'
+DELETED = 'deleted'
+
+# The position before any change: a transaction ID and the UUID of the last row returned
+# for that transaction, if only some of its rows have been returned.
+START = [0, None]
+
+TOKEN_REQUIREMENT = 'a token returned by an earlier sync'
+EXPIRED_TOKEN_REQUIREMENT = 'a token from the last {0} seconds; sync again without one'
+
+
+def sync_token_max_age():
+    return settings.GROUT.get('SYNC_TOKEN_MAX_AGE', DEFAULT_SYNC_TOKEN_MAX_AGE)
+
+
+def encode_token(positions):
+    token = {'issued': int(time.time()), 'positions': positions}
+    return base64.urlsafe_b64encode(
+        json.dumps(token, sort_keys=True).encode('utf-8')).decode('ascii')
+
+
+def decode_token(token):
+    """
+    Return the positions encoded in a sync token, for each database that stores Records.
+    """
+    if not token:
+        return {}
+    try:
+        token = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        issued, positions = int(token['issued']), token['positions']
+        for streams in positions.values():
+            for stream in (RECORDS, DELETED):
+                txid, last_uuid = streams[stream]
+                streams[stream] = [int(txid), str(uuid.UUID(last_uuid)) if last_uuid else None]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise exceptions.QueryParameterException('since', TOKEN_REQUIREMENT)
+    max_age = sync_token_max_age()
+    if issued < time.time() - max_age:
+        raise exceptions.QueryParameterException('since',
+                                                 EXPIRED_TOKEN_REQUIREMENT.format(max_age))
+    return positions
+
+
+def snapshot_xmin(using):
+    """
+    Return the ID of the oldest transaction that was running when a snapshot was taken in
+    database `using`. Every transaction with a lower ID has committed or rolled back.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def changes_after(queryset, position, xmin, limit):
+    """
+    Return up to `limit` rows of `queryset` changed after `position` by transactions
+    older than `xmin`, the position to read from next, and whether there are more rows.
+    """
+    txid, last_uuid = position
+    after = Q(change_txid__gte=txid)
+    if last_uuid is not None:
+        after &= Q(change_txid__gt=txid) | Q(uuid__gt=last_uuid)
+    rows = list(queryset.filter(after, change_txid__lt=xmin)
+                        .order_by('change_txid', 'uuid')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, [rows[-1].change_txid, str(rows[-1].uuid)], True
+    # Every change older than `xmin` has been returned, including those from transactions
+    # that committed after an earlier sync.
+    return rows, [xmin, None], False
+
+
+def sync(positions, limit=DEFAULT_SYNC_LIMIT, record_type=None):
+    """
+    Read the Records and RecordTombstones changed after `positions`, optionally only
+    those of one RecordType.
+
+    Returns:
+        tuple: The changed Records, the tombstones, the positions to read from next and
+            whether there are more changes to read.
+    """
+    from grout.models import Record, RecordTombstone
+
+    records = Record.objects.all()
+    tombstones = RecordTombstone.objects.all()
+    if record_type is not None:
+        records = records.filter(record_type=record_type)
+        tombstones = tombstones.filter(record_type=record_type)
+
+    if not shards.is_sharded():
+        aliases = [DEFAULT_DB_ALIAS]
+    elif record_type is not None:
+        aliases = [shards.shard_for_record_type(record_type)]
+    else:
+        aliases = shards.shard_aliases()
+
+    changed, deleted, next_positions, more = [], [], dict(positions), False
+    for alias in aliases:
+        # Without shards, leave the choice of database (a replica, perhaps) to the router.
+        shard_records = records.using(alias) if shards.is_sharded() else records
+        shard_tombstones = tombstones.using(alias) if shards.is_sharded() else tombstones
+        xmin = snapshot_xmin(shard_records.db)
+        streams = positions.get(alias, {RECORDS: START, DELETED: START})
+
+        rows, records_position, more_records = changes_after(
+            shard_records, streams[RECORDS], xmin, limit)
+        changed.extend(rows)
+        rows, deleted_position, more_deleted = changes_after(
+            shard_tombstones, streams[DELETED], xmin, limit)
+        deleted.extend(rows)
+
+        next_positions[alias] = {RECORDS: records_position, DELETED: deleted_position}
+        more = more or more_records or more_deleted
+    return changed, deleted, next_positions, more
+
+
+def prune_tombstones():
+    """
+    Delete the tombstones that no usable sync token needs anymore.
+
+    Returns:
+        int: The number of tombstones deleted.
+    """
+    from grout.models import RecordTombstone
+
+    cutoff = timezone.now() - datetime.timedelta(seconds=sync_token_max_age())
+    aliases = shards.shard_aliases() if shards.is_sharded() else [DEFAULT_DB_ALIAS]
+    pruned = 0
+    for alias in aliases:
+        pruned += RecordTombstone.objects.using(alias).filter(
+            deleted__lt=cutoff - TOMBSTONE_PRUNE_MARGIN).delete()[0]
+    return pruned
+
+
+def record_tombstone(sender, instance, using, **kwargs):
+    """
+    Leave a tombstone for a deleted Record.
+    """
+    from grout.models import RecordTombstone
+    RecordTombstone(uuid=instance.pk, record_type=instance.record_type_id).save(using=using)
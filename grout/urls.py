@@ -11,6 +11,7 @@ router = routers.DefaultRouter()
 router.register('boundaries', views.BoundaryViewSet)
 router.register('boundarypolygons', views.BoundaryPolygonViewSet)
 router.register('records', views.RecordViewSet)
+router.register('recordexports', views.RecordExportViewSet)
 router.register('recordschemas', views.RecordSchemaViewSet)
 router.register('recordtypes', views.RecordTypeViewSet)
 
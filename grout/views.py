@@ -1,27 +1,46 @@
+import hashlib
+import uuid
+from calendar import timegm
 from collections import OrderedDict
 
-from django.db import IntegrityError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date, quote_etag
+from django.utils.text import slugify
 from dateutil.parser import parse
 
 from rest_framework import viewsets, mixins, status, serializers
-from rest_framework.decorators import detail_route
+from rest_framework.decorators import detail_route, list_route
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
 from rest_framework_gis.filters import InBBoxFilter
 
-from grout import exceptions
+from grout import (exceptions, exports, fieldsets, flatgeobuf, notifications, result_cache,
+                   routers, shards, sync)
 from grout.models import (Boundary,
                           BoundaryPolygon,
                           Record,
+                          RecordExport,
                           RecordType,
                           RecordSchema)
 from grout.serializers import (BoundarySerializer,
                                BoundaryPolygonSerializer,
                                BoundaryPolygonNoGeomSerializer,
+                               RecordExportSerializer,
                                RecordSerializer,
+                               RecordGeoJSONSerializer,
+                               RecordTombstoneSerializer,
                                RecordTypeSerializer,
-                               RecordSchemaSerializer)
+                               RecordSQLSerializer,
+                               RecordValuesSerializer,
+                               SQL,
+                               record_list_engine,
+                               RecordSchemaSerializer,
+                               GEOJSON_PRECISION)
 from grout.filters import (BoundaryFilter,
                            BoundaryPolygonFilter,
                            JsonBFilterBackend,
@@ -29,9 +48,293 @@ from grout.filters import (BoundaryFilter,
                            RecordTypeFilter)
 
 from grout.pagination import OptionalLimitOffsetPagination
+from grout.renderers import FlatGeobufRenderer, GeoJSONRenderer, RawJSONRenderer
 
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
-class BoundaryPolygonViewSet(viewsets.ModelViewSet):
+# How long clients may cache a RecordSchema that has been superseded, in seconds.
+SUPERSEDED_SCHEMA_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def wait_for_change(request, channel, key, aliases=(DEFAULT_DB_ALIAS,)):
+    """
+    Respond once `key` on a notification channel (see grout.notifications) changes after
+    the `since` query parameter, or after `timeout` seconds. The response says whether
+    anything changed, and gives the `since` to use for the next request.
+    """
+    try:
+        since = request.query_params.get('since')
+        since = float(since) if since else None
+    except ValueError:
+        raise exceptions.QueryParameterException('since', 'a timestamp from an earlier response')
+    try:
+        timeout = float(request.query_params.get('timeout', notifications.DEFAULT_WAIT_SECONDS))
+        if not 0 <= timeout <= notifications.MAX_WAIT_SECONDS:
+            raise ValueError
+    except ValueError:
+        raise exceptions.QueryParameterException(
+            'timeout', 'a number of seconds up to {0}'.format(notifications.MAX_WAIT_SECONDS))
+
+    changed, checked = notifications.wait_for_change(channel, key, since, timeout, aliases)
+    return Response(OrderedDict((('changed', changed), ('since', checked))))
+
+
+def listing_validators(request, queryset):
+    """
+    Return the ETag of a listing of `queryset`, which is based on the number of objects
+    that match the request and on the time that the most recent of them was modified,
+    and that time.
+    """
+    summary = queryset.aggregate(count=Count('pk'), modified=Max('modified'))
+    etag = quote_etag(hashlib.md5('{path}:{media_type}:{count}:{modified}'.format(
+        path=request.get_full_path(), media_type=request.accepted_media_type,
+        count=summary['count'], modified=summary['modified']
+    ).encode('utf-8')).hexdigest())
+    return etag, summary['modified']
+
+
+class ReplicaReadMixin(object):
+    """
+    Read from a replica database (see grout.routers) while handling safe requests, unless
+    the client has written recently. Clients that write are pinned to the primary database
+    with a cookie, so that they read their own writes.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            routers.start_replica_reads(pinned=routers.PIN_COOKIE in request.COOKIES)
+        super(ReplicaReadMixin, self).initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        routers.stop_replica_reads()
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(routers.PIN_COOKIE, '1',
+                                max_age=routers.replica_pin_seconds(), httponly=True)
+        return super(ReplicaReadMixin, self).finalize_response(request, response,
+                                                               *args, **kwargs)
+
+
+class ConditionalGetMixin(object):
+    """
+    Send ETag and Last-Modified headers, derived from `GroutModel.modified`, and answer
+    conditional requests for unchanged objects or listings with 304 Not Modified, without
+    serializing them.
+
+    The validators of a listing are based on the number of objects that match the
+    request and on the time that the most recent of them was modified.
+    """
+
+    def get_cache_control(self, instance):
+        """
+        Return the Cache-Control directives (as keyword arguments for
+        `patch_cache_control`) for the detail view of `instance`, if any.
+        """
+        return None
+
+    def get_detail_data(self, instance):
+        return self.get_serializer(instance).data
+
+    def set_validators(self, response, etag, modified):
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if modified is not None:
+                response['Last-Modified'] = http_date(timegm(modified.utctimetuple()))
+        return response
+
+    def conditional_response(self, request, etag, modified):
+        last_modified = timegm(modified.utctimetuple()) if modified is not None else None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # Query parameters (like sparse fieldsets) and the media type change the response,
+        # so they're part of the ETag along with the object's version.
+        etag = quote_etag(hashlib.md5('{path}:{media_type}:{pk}:{modified}'.format(
+            path=request.get_full_path(), media_type=request.accepted_media_type,
+            pk=instance.pk, modified=instance.modified.isoformat()
+        ).encode('utf-8')).hexdigest())
+        response = self.conditional_response(request, etag, instance.modified)
+        if response is None:
+            response = Response(self.get_detail_data(instance))
+            self.set_validators(response, etag, instance.modified)
+        cache_control = self.get_cache_control(instance)
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not hasattr(queryset, 'aggregate'):
+            # Records fanned out across shards can't be aggregated in one query.
+            return super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+
+        etag, modified = listing_validators(request, queryset)
+        not_modified = self.conditional_response(request, etag, modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        return self.set_validators(response, etag, modified)
+
+
+class CachedListMixin(object):
+    """
+    Serve listings from the result cache (see grout.result_cache), if it's on.
+
+    The ETag and Last-Modified headers of a listing (see ConditionalGetMixin, which has to
+    come after this mixin) are cached along with it, so that requests for a cached
+    listing, conditional or not, are answered without any queries.
+    """
+
+    def list(self, request, *args, **kwargs):
+        key = result_cache.cache_key(request)
+        if key is not None:
+            entry = result_cache.result_cache().get(key)
+            if entry is not None:
+                data, etag, last_modified = entry
+                response = None
+                if etag is not None or last_modified is not None:
+                    response = get_conditional_response(request, etag=etag,
+                                                        last_modified=last_modified)
+                if response is None:
+                    response = Response(data)
+                    if etag is not None:
+                        response['ETag'] = etag
+                    if last_modified is not None:
+                        response['Last-Modified'] = http_date(last_modified)
+                return response
+
+        response = super(CachedListMixin, self).list(request, *args, **kwargs)
+        if key is not None and response.status_code == status.HTTP_200_OK:
+            last_modified = response.get('Last-Modified')
+            entry = (response.data, response.get('ETag'),
+                     parse_http_date(last_modified) if last_modified else None)
+            result_cache.result_cache().set(key, entry, result_cache.result_cache_timeout())
+        return response
+
+
+class ValuesListMixin(object):
+    """
+    List objects with `values_serializer_class`, a fast path that serializes rows of
+    values rather than model instances, whenever the queryset can return them and the
+    view's serializer is the one that `values_serializer_class` mirrors.
+
+    JSON is rendered with RawJSONRenderer, so that listings can pass `jsonb` values
+    through from the database without decoding them.
+    """
+    values_serializer_class = None
+
+    def get_renderers(self):
+        return [RawJSONRenderer() if type(renderer) is JSONRenderer else renderer
+                for renderer in super(ValuesListMixin, self).get_renderers()]
+
+    def get_values_serializer(self, **kwargs):
+        return self.values_serializer_class(
+            raw_json=isinstance(self.request.accepted_renderer, RawJSONRenderer), **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.values_serializer_class is None or not hasattr(queryset, 'values_list'):
+            # Records fanned out across shards can only be listed as instances.
+            return super(ValuesListMixin, self).list(request, *args, **kwargs)
+        if self.get_serializer_class() is not self.values_serializer_class.serializer_class:
+            # A subclass that serializes objects differently has to serialize instances.
+            return super(ValuesListMixin, self).list(request, *args, **kwargs)
+
+        serializer = self.get_values_serializer()
+        rows = serializer.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
+
+
+class FlatGeobufMixin(object):
+    """
+    Offer the actions in `flatgeobuf_actions` as FlatGeobuf files (see grout.flatgeobuf),
+    with the properties in `flatgeobuf_columns`, for `?format=fgb` or an `Accept` header
+    of `application/flatgeobuf`.
+
+    Files aren't paginated. Clients that only need some of the features read the index at
+    the start of the file, and then the features they need, with `Range` requests, which
+    are answered with 206 Partial Content from the cached file (see `flatgeobuf_response`).
+    """
+    flatgeobuf_actions = ('list',)
+    flatgeobuf_columns = ()
+    flatgeobuf_geometry_field = 'geom'
+
+    def get_renderers(self):
+        renderers = super(FlatGeobufMixin, self).get_renderers()
+        if self.action in self.flatgeobuf_actions:
+            renderers.append(FlatGeobufRenderer())
+        return renderers
+
+    def accepts_flatgeobuf(self):
+        return isinstance(self.request.accepted_renderer, FlatGeobufRenderer)
+
+    def get_flatgeobuf(self, queryset):
+        return flatgeobuf.flatgeobuf(queryset, self.flatgeobuf_columns,
+                                     self.flatgeobuf_geometry_field)
+
+    def flatgeobuf_response(self, request, queryset):
+        """
+        Respond with the objects in `queryset` as a FlatGeobuf file, with ETag and
+        Last-Modified headers (see `listing_validators`), so that clients can make
+        conditional and `If-Range` requests. Files are cached by their ETag, so requests
+        for parts of a file that hasn't changed don't build it again.
+        """
+        etag, modified = listing_validators(request, queryset)
+        last_modified = timegm(modified.utctimetuple()) if modified is not None else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        response = Response(flatgeobuf.cached_flatgeobuf(
+            etag, lambda: self.get_flatgeobuf(queryset)))
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not self.accepts_flatgeobuf():
+            return super(FlatGeobufMixin, self).list(request, *args, **kwargs)
+        return self.flatgeobuf_response(request, self.filter_queryset(self.get_queryset()))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(FlatGeobufMixin, self).finalize_response(request, response,
+                                                                  *args, **kwargs)
+        if not isinstance(getattr(response, 'accepted_renderer', None), FlatGeobufRenderer):
+            return response
+        if response.status_code >= 400:
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+            return response
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+        response['Accept-Ranges'] = 'bytes'
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and if_range not in (response.get('ETag'), response.get('Last-Modified')):
+            # The file has changed since the client read the rest of it.
+            return response
+        length = len(response.data)
+        try:
+            byte_range = flatgeobuf.parse_range(request.META.get('HTTP_RANGE'), length)
+        except flatgeobuf.RangeNotSatisfiable:
+            response.data = b''
+            response.status_code = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            response['Content-Range'] = 'bytes */{0}'.format(length)
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response.data = response.data[start:end + 1]
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(start, end, length)
+        return response
+
+
+class BoundaryPolygonViewSet(ReplicaReadMixin, FlatGeobufMixin, viewsets.ModelViewSet):
 
     queryset = BoundaryPolygon.objects.all()
     serializer_class = BoundaryPolygonSerializer
@@ -40,6 +343,7 @@ class BoundaryPolygonViewSet(viewsets.ModelViewSet):
     bbox_filter_field = 'geom'
     jsonb_filter_field = 'data'
     filter_backends = (InBBoxFilter, JsonBFilterBackend, DjangoFilterBackend)
+    flatgeobuf_columns = (('uuid', 'uuid'), ('boundary', 'boundary'), ('data', 'data'))
 
     def get_serializer_class(self):
         if 'nogeom' in self.request.query_params and self.request.query_params['nogeom']:
@@ -47,9 +351,11 @@ class BoundaryPolygonViewSet(viewsets.ModelViewSet):
         return BoundaryPolygonSerializer
 
 
-class RecordViewSet(viewsets.ModelViewSet):
+class RecordViewSet(ReplicaReadMixin, CachedListMixin, FlatGeobufMixin, ConditionalGetMixin,
+                    ValuesListMixin, viewsets.ModelViewSet):
     queryset = Record.objects.all()
     serializer_class = RecordSerializer
+    values_serializer_class = RecordValuesSerializer
     filter_class = RecordFilter
     bbox_filter_field = 'geom'
     jsonb_filter_field = 'data'
@@ -85,18 +391,242 @@ class RecordViewSet(viewsets.ModelViewSet):
                 }
                 raise serializers.ValidationError(messages)
 
-        return self.queryset
+        return self.get_fieldset().apply(self.queryset)
+
+    def get_fieldset(self):
+        """
+        Return the sparse fieldset (see grout.fieldsets) that the `fields` and `data_fields`
+        query parameters ask for, when listing or retrieving Records.
+        """
+        if (getattr(self, 'action', None) not in ('list', 'retrieve') or
+                self.request.method not in SAFE_METHODS):
+            # The browsable API builds its forms while handling safe requests, but with
+            # the request's method overridden.
+            return fieldsets.Fieldset(self.serializer_class)
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = fieldsets.Fieldset.from_query_params(self.request.query_params,
+                                                                 self.serializer_class)
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(self.get_fieldset().serializer_kwargs())
+        return super(RecordViewSet, self).get_serializer(*args, **kwargs)
+
+    def get_values_serializer(self, **kwargs):
+        """
+        Serialize listings in SQL if the project has opted in to it with the
+        RECORD_LIST_ENGINE setting, and if they're rendered as JSON.
+        """
+        kwargs.update(self.get_fieldset().serializer_kwargs())
+        if isinstance(self.request.accepted_renderer, GeoJSONRenderer):
+            kwargs.update(self.get_geojson_options())
+            return RecordGeoJSONSerializer(**kwargs)
+        if (record_list_engine() == SQL and
+                isinstance(self.request.accepted_renderer, RawJSONRenderer)):
+            return RecordSQLSerializer(**kwargs)
+        return super(RecordViewSet, self).get_values_serializer(**kwargs)
+
+    def get_renderers(self):
+        renderers = super(RecordViewSet, self).get_renderers()
+        # Only listings and details are Records that can be written as Features.
+        if self.action in ('list', 'retrieve'):
+            renderers.append(GeoJSONRenderer())
+        return renderers
+
+    def get_flatgeobuf(self, queryset):
+        """
+        Write the fields of the requested fieldset as properties of each feature.
+        """
+        columns = [(name, field.source) for name, field in self.get_serializer().fields.items()
+                   if name != self.flatgeobuf_geometry_field]
+        return flatgeobuf.flatgeobuf(queryset, columns, self.flatgeobuf_geometry_field)
+
+    def get_geojson_options(self):
+        """
+        Return the coordinate precision and spatial reference system that the `precision`
+        and `srid` query parameters ask for in GeoJSON.
+        """
+        try:
+            precision = int(self.request.query_params.get('precision', GEOJSON_PRECISION))
+            if not 0 <= precision <= GEOJSON_PRECISION:
+                raise ValueError
+        except ValueError:
+            raise exceptions.QueryParameterException(
+                'precision', 'an integer from 0 to {0}'.format(GEOJSON_PRECISION))
+
+        srid = self.request.query_params.get('srid')
+        if srid:
+            using = self.queryset.db
+            try:
+                srid = int(srid)
+                if not connections[using].ops.spatial_ref_sys().objects.using(using).filter(
+                        srid=srid).exists():
+                    raise ValueError
+            except ValueError:
+                raise exceptions.QueryParameterException('srid', 'a known spatial reference ID')
+        else:
+            srid = None
+        return {'precision': precision, 'srid': srid}
+
+    def get_paginated_response(self, data):
+        if not isinstance(self.request.accepted_renderer, GeoJSONRenderer):
+            return super(RecordViewSet, self).get_paginated_response(data)
+        # Paginate inside of the FeatureCollection, like rest_framework_gis does.
+        return Response(OrderedDict([
+            ('type', data['type']),
+            ('count', self.paginator.count),
+            ('next', self.paginator.get_next_link()),
+            ('previous', self.paginator.get_previous_link()),
+            ('features', data['features']),
+        ]))
+
+    def get_detail_data(self, instance):
+        if not isinstance(self.request.accepted_renderer, GeoJSONRenderer):
+            return super(RecordViewSet, self).get_detail_data(instance)
+        kwargs = self.get_fieldset().serializer_kwargs()
+        kwargs.update(self.get_geojson_options())
+        queryset = self.get_queryset().using(instance._state.db).filter(pk=instance.pk)
+        return RecordGeoJSONSerializer(**kwargs).detail(queryset)
+
+    def filter_queryset(self, queryset):
+        """
+        Read Records from the shard of the requested RecordType or, if no RecordType was
+        requested, from every shard.
+        """
+        queryset = super(RecordViewSet, self).filter_queryset(queryset)
+        if not shards.is_sharded():
+            return queryset
+        record_type = self.request.query_params.get('record_type')
+        if record_type:
+            return queryset.using(shards.shard_for_record_type(record_type))
+        if (self.action == 'list' and
+                isinstance(self.request.accepted_renderer,
+                           (GeoJSONRenderer, FlatGeobufRenderer))):
+            # GeoJSON and FlatGeobuf are built in the database, one shard at a time.
+            raise exceptions.QueryParameterException(
+                'record_type', 'a RecordType, to list sharded Records as {0}'.format(
+                    self.request.accepted_renderer.format))
+        return shards.FanOutQuerySet(queryset)
+
+    @list_route(methods=['get'])
+    def changes(self, request):
+        """
+        Return the Records that were created or changed, and the UUIDs of the Records that
+        were deleted, since the sync that returned the `since` token (or ever, without
+        one), along with the token for the next sync. If `more` is true, there are more
+        changes than `limit` to read with the new token right away.
+        """
+        positions = sync.decode_token(request.query_params.get('since'))
+
+        try:
+            limit = int(request.query_params.get('limit', sync.DEFAULT_SYNC_LIMIT))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            raise exceptions.QueryParameterException('limit', 'a positive integer')
+
+        record_type = request.query_params.get('record_type')
+        if record_type:
+            try:
+                record_type = uuid.UUID(record_type)
+            except ValueError:
+                raise exceptions.QueryParameterException('record_type', 'a UUID')
+        else:
+            record_type = None
+
+        records, tombstones, positions, more = sync.sync(positions, limit, record_type)
+        return Response(OrderedDict((
+            ('token', sync.encode_token(positions)),
+            ('more', more),
+            ('records', self.get_serializer(records, many=True).data),
+            ('deleted', RecordTombstoneSerializer(tombstones, many=True).data),
+        )))
+
+    @list_route(methods=['get'])
+    def export(self, request):
+        """
+        Stream the Records of the RecordType given by `record_type` that match the other
+        filters as CSV, with a column for each field of `data` and the geometry written as
+        WKT or, with `geometry=latlon`, as latitude and longitude columns.
+        """
+        try:
+            record_type = RecordType.objects.get(pk=request.query_params.get('record_type'))
+        except (RecordType.DoesNotExist, ValueError, DjangoValidationError):
+            raise exceptions.QueryParameterException('record_type', 'the UUID of a RecordType')
+        geometry_format = request.query_params.get('geometry', exports.WKT)
+        if geometry_format not in exports.GEOMETRY_FORMATS:
+            raise exceptions.QueryParameterException(
+                'geometry', 'one of: ' + ', '.join(exports.GEOMETRY_FORMATS))
+
+        table = exports.RecordTable(self.serializer_class,
+                                    exports.record_type_columns(record_type), geometry_format)
+        queryset = self.filter_queryset(self.get_queryset())
+        return exports.csv_response(table, queryset,
+                                    '{0}.csv'.format(slugify(record_type.plural_label)))
 
+    @list_route(methods=['get'])
+    def watch(self, request):
+        """
+        Wait for a Record of the RecordType given by `record_type` (or of any RecordType)
+        to change, instead of polling for changes.
+        """
+        record_type = request.query_params.get('record_type')
+        if record_type:
+            try:
+                record_type = str(uuid.UUID(record_type))
+            except ValueError:
+                raise exceptions.QueryParameterException('record_type', 'a UUID')
+            aliases = [shards.shard_for_record_type(record_type)]
+        else:
+            record_type = None
+            aliases = shards.shard_aliases() if shards.is_sharded() else [DEFAULT_DB_ALIAS]
+        return wait_for_change(request, notifications.RECORDS_CHANNEL, record_type, aliases)
+
+
+class RecordExportViewSet(viewsets.GenericViewSet,
+                          mixins.CreateModelMixin,
+                          mixins.ListModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.DestroyModelMixin):
+    """
+    Jobs that export Records to GeoPackages or Shapefiles (see grout.exports). Jobs are
+    created pending, and run by the `grout_exports` management command.
+    """
+    queryset = RecordExport.objects.all()
+    serializer_class = RecordExportSerializer
+    pagination_class = OptionalLimitOffsetPagination
 
-class RecordTypeViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        # Report invalid query parameters now, rather than when the export runs.
+        exports.filter_records(serializer.validated_data['record_type'],
+                               serializer.validated_data.get('query', {}))
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        if instance.file:
+            instance.file.delete(save=False)
+        instance.delete()
+
+
+class RecordTypeViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = RecordType.objects.all()
     serializer_class = RecordTypeSerializer
     filter_class = RecordTypeFilter
     pagination_class = OptionalLimitOffsetPagination
     ordering = ('plural_label',)
 
+    def get_queryset(self):
+        """
+        Annotate each RecordType with the UUID of its current schema.
+        """
+        current_schemas = RecordSchema.objects.filter(
+            record_type=OuterRef('pk')).order_by('-version').values('uuid')[:1]
+        return self.queryset.annotate(current_schema_uuid=Subquery(current_schemas))
+
 
-class SchemaViewSet(viewsets.GenericViewSet,
+class SchemaViewSet(ReplicaReadMixin,
+                    ConditionalGetMixin,
+                    viewsets.GenericViewSet,
                     mixins.ListModelMixin,
                     mixins.CreateModelMixin,
                     mixins.RetrieveModelMixin):  # Schemas are immutable
@@ -124,14 +654,24 @@ class RecordSchemaViewSet(SchemaViewSet):
             kwargs['data']['version'] = version
         return super(RecordSchemaViewSet, self).get_serializer(*args, **kwargs)
 
+    def get_cache_control(self, instance):
+        # A schema only changes when a new version supersedes it, after which it never
+        # changes again, so superseded schemas can be cached for good. Clients have to
+        # revalidate the current version.
+        if instance.next_version_id is not None:
+            return {'private': True, 'max_age': SUPERSEDED_SCHEMA_MAX_AGE}
+        return {'private': True, 'no_cache': True}
 
-class BoundaryViewSet(viewsets.ModelViewSet):
+
+class BoundaryViewSet(ReplicaReadMixin, FlatGeobufMixin, viewsets.ModelViewSet):
 
     queryset = Boundary.objects.all()
     serializer_class = BoundarySerializer
     filter_class = BoundaryFilter
     pagination_class = OptionalLimitOffsetPagination
     ordering = ('display_field',)
+    flatgeobuf_actions = ('geojson',)
+    flatgeobuf_columns = BoundaryPolygonViewSet.flatgeobuf_columns
 
     def create(self, request, *args, **kwargs):
         """Overwritten to allow use of semantically important/appropriate status codes for
@@ -142,15 +682,31 @@ class BoundaryViewSet(viewsets.ModelViewSet):
         except IntegrityError:
             return Response({'error': 'uniqueness constraint violation'}, status.HTTP_409_CONFLICT)
 
+    @list_route(methods=['get'])
+    def watch(self, request):
+        """
+        Wait for the Boundary given by `boundary` (or any Boundary) to change, instead of
+        polling for changes.
+        """
+        boundary = request.query_params.get('boundary')
+        if boundary:
+            try:
+                boundary = str(uuid.UUID(boundary))
+            except ValueError:
+                raise exceptions.QueryParameterException('boundary', 'a UUID')
+        return wait_for_change(request, notifications.BOUNDARIES_CHANNEL, boundary or None)
+
     @detail_route(methods=['get'])
     def geojson(self, request, pk=None):
         """ Print boundary polygons as geojson FeatureCollection
 
-        Pretty non-performant, and geojson responses get large quickly.
-        TODO: Consider other solutions
+        Pretty non-performant, and geojson responses get large quickly, so clients that
+        can read FlatGeobuf (with `?format=fgb`) should.
 
         """
         boundary = self.get_object()
+        if self.accepts_flatgeobuf():
+            return self.flatgeobuf_response(request, boundary.polygons.all())
         polygons = boundary.polygons.values()
         serializer = BoundaryPolygonSerializer()
         features = [serializer.to_representation(polygon) for polygon in polygons]
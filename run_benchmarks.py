@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+import importlib
+import os
+import sys
+import django
+
+sys.path.insert(0, './tests')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings_test')
+
+# Benchmark modules in the `benchmarks` package, in the order they run by default.
+BENCHMARKS = (
+    'filters',
+    'indexes',
+    'serializers',
+)
+
+
+if __name__ == '__main__':
+    django.setup()
+
+    from django.test.utils import setup_databases, teardown_databases
+
+    names = sys.argv[1:] or BENCHMARKS
+
+    # Benchmarks create a lot of rows, so run them in a throwaway database the same
+    # way that the test runner does.
+    old_config = setup_databases(verbosity=1, interactive=False, keepdb=False)
+    try:
+        from django.db import connection
+        connection.cursor().execute('CREATE EXTENSION IF NOT EXISTS postgis')
+
+        for name in names:
+            module = importlib.import_module('benchmarks.' + name)
+            print('\n== {0} ==\n'.format(name))
+            module.run()
+    finally:
+        teardown_databases(old_config, verbosity=1)
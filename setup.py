@@ -18,7 +18,7 @@ setup(
     url='https://github.com/azavea/grout',
     license='MIT',
     keywords='gis jsonschema',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     python_requires=">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*",
     install_requires=[
         'Django >=1.11, <=2.1',
@@ -34,6 +34,10 @@ setup(
         'requests >=2.8.1',
         'six >= 1.1.0'
     ],
+    extras_require={
+        # Match the version of GDAL that's installed, like `GDAL==$(gdal-config --version)`.
+        'exports': ['GDAL', 'pyarrow >=1.0; python_version >= "3.6"'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Topic :: Database',
@@ -1,13 +1,27 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals, absolute_import
-from django.test import TestCase
+import re
+
+import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
 
 from jsonb_field_testing.models import JsonBModel
 
 from grout.lookups import (FilterTree,
+                           GIN_OPCLASS_OPERATORS,
+                           JSONPATH_MIN_PG_VERSION,
+                           JsonPathFilterTree,
+                           LRUCache,
+                           compile_filter_tree,
+                           compiled_filter_cache,
                            extract_value_at_path,
-                           contains_key_at_path)
+                           contains_key_at_path,
+                           filter_tree_class,
+                           normalize_tree)
 
 
 class JsonBFilterTests(TestCase):
@@ -466,3 +480,218 @@ class JsonBFilterTests(TestCase):
         result = FilterTree.split_search_pattern('hello world"')
         # The unpaired quote is trimmed off
         self.assertEqual(result, ['hello', 'world'])
+
+    def test_or_group_sql(self):
+        """Test that the subtrees of an `_or` group are ORed together at the group's path"""
+        filt = {'a': {'_or': [{'b': self.mock_int_rule}, {'c': self.mock_contains_rule}]}}
+        self.assertEqual(FilterTree(filt, 'data').sql(),
+                         ('((((data @> %s OR data @> %s)) OR '
+                          '(((data->%s->>%s)::int <= %s AND (data->%s->>%s)::int >= %s))))',
+                          ('{"a": {"c": "test1"}}', '{"a": {"c": "a thing"}}',
+                           'a', 'b', 5, 'a', 'b', 1)))
+
+    def test_not_group_sql(self):
+        """Test that `_not` groups treat missing fields as not matching"""
+        filt = {'_not': {'a': self.mock_contains_rule}}
+        self.assertEqual(FilterTree(filt, 'data').sql(),
+                         ('((NOT COALESCE(((data @> %s OR data @> %s)), false)))',
+                          ('{"a": "test1"}', '{"a": "a thing"}')))
+
+    def test_predicates_ordered_by_cost(self):
+        """Test that containment predicates are emitted before range predicates"""
+        filt = {'a': self.mock_int_rule, 'b': self.mock_contains_rule}
+        sql_str, sql_params = FilterTree(filt, 'data').sql()
+        self.assertLess(sql_str.index('@>'), sql_str.index('::int'))
+        self.assertEqual(sql_params[:2], ('{"b": "test1"}', '{"b": "a thing"}'))
+
+    def test_empty_group(self):
+        """Test that groups without any rules don't add filters"""
+        self.assertEqual(FilterTree({'_or': []}, 'data').sql(), ('', ()))
+
+    def test_malformed_group(self):
+        """Test that groups must contain a list of subtrees"""
+        with self.assertRaises(ValueError):
+            FilterTree({'_or': {'a': self.mock_contains_rule}}, 'data')
+
+    def test_or_group_query(self):
+        JsonBModel.objects.create(data={'a': {'b': 1, 'c': 'zog'}})
+        JsonBModel.objects.create(data={'a': {'b': 2000, 'c': 'dog'}})
+        JsonBModel.objects.create(data={'a': {'b': 2000, 'c': 'zog'}})
+
+        filt = {'a': {'_or': [{'b': {'_rule_type': 'intrange', 'max': 5}},
+                              {'c': {'_rule_type': 'containment', 'contains': ['dog']}}]}}
+        query = JsonBModel.objects.filter(data__jsonb=filt)
+        self.assertEqual(query.count(), 2)
+
+    def test_nested_groups_query(self):
+        JsonBModel.objects.create(data={'a': {'b': 1, 'c': 'zog'}})
+        JsonBModel.objects.create(data={'a': {'b': 2000, 'c': 'dog'}})
+        JsonBModel.objects.create(data={'a': {'b': 2000}})
+
+        filt = {'a': {'_and': [{'b': {'_rule_type': 'intrange', 'min': 1000}},
+                               {'_not': {'c': {'_rule_type': 'containment',
+                                               'contains': ['dog']}}}]}}
+        query = JsonBModel.objects.filter(data__jsonb=filt)
+        self.assertEqual(query.count(), 1)
+
+    def test_normalize_deduplicates_values(self):
+        """Test that duplicate contained values are dropped, keeping their order"""
+        rule = {'_rule_type': 'containment', 'contains': ['b', 'a', 'b']}
+        self.assertEqual(normalize_tree({'x': rule}),
+                         {'x': {'_rule_type': 'containment', 'contains': ['b', 'a']}})
+
+    def test_normalize_merges_ranges(self):
+        """Test that ANDed ranges on the same path are intersected"""
+        filt = {'a': {'_and': [{'b': {'_rule_type': 'intrange', 'min': 1, 'max': 10}},
+                               {'b': {'_rule_type': 'intrange', 'min': 3, 'max': None}}]}}
+        self.assertEqual(normalize_tree(filt),
+                         {'a': {'b': {'_rule_type': 'intrange', 'min': 3, 'max': 10}}})
+
+    def test_normalize_keeps_conflicting_conjuncts(self):
+        """Test that ANDed rules which can't be merged are kept in the group"""
+        first = {'b': {'_rule_type': 'containment', 'contains': ['x']}}
+        second = {'b': {'_rule_type': 'containment', 'contains': ['y']}}
+        self.assertEqual(normalize_tree({'a': {'_and': [first, second]}}),
+                         {'a': {'b': first['b'], '_and': [second]}})
+
+    def test_normalize_keeps_pattern_conjuncts(self):
+        """Test that ANDed subtrees with text patterns still each have to match"""
+        JsonBModel.objects.create(data={'a': {'b': 'beegels', 'c': 'seeds'}})
+        JsonBModel.objects.create(data={'a': {'b': 'beegels', 'c': 'bees'}})
+        first = {'b': {'_rule_type': 'containment', 'pattern': 'bee'}}
+        second = {'c': {'_rule_type': 'containment', 'pattern': 'bee'}}
+        filt = {'a': {'_and': [first, second]}}
+        self.assertEqual(normalize_tree(filt), {'a': {'b': first['b'], '_and': [second]}})
+
+        separately = (JsonBModel.objects.filter(data__jsonb={'a': first})
+                      .filter(data__jsonb={'a': second}))
+        self.assertEqual(list(JsonBModel.objects.filter(data__jsonb=filt)), list(separately))
+        self.assertEqual(separately.count(), 1)
+
+    def test_compile_filter_tree_memoized(self):
+        """Test that equivalent trees share a single compiled entry"""
+        compiled_filter_cache.clear()
+        first = compile_filter_tree({'a': self.mock_contains_rule, 'b': self.mock_int_rule},
+                                    'data')
+        second = compile_filter_tree({'b': self.mock_int_rule,
+                                      'a': {'_rule_type': 'containment',
+                                            'contains': ['test1', 'a thing', 'test1']}},
+                                     'data')
+        self.assertEqual(first, second)
+        self.assertEqual(len(compiled_filter_cache), 1)
+
+        compile_filter_tree({'a': self.mock_contains_rule}, 'other_field')
+        self.assertEqual(len(compiled_filter_cache), 2)
+
+    def test_lru_cache_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+
+class JsonPathFilterTests(TestCase):
+    def setUp(self):
+        self.int_rule = {'_rule_type': 'intrange', 'min': 1, 'max': 5}
+        self.contains_rule = {'_rule_type': 'containment', 'contains': ['test1', 'a thing']}
+
+    def require_jsonpath(self):
+        if connection.pg_version < JSONPATH_MIN_PG_VERSION:
+            self.skipTest('jsonpath requires PostgreSQL 12 or later')
+
+    def test_containment_sql(self):
+        tree = JsonPathFilterTree({'a': {'b': self.contains_rule}}, 'data')
+        self.assertEqual(tree.sql(),
+                         ('(data @? %s)',
+                          ('strict $ ? ((@."a"."b" == "test1") || (@."a"."b" == "a thing"))',)))
+
+    def test_multiple_containment_sql(self):
+        rule = {'_rule_type': 'containment_multiple', 'contains': ['dog']}
+        tree = JsonPathFilterTree({'a': {'b': {'c': rule}}}, 'data')
+        self.assertEqual(tree.sql(),
+                         ('(data @? %s)',
+                          ('strict $ ? ((exists(@."a"."b"[*] ? (@."c" == "dog"))))',)))
+
+    def test_intrange_sql(self):
+        """Test that range rules keep the classic expression"""
+        tree = JsonPathFilterTree({'a': self.int_rule}, 'data')
+        self.assertEqual(tree.sql(), FilterTree({'a': self.int_rule}, 'data').sql())
+
+    def test_rules_combined_into_one_expression(self):
+        """Test that ANDed containment rules are evaluated by a single jsonpath predicate"""
+        tree = JsonPathFilterTree({'a': self.contains_rule, 'b': self.contains_rule}, 'data')
+        self.assertEqual(tree.sql(),
+                         ('(data @? %s)',
+                          ('strict $ ? (((@."a" == "test1") || (@."a" == "a thing")) && '
+                           '((@."b" == "test1") || (@."b" == "a thing")))',)))
+
+    def test_non_scalar_containment_falls_back(self):
+        """Test that objects in `contains` are compiled to classic containment"""
+        rule = {'_rule_type': 'containment', 'contains': [{'c': 1}]}
+        tree = JsonPathFilterTree({'a': {'b': rule}}, 'data')
+        self.assertEqual(tree.sql(), ('((data @> %s))', ('{"a": {"b": {"c": 1}}}',)))
+
+    def test_containment_query(self):
+        self.require_jsonpath()
+        JsonBModel.objects.create(data={'a': {'b': {'c': 1}}})
+        JsonBModel.objects.create(data={'a': {'b': {'c': 2000}}})
+        JsonBModel.objects.create(data={'a': {'b': {'c': [3, 4]}}})
+
+        filt = {'a': {'b': {'c': {'_rule_type': 'containment', 'contains': [1, 2, 3]}}}}
+        sql_str, sql_params = JsonPathFilterTree(filt, 'data').sql()
+        self.assertEqual(JsonBModel.objects.extra(where=[sql_str], params=sql_params).count(), 1)
+
+    def test_nested_arrays_match_containment(self):
+        """Test that jsonpath and `@>` predicates match the same documents with arrays"""
+        self.require_jsonpath()
+        for data in ({'a': {'b': 'x'}}, {'a': {'b': ['x', 'y']}}, {'a': {'b': [['x']]}},
+                     {'a': [{'b': 'x'}]}, {'a': [{'b': ['x']}]}, {'a': {'b': [{'c': 'x'}, 1]}},
+                     {'a': {'b': [{'c': ['x', 'y']}, {'c': 'y'}]}}, {'a': {'b': {'c': 'x'}}}):
+            JsonBModel.objects.create(data=data)
+
+        containment = {'_rule_type': 'containment', 'contains': ['x', ['x', 'y']]}
+        multiple = {'_rule_type': 'containment_multiple', 'contains': ['x', ['x', 'y']]}
+        for filt in ({'a': {'b': containment}}, {'a': {'b': {'c': multiple}}}):
+            results = []
+            for tree_class in (FilterTree, JsonPathFilterTree):
+                sql_str, sql_params = tree_class(filt, 'data').sql()
+                results.append(set(JsonBModel.objects.extra(where=[sql_str], params=sql_params)
+                                   .values_list('pk', flat=True)))
+            self.assertEqual(results[0], results[1])
+            self.assertTrue(results[0])
+
+
+class FilterTreeClassTests(TestCase):
+    def setUp(self):
+        self.tree = {'a': {'_rule_type': 'containment', 'contains': ['x', ['y']]},
+                     'b': {'f': {'_rule_type': 'containment_multiple', 'contains': ['z'],
+                                 'pattern': 'z'}},
+                     'c': {'_rule_type': 'intrange', 'min': 1, 'max': 5},
+                     '_not': {'d': {'_rule_type': 'containment', 'contains': [{'e': 1}]}}}
+
+    def test_generators_only_emit_declared_operators(self):
+        """Test that each generator only emits the jsonb operators it declares"""
+        jsonb_operator = re.compile(r'(@>|@\?|@@|\?\||\?&|\?)')
+        for tree_class in (FilterTree, JsonPathFilterTree):
+            sql_str, sql_params = tree_class(self.tree, 'data').sql()
+            operators = set(jsonb_operator.findall(sql_str))
+            self.assertTrue(operators)
+            self.assertLessEqual(operators, set(tree_class.indexed_operators))
+            self.assertLessEqual(operators, set(GIN_OPCLASS_OPERATORS['jsonb_path_ops']))
+
+    def test_class_chosen_by_server_version(self):
+        self.assertIs(filter_tree_class(mock.Mock(pg_version=100003)), FilterTree)
+        self.assertIs(filter_tree_class(mock.Mock(pg_version=120001)), JsonPathFilterTree)
+
+    @override_settings(GROUT={'SRID': 4326, 'JSONB_INDEX_OPCLASS': 'jsonb_path_ops'})
+    def test_class_with_path_ops_index(self):
+        self.assertIs(filter_tree_class(mock.Mock(pg_version=120001)), JsonPathFilterTree)
+
+    @override_settings(GROUT={'SRID': 4326, 'JSONB_INDEX_OPCLASS': 'btree'})
+    def test_invalid_opclass(self):
+        with self.assertRaises(ImproperlyConfigured):
+            filter_tree_class(mock.Mock(pg_version=120001))
@@ -143,6 +143,22 @@ class DateFilterBackendTestCase(TestCase):
                              expected_count,
                              test)
 
+    def test_occurred_range(self):
+        """Test that the occurred range follows occurred_from and occurred_to."""
+        record = self.min_to_mid_date_record
+        record.refresh_from_db()
+        self.assertEqual((record.occurred.lower, record.occurred.upper),
+                         (self.min_date, self.mid_date))
+        self.assertTrue(record.occurred.lower_inc and record.occurred.upper_inc)
+
+        self.nontemporal_record.refresh_from_db()
+        self.assertIsNone(self.nontemporal_record.occurred)
+
+        # Bulk updates skip Record.save(), so the trigger has to keep the range in sync.
+        models.Record.objects.filter(pk=record.pk).update(occurred_to=self.max_date)
+        record.refresh_from_db()
+        self.assertEqual(record.occurred.upper, self.max_date)
+
     def test_missing_min_max(self):
         """
         Test that forgetting both `occurred_min` and `occurred_max` returns all records,
@@ -0,0 +1,233 @@
+import csv
+import datetime
+import io
+import time
+from unittest import skipUnless
+
+import django
+import mock
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import Point
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from rest_framework import status
+
+from grout.exports import (WKB, Heartbeat, RecordTable, claim_export, export_timeout,
+                           record_type_columns, run_export, schema_columns)
+from grout.models import Record, RecordExport, RecordSchema, RecordType
+from grout.serializers import RecordSerializer
+from tests.api_test_case import GroutAPITestCase
+
+try:
+    from osgeo import ogr
+except ImportError:
+    ogr = None
+
+try:
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+if django.VERSION < (2, 0):
+    from django.core.urlresolvers import reverse
+else:
+    from django.urls import reverse
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'fooDetails': {'$ref': '#/definitions/fooDetails', 'propertyOrder': 0},
+        'person': {'type': 'array', 'items': {'$ref': '#/definitions/person'},
+                   'propertyOrder': 1},
+    },
+    'definitions': {
+        'fooDetails': {
+            'type': 'object',
+            'properties': {
+                'Severity': {'type': 'string', 'enum': ['Fatal', 'Minor'], 'propertyOrder': 1},
+                'Count': {'type': 'integer', 'propertyOrder': 0},
+            },
+        },
+        'person': {'type': 'object', 'properties': {'Name': {'type': 'string'}}},
+    },
+}
+
+
+class SchemaPathsTestCase(SimpleTestCase):
+
+    def test_schema_columns(self):
+        """Test that fields are listed in display order, with arrays as single fields"""
+        self.assertEqual(schema_columns(SCHEMA), [(['fooDetails', 'Count'], 'integer'),
+                                                  (['fooDetails', 'Severity'], 'string'),
+                                                  (['person'], 'array')])
+
+
+class RecordExportFixtures(GroutAPITestCase):
+
+    def setUp(self):
+        super(RecordExportFixtures, self).setUp()
+        self.record_type = RecordType.objects.create(label='Foo', plural_label='Foos')
+        old_schema = RecordSchema.objects.create(
+            record_type=self.record_type, version=1,
+            schema={'type': 'object', 'properties': {'Old': {'type': 'string'}}})
+        schema = RecordSchema.objects.create(record_type=self.record_type, version=2,
+                                             schema=SCHEMA)
+        old_schema.next_version = schema
+        old_schema.save()
+        Record.objects.create(
+            schema=schema, geom=Point(-75.16, 39.95), location_text=u'caf\xe9',
+            occurred_from=timezone.now(), occurred_to=timezone.now(),
+            data={'fooDetails': {'Severity': 'Fatal', 'Count': 2},
+                  'person': [{'Name': 'A'}]})
+        Record.objects.create(schema=old_schema, geom=Point(0, 0), archived=True,
+                              occurred_from=timezone.now(), occurred_to=timezone.now(),
+                              data={'Old': 'b'})
+
+
+class RecordExportTestCase(RecordExportFixtures):
+
+    def export(self, params):
+        response = self.client.get(reverse('record-export'),
+                                   dict(params, record_type=str(self.record_type.pk)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('foos.csv', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_export(self):
+        rows = self.export({'archived': 'False'})
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row['fooDetails.Severity'], 'Fatal')
+        self.assertEqual(row['fooDetails.Count'], '2')
+        self.assertEqual(row['person'], '[{"Name": "A"}]')
+        self.assertEqual(row['Old'], '')
+        self.assertEqual(row['location_text'], u'caf\xe9')
+        self.assertEqual(row['geom'], 'POINT(-75.16 39.95)')
+        self.assertNotIn('data', row)
+
+    def test_older_schema_fields(self):
+        rows = self.export({'archived': 'True'})
+        self.assertEqual([row['Old'] for row in rows], ['b'])
+
+    def test_latlon(self):
+        row, = self.export({'archived': 'False', 'geometry': 'latlon'})
+        self.assertEqual((float(row['lat']), float(row['lon'])), (39.95, -75.16))
+        self.assertNotIn('geom', row)
+
+    def test_invalid_parameters(self):
+        url = reverse('record-export')
+        for params in ({}, {'record_type': 'foo'},
+                       {'record_type': str(self.record_type.pk), 'geometry': 'kml'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecordExportJobTestCase(RecordExportFixtures):
+
+    def create_export(self, data):
+        data = dict(data, record_type=str(self.record_type.pk))
+        return self.client.post(reverse('recordexport-list'), data, format='json')
+
+    def test_create(self):
+        response = self.create_export({'file_format': 'gpkg', 'query': {'archived': 'False'}})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], RecordExport.StatusTypes.PENDING)
+
+        export = claim_export()
+        self.assertEqual(str(export.pk), response.data['uuid'])
+        self.assertEqual(export.status, RecordExport.StatusTypes.PROCESSING)
+        self.assertIsNone(claim_export())
+
+    def test_reclaim_abandoned_export(self):
+        """Test that an export whose process stopped sending heartbeats is claimed again"""
+        self.create_export({'file_format': 'gpkg', 'query': {}})
+        export = claim_export()
+        self.assertIsNone(claim_export())
+        RecordExport.objects.filter(pk=export.pk).update(
+            heartbeat=timezone.now() - datetime.timedelta(seconds=export_timeout() + 1))
+        self.assertEqual(claim_export().pk, export.pk)
+
+    def test_typed_mismatch_falls_back_to_text(self):
+        """Test that typed fields with values their type can't hold are read as text"""
+        def read_counts():
+            table = RecordTable(RecordSerializer, record_type_columns(self.record_type), WKB,
+                                typed=True)
+            queryset = Record.objects.filter(archived=False).order_by('created')
+            table.fall_back_to_text(queryset)
+            index = table.header.index('fooDetails.Count')
+            return table.types[index], [row[index] for row in table.rows(queryset)]
+
+        self.assertEqual(read_counts(), ('integer', [2]))
+        schema = RecordSchema.objects.get(record_type=self.record_type, version=2)
+        for count in ('3', 1.5, 10 ** 30):
+            Record.objects.create(schema=schema, geom=Point(0, 0),
+                                  occurred_from=timezone.now(), occurred_to=timezone.now(),
+                                  data={'fooDetails': {'Count': count}})
+            column_type, counts = read_counts()
+            self.assertEqual(column_type, 'string')
+            self.assertEqual(counts[-1], str(count))
+
+    @override_settings(GROUT={'SRID': 4326, 'EXPORT_TIMEOUT': 0.03})
+    def test_heartbeat_between_progress(self):
+        """Test that running exports send heartbeats while they don't record progress"""
+        self.create_export({'file_format': 'gpkg', 'query': {}})
+        export = claim_export()
+        with mock.patch('grout.exports.touch_heartbeat') as touch_heartbeat:
+            heartbeat = Heartbeat(export)
+            heartbeat.start()
+            time.sleep(0.1)
+            heartbeat.stop()
+        touch_heartbeat.assert_called_with(export.pk)
+
+    def test_invalid_query(self):
+        for query in ({'jsonb': '{'}, {'archived': True}, ['archived']):
+            response = self.create_export({'file_format': 'gpkg', 'query': query})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(RecordExport.objects.exists())
+
+    @skipUnless(ogr, 'The Python bindings for GDAL are not installed')
+    def test_run_export(self):
+        for file_format in ('gpkg', 'shp'):
+            response = self.create_export({'file_format': file_format,
+                                           'query': {'archived': 'False'}})
+            export = RecordExport.objects.get(pk=response.data['uuid'])
+            run_export(export)
+            export.refresh_from_db()
+            self.assertEqual(export.status, RecordExport.StatusTypes.COMPLETE, export.errors)
+            self.assertEqual((export.total, export.written), (1, 1))
+
+        layer = DataSource(RecordExport.objects.get(file_format='gpkg').file.path)[0]
+        self.assertEqual(len(layer), 1)
+        feature = layer[0]
+        self.assertEqual(feature.get('fooDetails.Severity'), 'Fatal')
+        self.assertEqual(feature.geom.coords, (-75.16, 39.95))
+
+    @skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_run_columnar_export(self):
+        for file_format in ('parquet', 'arrow'):
+            response = self.create_export({'file_format': file_format,
+                                           'query': {'archived': 'False'}})
+            export = RecordExport.objects.get(pk=response.data['uuid'])
+            run_export(export)
+            export.refresh_from_db()
+            self.assertEqual(export.status, RecordExport.StatusTypes.COMPLETE, export.errors)
+            self.assertEqual((export.total, export.written), (1, 1))
+
+        table = pyarrow.parquet.read_table(
+            RecordExport.objects.get(file_format='parquet').file.path)
+        self.assertEqual(table.schema.field('fooDetails.Count').type, pyarrow.int64())
+        self.assertEqual(table.schema.field('archived').type, pyarrow.bool_())
+        self.assertEqual(table.schema.field('geom').type, pyarrow.binary())
+        self.assertEqual(table.schema.field('created').type,
+                         pyarrow.timestamp('us', tz='UTC'))
+        self.assertIn(b'geo', table.schema.metadata)
+        row = table.to_pylist()[0]
+        self.assertEqual(row['fooDetails.Count'], 2)
+        self.assertEqual(row['fooDetails.Severity'], 'Fatal')
+        self.assertEqual(Point.from_ewkb(row['geom']).coords, (-75.16, 39.95))
+
+        arrow_file = RecordExport.objects.get(file_format='arrow').file.path
+        self.assertEqual(pyarrow.ipc.open_file(arrow_file).read_all().num_rows, 1)
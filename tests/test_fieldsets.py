@@ -0,0 +1,29 @@
+from collections import OrderedDict
+
+from django.test import SimpleTestCase
+
+from grout.exceptions import QueryParameterException
+from grout.fieldsets import parse_data_fields, parse_fields
+
+
+class ParseFieldsTestCase(SimpleTestCase):
+
+    def test_fields(self):
+        allowed = ['uuid', 'data', 'geom']
+        self.assertEqual(parse_fields('geom, uuid', allowed), ['uuid', 'geom'])
+        self.assertIsNone(parse_fields('', allowed))
+        with self.assertRaises(QueryParameterException):
+            parse_fields('uuid,owner', allowed)
+
+    def test_data_fields(self):
+        self.assertEqual(parse_data_fields('a.b, c, a.d'),
+                         OrderedDict([('a', OrderedDict([('b', None), ('d', None)])),
+                                      ('c', None)]))
+        self.assertIsNone(parse_data_fields(''))
+        with self.assertRaises(QueryParameterException):
+            parse_data_fields('a..b')
+
+    def test_whole_value_wins(self):
+        """Test that requesting a value makes requests for paths inside of it redundant"""
+        self.assertEqual(parse_data_fields('a.b,a'), OrderedDict([('a', None)]))
+        self.assertEqual(parse_data_fields('a,a.b'), OrderedDict([('a', None)]))
@@ -153,6 +153,12 @@ class JsonBFilterBackendTestCase(GroutAPITestCase):
                          0,
                          contains_res.content)
 
+    def test_malformed_group_filter(self):
+        """ Test that a malformed boolean group is reported as a parse error """
+        request = Request(self.factory.get('/foo/?jsonb={"_or": {"title": {}}}'))
+        with self.assertRaises(ParseError):
+            self.filter_backend.filter_queryset(request, self.queryset, self.viewset)
+
 
 class RecordQueryTestCase(GroutAPITestCase):
     """ Test Record queries """
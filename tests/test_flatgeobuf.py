@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+
+from grout.flatgeobuf import RangeNotSatisfiable, parse_range
+
+
+class ParseRangeTestCase(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 120), (0, 99))
+        self.assertEqual(parse_range('bytes=100-', 120), (100, 119))
+        self.assertEqual(parse_range('bytes=-10', 120), (110, 119))
+        self.assertEqual(parse_range('bytes=-500', 120), (0, 119))
+        self.assertEqual(parse_range('bytes=50-500', 120), (50, 119))
+
+    def test_ignored_ranges(self):
+        for header in (None, '', 'bytes=-', 'bytes=5-2', 'bytes=0-1,3-4', 'items=0-1'):
+            self.assertIsNone(parse_range(header, 120))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=-0', 'bytes=200-', 'bytes=120-130'):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 120)
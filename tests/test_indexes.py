@@ -0,0 +1,77 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from grout import indexes
+from grout.lookups import FilterTree
+from grout.models import RecordSchema, RecordType
+
+
+CAT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'catDetails': {'$ref': '#/definitions/catDetails'},
+        'owner': {'type': 'array', 'items': {'$ref': '#/definitions/owner'}},
+    },
+    'definitions': {
+        'catDetails': {
+            'type': 'object',
+            'properties': {
+                'Name': {'type': 'string', 'isSearchable': True},
+                'Age': {'type': 'integer', 'isSearchable': True},
+                'Breed': {'type': 'string', 'enum': ['Tabby', 'Bobtail']},
+                'Notes': {'type': 'string', 'isSearchable': False},
+            }
+        },
+        'owner': {
+            'type': 'object',
+            'properties': {'Name': {'type': 'string'}}
+        },
+    }
+}
+
+
+class IndexAdvisorTestCase(TestCase):
+
+    def setUp(self):
+        self.record_type = RecordType.objects.create(label='cat', plural_label='cats')
+        RecordSchema.objects.create(record_type=self.record_type, version=1, schema=CAT_SCHEMA)
+
+    def test_schema_fields(self):
+        """Test that only searchable, non-enum fields outside of arrays are indexed"""
+        self.assertEqual(indexes.schema_fields(CAT_SCHEMA),
+                         [(['catDetails', 'Age'], indexes.BTREE),
+                          (['catDetails', 'Name'], indexes.TRIGRAM)])
+
+    def test_filter_usage(self):
+        trees = [
+            {'catDetails': {'Age': {'_rule_type': 'intrange', 'min': 1}}},
+            {'catDetails': {'_or': [{'Age': {'_rule_type': 'intrange', 'max': 4}},
+                                    {'Name': {'_rule_type': 'containment', 'pattern': 'tom'}}]}},
+        ]
+        self.assertEqual(indexes.filter_usage(trees),
+                         {(('catDetails', 'Age'), indexes.BTREE): 2,
+                          (('catDetails', 'Name'), indexes.TRIGRAM): 1})
+
+    def test_propose_with_usage(self):
+        usage = {(('catDetails', 'Age'), indexes.BTREE): 3}
+        proposals = indexes.propose_indexes(usage)
+        self.assertEqual(proposals,
+                         [indexes.IndexProposal(indexes.BTREE, ['catDetails', 'Age'], 3)])
+        self.assertEqual(indexes.propose_indexes(usage, min_uses=4), [])
+
+    def test_expression_matches_filter(self):
+        """Test that the indexed expression is the one that filters compile to"""
+        proposal = indexes.IndexProposal(indexes.BTREE, ['catDetails', 'Age'], None)
+        rule = {'_rule_type': 'intrange', 'min': 1}
+        sql_str, sql_params = FilterTree({'catDetails': {'Age': rule}}, 'data').sql()
+        with connection.cursor() as cursor:
+            compiled = cursor.mogrify(sql_str, sql_params).decode('utf-8')
+            self.assertIn(proposal.expression(cursor), compiled)
+
+    def test_command_lists_proposals(self):
+        out = StringIO()
+        call_command('grout_indexes', stdout=out)
+        self.assertIn('catDetails -> Age', out.getvalue())
+        self.assertIn('gin_trgm_ops', out.getvalue())
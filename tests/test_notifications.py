@@ -0,0 +1,90 @@
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from grout import notifications, partitions
+from grout.models import Record, RecordSchema, RecordType
+
+if django.VERSION < (2, 0):
+    from django.core.urlresolvers import reverse
+else:
+    from django.urls import reverse
+
+
+class NotificationsTestCase(APITransactionTestCase):
+    """
+    Write in separate transactions, since notifications are only sent on commit.
+    """
+
+    def setUp(self):
+        super(NotificationsTestCase, self).setUp()
+        self.user = User.objects.create_superuser('admin', 'grout@azavea.com', '123')
+        self.client.force_authenticate(user=self.user)
+        self.record_type = RecordType.objects.create(label='foo', plural_label='foos',
+                                                     geometry_type='none', temporal=False)
+        self.schema = RecordSchema.objects.create(schema={'type': 'object'}, version=1,
+                                                  record_type=self.record_type)
+        notifications.start_listeners([DEFAULT_DB_ALIAS])
+        with notifications.condition:
+            self.assertTrue(notifications.wait_for_listeners([DEFAULT_DB_ALIAS],
+                                                             time.time() + 5))
+        self.since = time.time()
+
+    def tearDown(self):
+        notifications.stop_listeners()
+        super(NotificationsTestCase, self).tearDown()
+
+    def test_record_changed(self):
+        Record.objects.create(schema=self.schema, data={})
+        changed, since = notifications.wait_for_change(
+            notifications.RECORDS_CHANNEL, str(self.record_type.pk), self.since, timeout=5)
+        self.assertTrue(changed)
+        self.assertGreater(since, self.since)
+
+        # The change has been heard about, so waiting again times out.
+        changed, _ = notifications.wait_for_change(
+            notifications.RECORDS_CHANNEL, str(self.record_type.pk), since, timeout=0.1)
+        self.assertFalse(changed)
+
+    def test_record_changed_after_rebuild(self):
+        """Test that Records still send notifications once their table is rebuilt"""
+        if connection.pg_version < partitions.PARTITION_MIN_PG_VERSION:
+            self.skipTest('Partitioning requires PostgreSQL 11')
+        for rebuild, args in ((partitions.partition_table, (partitions.MONTH, 0)),
+                              (partitions.unpartition_table, ())):
+            with transaction.atomic(), connection.cursor() as cursor:
+                rebuild(cursor, *args)
+            since = time.time()
+            Record.objects.create(schema=self.schema, data={})
+            changed, _ = notifications.wait_for_change(
+                notifications.RECORDS_CHANNEL, str(self.record_type.pk), since, timeout=5)
+            self.assertTrue(changed)
+
+    def test_other_record_type(self):
+        other_type = RecordType.objects.create(label='bar', plural_label='bars')
+        Record.objects.create(schema=self.schema, data={})
+        changed, _ = notifications.wait_for_change(
+            notifications.RECORDS_CHANNEL, str(other_type.pk), self.since, timeout=0.5)
+        self.assertFalse(changed)
+
+    def test_watch(self):
+        url = reverse('record-watch')
+        Record.objects.create(schema=self.schema, data={})
+        response = self.client.get(url, {'record_type': str(self.record_type.pk),
+                                         'since': self.since, 'timeout': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['changed'])
+
+        response = self.client.get(url, {'since': response.data['since'], 'timeout': 0})
+        self.assertFalse(response.data['changed'])
+
+    def test_watch_invalid_parameters(self):
+        url = reverse('record-watch')
+        for params in ({'since': 'yesterday'}, {'timeout': 3600}, {'record_type': 'foo'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
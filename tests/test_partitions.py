@@ -0,0 +1,86 @@
+import datetime
+from dateutil.parser import parse
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from grout import partitions
+from grout.models import Record, RecordSchema, RecordType
+
+
+class PartitionsTestCase(TestCase):
+
+    def setUp(self):
+        self.record_type = RecordType.objects.create(label='item', plural_label='items')
+        self.schema = RecordSchema.objects.create(record_type=self.record_type, version=1,
+                                                  schema={})
+        self.record = Record.objects.create(schema=self.schema, data={}, geom='POINT (0 0)',
+                                            occurred_from=parse('2017-12-03T00:00:00+00:00'),
+                                            occurred_to=parse('2017-12-04T00:00:00+00:00'))
+
+    def skip_unless_partitioning(self):
+        if connection.pg_version < partitions.PARTITION_MIN_PG_VERSION:
+            self.skipTest('Partitioning requires PostgreSQL 11')
+
+    @override_settings(GROUT={'SRID': 4326, 'PARTITION_RECORDS': 'year'})
+    def test_invalid_strategy(self):
+        with self.assertRaises(ImproperlyConfigured):
+            partitions.partition_strategy()
+
+    def test_month_partition(self):
+        self.assertEqual(partitions.add_months(datetime.date(2017, 12, 1), 1),
+                         datetime.date(2018, 1, 1))
+        self.assertEqual(partitions.month_partition(datetime.date(2017, 12, 1)),
+                         ('grout_record_y2017m12',
+                          ['2017-12-01 00:00:00+00', '2018-01-01 00:00:00+00']))
+
+    def test_partition_by_month(self):
+        """Test that Records survive partitioning and land in the partition for their month"""
+        self.skip_unless_partitioning()
+        with connection.cursor() as cursor:
+            partitions.partition_table(cursor, partitions.MONTH, months_ahead=0)
+            self.assertTrue(partitions.is_partitioned(cursor))
+            names = [name for name, _ in partitions.list_partitions(cursor)]
+            self.assertIn('grout_record_y2017m12', names)
+            self.assertIn(partitions.DEFAULT_PARTITION, names)
+
+            cursor.execute('SELECT uuid FROM grout_record_y2017m12')
+            self.assertEqual(cursor.fetchall(), [(self.record.pk,)])
+
+            partitions.unpartition_table(cursor)
+            self.assertFalse(partitions.is_partitioned(cursor))
+        self.assertEqual(Record.objects.get().pk, self.record.pk)
+
+    def test_maintain_partitions(self):
+        """Test that Records of a new RecordType are moved out of the default partition"""
+        self.skip_unless_partitioning()
+        with connection.cursor() as cursor:
+            partitions.partition_table(cursor, partitions.RECORD_TYPE)
+            cursor.execute('SELECT uuid FROM {0}'.format(
+                partitions.record_type_partition(self.record_type.pk)[0]))
+            self.assertEqual(cursor.fetchall(), [(self.record.pk,)])
+
+            record_type = RecordType.objects.create(label='other', plural_label='others')
+            schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+            record = Record.objects.create(schema=schema, data={}, geom='POINT (0 0)',
+                                           occurred_from=self.record.occurred_from,
+                                           occurred_to=self.record.occurred_to)
+            cursor.execute('SELECT uuid FROM {0}'.format(partitions.DEFAULT_PARTITION))
+            self.assertEqual(cursor.fetchall(), [(record.pk,)])
+
+            name, _ = partitions.record_type_partition(record_type.pk)
+            self.assertEqual(partitions.maintain_partitions(cursor, partitions.RECORD_TYPE),
+                             [name])
+            cursor.execute('SELECT uuid FROM {0}'.format(name))
+            self.assertEqual(cursor.fetchall(), [(record.pk,)])
+
+    def test_inbound_foreign_keys(self):
+        """Test that the table isn't rebuilt while other tables reference it"""
+        self.skip_unless_partitioning()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE test_record_note '
+                           '(record_id uuid REFERENCES grout_record (uuid))')
+            with self.assertRaises(ImproperlyConfigured):
+                partitions.partition_table(cursor, partitions.MONTH)
+            self.assertFalse(partitions.is_partitioned(cursor))
+        self.assertEqual(Record.objects.get().pk, self.record.pk)
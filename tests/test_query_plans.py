@@ -0,0 +1,96 @@
+"""
+Check that the queries behind the default Record listing are answered from indexes.
+
+Query plans depend on table statistics, so these tests load a large synthetic dataset
+and are skipped unless the number of rows to load is set in the GROUT_QUERY_PLAN_ROWS
+environment variable. Run them with `./scripts/test plans`.
+"""
+import os
+from unittest import SkipTest
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from grout.models import RecordSchema, RecordType
+from grout.views import RecordViewSet
+
+ROW_COUNT = int(os.environ.get('GROUT_QUERY_PLAN_ROWS', 0))
+RECORD_TYPE_COUNT = 50
+
+load_records_sql = """
+INSERT INTO grout_record (uuid, created, modified, schema_id, record_type_id, data, archived,
+                          occurred_from, occurred_to, geom)
+SELECT md5(i::text)::uuid,
+       now() - i * interval '1 minute',
+       now() - i * interval '1 minute',
+       schemas[i %% array_length(schemas, 1) + 1],
+       record_types[i %% array_length(record_types, 1) + 1],
+       '{}'::jsonb,
+       i %% 20 = 0,
+       now() - i * interval '1 minute',
+       now() - i * interval '1 minute',
+       ST_SetSRID(ST_MakePoint(random() * 360 - 180, random() * 180 - 90), 4326)
+FROM generate_series(1, %s) AS i,
+     (SELECT %s::uuid[] AS schemas, %s::uuid[] AS record_types) AS ids
+"""
+
+
+class RecordListingQueryPlanTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if not ROW_COUNT:
+            raise SkipTest('Set GROUT_QUERY_PLAN_ROWS to run query plan tests')
+        super(RecordListingQueryPlanTestCase, cls).setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.record_types = [RecordType.objects.create(label='Type {0}'.format(i),
+                                                      plural_label='Types {0}'.format(i))
+                            for i in range(RECORD_TYPE_COUNT)]
+        schemas = [RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+                   for record_type in cls.record_types]
+        with connection.cursor() as cursor:
+            cursor.execute(load_records_sql, [ROW_COUNT,
+                                              [str(schema.pk) for schema in schemas],
+                                              [str(schema.record_type_id) for schema in schemas]])
+            cursor.execute('ANALYZE grout_record')
+
+    def listing_queryset(self, params):
+        """
+        Return the queryset that RecordViewSet lists for a request with query `params`.
+        """
+        request = Request(APIRequestFactory().get('/api/records/', params))
+        view = RecordViewSet(request=request, format_kwarg=None, action='list', kwargs={})
+        return view.filter_queryset(view.get_queryset())
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertPageUsesIndex(self, params):
+        plan = self.explain(self.listing_queryset(params)[:10])
+        self.assertIn('Index Scan', plan, plan)
+        self.assertNotIn('Sort', plan, plan)
+
+    def assertCountUsesIndex(self, params):
+        plan = self.explain(self.listing_queryset(params).order_by().values('pk'))
+        self.assertIn('Index', plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_active_records_of_type(self):
+        params = {'archived': 'False', 'record_type': str(self.record_types[0].pk)}
+        self.assertPageUsesIndex(params)
+        self.assertCountUsesIndex(params)
+
+    def test_records_of_type(self):
+        params = {'record_type': str(self.record_types[0].pk)}
+        self.assertPageUsesIndex(params)
+        self.assertCountUsesIndex(params)
+
+    def test_active_records(self):
+        self.assertPageUsesIndex({'archived': 'False'})
@@ -1,6 +1,7 @@
 
+from django.core.cache import cache
 from django.db import IntegrityError, transaction
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from grout.models import RecordSchema, RecordType
 
@@ -16,3 +17,17 @@ class RecordSchemaTestCase(TestCase):
 
         self.assertEqual(record_type.get_current_schema().version, 2)
         self.assertIsNone(empty_record_type.get_current_schema())
+
+    @override_settings(GROUT={'SRID': 4326, 'SCHEMA_CACHE': 'default'})
+    def test_schema_registry(self):
+        """Test that current schemas are cached until a new version is saved"""
+        cache.clear()
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        RecordSchema.objects.create(schema={}, version=1, record_type=record_type)
+
+        self.assertEqual(record_type.get_current_schema().version, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(record_type.get_current_schema().version, 1)
+
+        RecordSchema.objects.create(schema={}, version=2, record_type=record_type)
+        self.assertEqual(record_type.get_current_schema().version, 2)
@@ -137,3 +137,23 @@ class RecordValidationTestCase(GroutAPITestCase):
             )
 
         self.assertEqual(msg, expected_msg, response.content)
+
+    def test_record_type_follows_schema(self):
+        """
+        Test that a Record stores the RecordType of its schema.
+        """
+        data = {
+            'schema': self.record_schema.uuid,
+            'occurred_from': timezone.now(),
+            'occurred_to': timezone.now(),
+            'geom': 'POINT(0 0)',
+            'archived': False,
+            'data': {'id': 1, 'name': 'foo'},
+        }
+
+        response = self.client.post(self.record_endpt, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+        record_uuid = json.loads(response.content.decode('utf-8'))['uuid']
+        record = models.Record.objects.get(uuid=record_uuid)
+        self.assertEqual(record.record_type_id, self.record_type.uuid)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import json
+
+from django.test import SimpleTestCase
+
+from grout.renderers import RawJSON, RawJSONRenderer
+
+
+class RawJSONRendererTestCase(SimpleTestCase):
+
+    def test_splice(self):
+        data = {'results': [{'data': RawJSON(u'{"a": [1, 2], "b": "café"}'), 'name': 'x'}]}
+        rendered = RawJSONRenderer().render(data)
+        self.assertIn(b'{"a": [1, 2], "b": "caf\xc3\xa9"}', rendered)
+        self.assertEqual(json.loads(rendered.decode('utf-8')),
+                         {'results': [{'data': {'a': [1, 2], 'b': u'café'}, 'name': 'x'}]})
+
+    def test_escapes_line_separators(self):
+        rendered = RawJSONRenderer().render([RawJSON(u'"\u2028"')])
+        self.assertEqual(rendered, b'["\\u2028"]')
+
+    def test_ensure_ascii(self):
+        renderer = RawJSONRenderer()
+        renderer.ensure_ascii = True
+        rendered = renderer.render([RawJSON(u'"café"')])
+        self.assertEqual(rendered, b'["caf\\u00e9"]')
@@ -0,0 +1,93 @@
+import json
+
+import django
+import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+
+from grout import result_cache
+from grout.models import Record, RecordSchema, RecordType
+from tests.api_test_case import GroutAPITestCase
+
+if django.VERSION < (2, 0):
+    from django.core.urlresolvers import reverse
+else:
+    from django.urls import reverse
+
+
+@override_settings(GROUT={'SRID': 4326, 'RESULT_CACHE': 'default'})
+class ResultCacheTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(ResultCacheTestCase, self).setUp()
+        cache.clear()
+        self.record_type = RecordType.objects.create(label='item', plural_label='items')
+        self.schema = RecordSchema.objects.create(record_type=self.record_type, version=1,
+                                                  schema={})
+        self.url = reverse('record-list')
+
+    def create_record(self):
+        return Record.objects.create(schema=self.schema, data={'name': 'foo'},
+                                     geom='POINT (0 0)', occurred_from=timezone.now(),
+                                     occurred_to=timezone.now())
+
+    def get_count(self, params):
+        response = self.client.get(self.url, params)
+        return json.loads(response.content.decode('utf-8'))['count']
+
+    def test_cached_listing(self):
+        """Test that a repeated listing is served from the cache until a Record changes"""
+        params = {'record_type': str(self.record_type.pk)}
+        self.create_record()
+        self.assertEqual(self.get_count(params), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_count(params), 1)
+
+        self.create_record()
+        self.assertEqual(self.get_count(params), 2)
+        self.assertEqual(self.get_count({}), 2)
+
+    def test_cached_validators(self):
+        """Test that conditional requests for a cached listing don't need any queries"""
+        self.create_record()
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_noncanonical_record_type(self):
+        """Test that listings for a RecordType UUID in any format are invalidated"""
+        params = {'record_type': self.record_type.pk.hex.upper()}
+        self.assertEqual(self.get_count(params), 0)
+        self.create_record()
+        self.assertEqual(self.get_count(params), 1)
+
+    def test_bumped_on_commit(self):
+        """Test that listings cached before a write commits are invalidated when it does"""
+        request = self.client.get(self.url).renderer_context['request']
+        with mock.patch('grout.result_cache.transaction.on_commit') as on_commit:
+            self.create_record()
+        key = result_cache.cache_key(request)
+        on_commit.call_args[0][0]()
+        self.assertNotEqual(result_cache.cache_key(request), key)
+
+    def test_cached_per_user(self):
+        """Test that a listing cached for one user isn't served to another"""
+        request = self.client.get(self.url).renderer_context['request']
+        self.client.force_authenticate(user=User.objects.create_user('other'))
+        other_request = self.client.get(self.url).renderer_context['request']
+        self.assertNotEqual(result_cache.cache_key(request),
+                            result_cache.cache_key(other_request))
+
+    def test_equivalent_filters_share_key(self):
+        """Test that filter trees that normalize to the same tree share a cache entry"""
+        filters = ['{"name": {"_rule_type": "containment", "contains": ["foo"]}}',
+                   '{"name": {"contains": ["foo", "foo"], "_rule_type": "containment"}}']
+        responses = [self.client.get(self.url, {'jsonb': tree}) for tree in filters]
+        keys = [result_cache.cache_key(response.renderer_context['request'])
+                for response in responses]
+        self.assertEqual(keys[0], keys[1])
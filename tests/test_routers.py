@@ -0,0 +1,62 @@
+import django
+import mock
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+
+from grout import routers
+from grout.models import Record
+from tests.api_test_case import GroutAPITestCase
+
+if django.VERSION < (2, 0):
+    from django.core.urlresolvers import reverse
+else:
+    from django.urls import reverse
+
+REPLICA_SETTINGS = {'SRID': 4326, 'READ_REPLICAS': ['replica']}
+
+
+@override_settings(GROUT=REPLICA_SETTINGS)
+class ReplicaRouterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def tearDown(self):
+        routers.stop_replica_reads()
+
+    def test_reads_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(Record))
+        routers.start_replica_reads()
+        self.assertEqual(self.router.db_for_read(Record), 'replica')
+        # Only Grout models are read from replicas.
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_write_pins_to_primary(self):
+        routers.start_replica_reads()
+        self.assertIsNone(self.router.db_for_write(Record))
+        self.assertIsNone(self.router.db_for_read(Record))
+
+    def test_pinned_reads(self):
+        routers.start_replica_reads(pinned=True)
+        self.assertIsNone(self.router.db_for_read(Record))
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'grout'))
+        self.assertIsNone(self.router.allow_migrate('default', 'grout'))
+
+
+class ReplicaReadViewTestCase(GroutAPITestCase):
+
+    def test_write_pins_client(self):
+        """Test that a client that writes reads from the primary database afterwards"""
+        url = reverse('recordtype-list')
+        with mock.patch('grout.routers.start_replica_reads') as start_replica_reads:
+            self.client.get(url)
+            start_replica_reads.assert_called_with(pinned=False)
+
+            response = self.client.post(url, {'label': 'foo', 'plural_label': 'foos'},
+                                        format='json')
+            self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+            self.client.get(url)
+            start_replica_reads.assert_called_with(pinned=True)
@@ -0,0 +1,81 @@
+import json
+
+from django.contrib.gis.geos import LinearRing, Point, Polygon
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from grout.models import Record, RecordSchema, RecordType
+from grout.renderers import RawJSONRenderer
+from grout.serializers import RecordSerializer, RecordSQLSerializer, RecordValuesSerializer
+
+
+class RecordValuesSerializerTestCase(TestCase):
+
+    def assertSameRepresentation(self, queryset):
+        serializer = RecordValuesSerializer()
+        fast = serializer.to_representation(serializer.values(queryset))
+        slow = RecordSerializer(queryset, many=True).data
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(slow))
+
+        # Raw jsonb text is formatted differently, but holds the same values.
+        serializer = RecordValuesSerializer(raw_json=True)
+        raw = RawJSONRenderer().render(serializer.to_representation(serializer.values(queryset)))
+        self.assertEqual(json.loads(raw.decode('utf-8')),
+                         json.loads(JSONRenderer().render(slow).decode('utf-8')))
+
+        serializer = RecordSQLSerializer()
+        page = RawJSONRenderer().render(serializer.to_representation(serializer.values(queryset)))
+        self.assertEqual(json.loads(page.decode('utf-8')),
+                         json.loads(JSONRenderer().render(slow).decode('utf-8')))
+
+    def test_point_records(self):
+        record_type = RecordType.objects.create(label='Point', plural_label='Points')
+        schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+        Record.objects.create(schema=schema, data={'Details': {'Name': u'caf\xe9', 'Count': 3}},
+                              occurred_from=timezone.now(), occurred_to=timezone.now(),
+                              geom=Point(-75.163611234567, 39.952345678901),
+                              location_text='Philadelphia')
+        Record.objects.create(schema=schema, data={}, archived=True,
+                              occurred_from=timezone.now(), occurred_to=timezone.now(),
+                              geom=Point(0, 0))
+        self.assertSameRepresentation(Record.objects.all())
+
+    def test_integral_coordinates(self):
+        """Test that integral coordinates are rendered as floats, like GDAL writes them"""
+        record_type = RecordType.objects.create(label='Point', plural_label='Points')
+        schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+        Record.objects.create(schema=schema, data={}, occurred_from=timezone.now(),
+                              occurred_to=timezone.now(), geom=Point(0, 0))
+        serializer = RecordValuesSerializer()
+        fast = JSONRenderer().render(serializer.to_representation(
+            serializer.values(Record.objects.all())))
+        slow = JSONRenderer().render(RecordSerializer(Record.objects.all(), many=True).data)
+        self.assertEqual(fast, slow)
+        self.assertIn(b'"coordinates":[0.0,0.0]', fast)
+
+    def test_timestamps(self):
+        record_type = RecordType.objects.create(label='Point', plural_label='Points')
+        schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+        occurred = timezone.now()
+        Record.objects.create(schema=schema, data={}, geom=Point(0, 0),
+                              occurred_from=occurred.replace(microsecond=0),
+                              occurred_to=occurred.replace(microsecond=123400))
+        self.assertSameRepresentation(Record.objects.all())
+
+    def test_polygon_records(self):
+        record_type = RecordType.objects.create(label='Polygon', plural_label='Polygons',
+                                                geometry_type='polygon')
+        schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+        ring = LinearRing((0, 0), (0, 1.5), (1.25, 1.5), (1.25, 0), (0, 0))
+        Record.objects.create(schema=schema, data={}, occurred_from=timezone.now(),
+                              occurred_to=timezone.now(), geom=Polygon(ring))
+        self.assertSameRepresentation(Record.objects.all())
+
+    def test_nongeospatial_records(self):
+        record_type = RecordType.objects.create(label='None', plural_label='Nones',
+                                                geometry_type='none', temporal=False)
+        schema = RecordSchema.objects.create(record_type=record_type, version=1, schema={})
+        Record.objects.create(schema=schema, data={'list': [1, 2, 3]})
+        self.assertSameRepresentation(Record.objects.all())
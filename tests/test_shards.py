@@ -0,0 +1,77 @@
+import datetime
+from collections import namedtuple
+
+from django.test import SimpleTestCase, override_settings
+
+from grout import shards
+from grout.models import Record
+
+FakeRecord = namedtuple('FakeRecord', ['uuid', 'created'])
+
+RECORD_TYPE_ID = 'fe8ba3bc-7ee4-4a59-a8b0-f2b3e2b1e8f6'
+
+
+def place_everything(record_type_id):
+    return 'shard'
+
+
+class FakeQuerySet(object):
+    """
+    Stand in for a Record queryset, holding lists of Records for each database.
+    """
+    model = Record
+
+    def __init__(self, rows, alias='default'):
+        self.rows = rows
+        self.alias = alias
+
+    def using(self, alias):
+        return FakeQuerySet(self.rows, alias)
+
+    def count(self):
+        return len(self.rows[self.alias])
+
+    def __iter__(self):
+        return iter(self.rows[self.alias])
+
+    def __getitem__(self, key):
+        return self.rows[self.alias][key]
+
+    def get(self, uuid):
+        for record in self.rows[self.alias]:
+            if record.uuid == uuid:
+                return record
+        raise Record.DoesNotExist()
+
+
+@override_settings(GROUT={'SRID': 4326, 'SHARDS': ['shard'],
+                          'SHARD_PLACEMENT': {RECORD_TYPE_ID: 'shard'}})
+class ShardsTestCase(SimpleTestCase):
+
+    def setUp(self):
+        day = datetime.timedelta(days=1)
+        now = datetime.datetime(2018, 8, 1)
+        self.records = [FakeRecord(uuid=i, created=now - i * day) for i in range(5)]
+        self.queryset = shards.FanOutQuerySet(FakeQuerySet({
+            'default': [self.records[0], self.records[2], self.records[4]],
+            'shard': [self.records[1], self.records[3]],
+        }))
+
+    def test_placement(self):
+        self.assertEqual(shards.shard_for_record_type(RECORD_TYPE_ID), 'shard')
+        self.assertEqual(shards.shard_for_record_type('unplaced'), 'default')
+
+    @override_settings(GROUT={'SRID': 4326, 'SHARDS': ['shard'],
+                              'SHARD_PLACEMENT': 'tests.test_shards.place_everything'})
+    def test_placement_function(self):
+        self.assertEqual(shards.shard_for_record_type('unplaced'), 'shard')
+
+    def test_fan_out_merges_newest_first(self):
+        self.assertEqual(self.queryset.count(), 5)
+        self.assertEqual(self.queryset[1:3], self.records[1:3])
+        self.assertEqual(list(self.queryset), self.records)
+
+    def test_fan_out_get(self):
+        self.assertEqual(self.queryset.get(uuid=3), self.records[3])
+        with self.assertRaises(Record.DoesNotExist):
+            self.queryset.get(uuid=5)
@@ -0,0 +1,134 @@
+import datetime
+import uuid
+
+import django
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from grout import sync
+from grout.exceptions import QueryParameterException
+from grout.models import Record, RecordSchema, RecordTombstone, RecordType
+
+if django.VERSION < (2, 0):
+    from django.core.urlresolvers import reverse
+else:
+    from django.urls import reverse
+
+
+class SyncTokenTestCase(SimpleTestCase):
+
+    def test_round_trip(self):
+        positions = {'default': {sync.RECORDS: [12, 'fe8ba3bc-7ee4-4a59-a8b0-f2b3e2b1e8f6'],
+                                 sync.DELETED: [10, None]}}
+        self.assertEqual(sync.decode_token(sync.encode_token(positions)), positions)
+
+    def test_no_token(self):
+        self.assertEqual(sync.decode_token(None), {})
+
+    def test_invalid_token(self):
+        for token in ('not a token', sync.encode_token([1, 2]),
+                      sync.encode_token({'default': {sync.RECORDS: [1, 'x']}})):
+            with self.assertRaises(QueryParameterException):
+                sync.decode_token(token)
+
+
+    @override_settings(GROUT={'SRID': 4326, 'SYNC_TOKEN_MAX_AGE': -1})
+    def test_expired_token(self):
+        with self.assertRaises(QueryParameterException):
+            sync.decode_token(sync.encode_token({}))
+
+
+class PruneTombstonesTestCase(TestCase):
+
+    def test_prune_tombstones(self):
+        """Test that only tombstones older than every usable token are deleted"""
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        old, new = [RecordTombstone.objects.create(uuid=uuid.uuid4(), record_type=record_type.pk)
+                    for _ in range(2)]
+        age = datetime.timedelta(seconds=sync.sync_token_max_age())
+        RecordTombstone.objects.filter(pk=old.pk).update(
+            deleted=timezone.now() - age - sync.TOMBSTONE_PRUNE_MARGIN * 2)
+
+        # Saving a tombstone again doesn't move it past tokens that already cover it.
+        deleted = new.deleted
+        new.save()
+        new.refresh_from_db()
+        self.assertEqual(new.deleted, deleted)
+
+        self.assertEqual(sync.prune_tombstones(), 1)
+        self.assertEqual(list(RecordTombstone.objects.values_list('pk', flat=True)), [new.pk])
+
+
+class SyncViewTestCase(APITransactionTestCase):
+    """
+    Sync in separate transactions, since a sync only returns the changes of transactions
+    that have finished.
+    """
+
+    def setUp(self):
+        super(SyncViewTestCase, self).setUp()
+        self.user = User.objects.create_superuser('admin', 'grout@azavea.com', '123')
+        self.client.force_authenticate(user=self.user)
+        self.record_type = RecordType.objects.create(label='foo', plural_label='foos',
+                                                     geometry_type='none', temporal=False)
+        self.schema = RecordSchema.objects.create(schema={'type': 'object'}, version=1,
+                                                  record_type=self.record_type)
+        self.url = reverse('record-changes')
+
+    def create_record(self):
+        return Record.objects.create(schema=self.schema, data={})
+
+    def test_sync(self):
+        first = self.create_record()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([record['uuid'] for record in response.data['records']],
+                         [str(first.pk)])
+        self.assertFalse(response.data['more'])
+
+        # Nothing has changed since the last sync.
+        token = response.data['token']
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.data['records'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+        second = self.create_record()
+        first.data = {'changed': True}
+        first.save()
+        response = self.client.get(self.url, {'since': response.data['token']})
+        self.assertEqual(set(record['uuid'] for record in response.data['records']),
+                         set([str(first.pk), str(second.pk)]))
+
+        second.delete()
+        response = self.client.get(self.url, {'since': response.data['token']})
+        self.assertEqual(response.data['records'], [])
+        self.assertEqual([tombstone['uuid'] for tombstone in response.data['deleted']],
+                         [str(second.pk)])
+        self.assertTrue(RecordTombstone.objects.filter(pk=second.pk).exists())
+
+    def test_pages(self):
+        created = set(str(self.create_record().pk) for _ in range(3))
+        synced = set()
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertTrue(response.data['more'])
+        synced.update(record['uuid'] for record in response.data['records'])
+
+        response = self.client.get(self.url, {'limit': 2, 'since': response.data['token']})
+        self.assertFalse(response.data['more'])
+        synced.update(record['uuid'] for record in response.data['records'])
+        self.assertEqual(synced, created)
+
+    def test_record_type(self):
+        self.create_record()
+        other_type = RecordType.objects.create(label='bar', plural_label='bars')
+        response = self.client.get(self.url, {'record_type': str(other_type.pk)})
+        self.assertEqual(response.data['records'], [])
+
+    def test_invalid_parameters(self):
+        for params in ({'since': 'not a token'}, {'limit': 0}, {'record_type': 'foo'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
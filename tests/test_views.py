@@ -4,13 +4,18 @@ import json
 import django
 from django.contrib.gis.geos import (Point, Polygon, LinearRing, MultiPolygon,
                                     LineString)
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils import timezone
 
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.test import APIRequestFactory, force_authenticate
 
 from tests.api_test_case import GroutAPITestCase
+from grout.flatgeobuf import FLATGEOBUF_MIN_POSTGIS_VERSION
 from grout.models import (Boundary, BoundaryPolygon,
                           RecordSchema, RecordType, Record)
+from grout.serializers import RecordSerializer
 from grout.views import RecordViewSet
 from grout.exceptions import (GEOMETRY_TYPE_ERROR, DATETIME_REQUIRED,
                               DATETIME_NOT_PERMITTED, MIN_DATE_RANGE_ERROR,
@@ -21,6 +26,10 @@ if django.VERSION < (2, 0):
 else:
     from django.urls import reverse
 
+# The start of a FlatGeobuf file: "fgb" and the major version of the format.
+FLATGEOBUF_MAGIC = b'fgb\x03'
+
+
 class RecordSchemaViewTestCase(GroutAPITestCase):
 
     def setUp(self):
@@ -133,6 +142,22 @@ class RecordTypeViewTestCase(GroutAPITestCase):
                          str(new_record_schema.uuid),
                          response_data)
 
+    def test_list_queries(self):
+        """Test that listing RecordTypes takes the same number of queries for any number"""
+        url = reverse('recordtype-list')
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        RecordSchema.objects.create(schema=self.schema, version=1, record_type=record_type)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+
+        for label in ('bar', 'baz'):
+            record_type = RecordType.objects.create(label=label, plural_label=label + 's')
+            RecordSchema.objects.create(schema=self.schema, version=1, record_type=record_type)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        results = json.loads(response.content.decode('utf-8'))['results']
+        self.assertTrue(all(result['current_schema'] for result in results))
+
     def test_record_count(self):
         record_type = RecordType.objects.create(label='foo', plural_label='foos')
         record_schema = RecordSchema.objects.create(schema=self.schema,
@@ -808,3 +833,320 @@ class BoundaryPolygonViewTestCase(GroutAPITestCase):
         response = self.client.get(url, {'nogeom': True})
         self.assertIn('bbox', response.data)
         self.assertNotIn('geom', response.data)
+
+
+class ConditionalGetTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(ConditionalGetTestCase, self).setUp()
+        self.record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        self.schema = RecordSchema.objects.create(schema={'type': 'object'}, version=1,
+                                                  record_type=self.record_type)
+
+    def test_detail_not_modified(self):
+        """Test that a RecordType that hasn't changed isn't sent again"""
+        url = reverse('recordtype-detail', args=(self.record_type.pk,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = response['ETag']
+        self.record_type.label = 'bar'
+        self.record_type.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_new_schema_version_modifies_record_type(self):
+        """Test that a RecordType is sent again once it has a new current schema"""
+        url = reverse('recordtype-detail', args=(self.record_type.pk,))
+        etag = self.client.get(url)['ETag']
+        new_schema = RecordSchema.objects.create(schema={'type': 'object'}, version=2,
+                                                 record_type=self.record_type)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current_schema'], str(new_schema.pk))
+
+    def test_detail_etag_varies_with_representation(self):
+        """Test that different representations of an object have different ETags"""
+        record = Record.objects.create(schema=self.schema, data={}, geom=Point(0, 0),
+                                       occurred_from=timezone.now(),
+                                       occurred_to=timezone.now())
+        url = reverse('record-detail', args=(record.pk,))
+        etags = set(self.client.get(url, params)['ETag']
+                    for params in ({}, {'fields': 'uuid'}, {'format': 'geojson'}))
+        self.assertEqual(len(etags), 3)
+
+    def test_list_not_modified(self):
+        url = reverse('recordschema-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        RecordSchema.objects.create(schema={'type': 'object'}, version=2,
+                                    record_type=self.record_type)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_schema_cache_control(self):
+        """Test that only superseded schemas may be cached without revalidation"""
+        url = reverse('recordschema-detail', args=(self.schema.pk,))
+        self.assertIn('no-cache', self.client.get(url)['Cache-Control'])
+
+        new_schema = RecordSchema.objects.create(schema={'type': 'object'}, version=2,
+                                                 record_type=self.record_type)
+        self.schema.next_version = new_schema
+        self.schema.save()
+        self.assertIn('max-age=31536000', self.client.get(url)['Cache-Control'])
+
+
+class RecordListEngineTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(RecordListEngineTestCase, self).setUp()
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        schema = RecordSchema.objects.create(schema={}, version=1, record_type=record_type)
+        for x in range(3):
+            Record.objects.create(schema=schema, data={'x': x}, geom=Point(x, 0),
+                                  occurred_from=timezone.now(), occurred_to=timezone.now())
+
+    def test_sql_engine(self):
+        """Test that listings serialized in SQL match listings serialized in Python"""
+        url = reverse('record-list')
+        params = {'limit': 2, 'offset': 1}
+        python_listing = json.loads(self.client.get(url, params).content.decode('utf-8'))
+        with override_settings(GROUT={'SRID': 4326, 'RECORD_LIST_ENGINE': 'sql'}):
+            sql_listing = json.loads(self.client.get(url, params).content.decode('utf-8'))
+        self.assertEqual(sql_listing, python_listing)
+        self.assertEqual(len(sql_listing['results']), 2)
+
+    def test_custom_serializer(self):
+        """Test that subclasses with their own serializer list Records with it"""
+        class LabeledRecordSerializer(RecordSerializer):
+            label = serializers.SerializerMethodField()
+
+            def get_label(self, record):
+                return 'record'
+
+        class LabeledRecordViewSet(RecordViewSet):
+            serializer_class = LabeledRecordSerializer
+
+        request = APIRequestFactory().get('/records/', {'limit': 2})
+        force_authenticate(request, self.user)
+        response = LabeledRecordViewSet.as_view({'get': 'list'})(request).render()
+        results = json.loads(response.content.decode('utf-8'))['results']
+        self.assertEqual([record['label'] for record in results], ['record', 'record'])
+
+    def test_sql_engine_empty_pages(self):
+        """Test that empty listings and pages past the end are serialized in SQL"""
+        url = reverse('record-list')
+        for params in ({'limit': 2, 'archived': 'True'},
+                       {'limit': 2, 'offset': 10}):
+            with override_settings(GROUT={'SRID': 4326, 'RECORD_LIST_ENGINE': 'sql'}):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(response.content.decode('utf-8'))['results'], [])
+
+
+class SparseFieldsetTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(SparseFieldsetTestCase, self).setUp()
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        schema = RecordSchema.objects.create(schema={}, version=1, record_type=record_type)
+        self.record = Record.objects.create(
+            schema=schema, data={'Details': {'Name': 'a', 'Count': 1}, 'Notes': 'b'},
+            geom=Point(1, 0), occurred_from=timezone.now(), occurred_to=timezone.now())
+
+    def get_records(self, params):
+        response = self.client.get(reverse('record-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content.decode('utf-8'))['results']
+
+    def test_fields(self):
+        """Test that only the requested fields are returned, by every list engine"""
+        params = {'fields': 'geom,uuid', 'data_fields': 'Details.Name,Missing'}
+        expected = {'Details': {'Name': 'a'}, 'Missing': None}
+        for engine in ('python', 'sql'):
+            with override_settings(GROUT={'SRID': 4326, 'RECORD_LIST_ENGINE': engine}):
+                record, = self.get_records(params)
+            self.assertEqual(list(record), ['uuid', 'data', 'geom'])
+            self.assertEqual(record['data'], expected)
+            self.assertEqual(record['geom']['coordinates'], [1, 0])
+
+        response = self.client.get(reverse('record-detail', args=[self.record.pk]), params)
+        self.assertEqual(list(response.data), ['uuid', 'data', 'geom'])
+        self.assertEqual(response.data['data'], expected)
+
+    def test_deferred_columns(self):
+        """Test that columns outside of the fieldset aren't read"""
+        with CaptureQueriesContext(connection) as queries:
+            self.get_records({'fields': 'uuid'})
+        self.assertNotIn('"location_text"', queries.captured_queries[-1]['sql'])
+
+    def test_invalid_fields(self):
+        url = reverse('record-list')
+        for params in ({'fields': 'uuid,password'}, {'data_fields': 'Details..Name'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecordGeoJSONTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(RecordGeoJSONTestCase, self).setUp()
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        schema = RecordSchema.objects.create(schema={}, version=1, record_type=record_type)
+        self.record = Record.objects.create(
+            schema=schema, data={'x': 1}, geom=Point(-75.163611234567, 39.952345678901),
+            location_text='Philadelphia', occurred_from=timezone.now(),
+            occurred_to=timezone.now())
+
+    def get_geojson(self, url, params):
+        params = dict(params, format='geojson')
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_feature_collection(self):
+        collection = self.get_geojson(reverse('record-list'), {'precision': 3})
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(collection['count'], 1)
+        feature, = collection['features']
+        self.assertEqual(feature['type'], 'Feature')
+        self.assertEqual(feature['id'], str(self.record.pk))
+        self.assertEqual(feature['geometry'],
+                         {'type': 'Point', 'coordinates': [-75.164, 39.952]})
+        self.assertEqual(feature['properties']['data'], {'x': 1})
+        self.assertEqual(feature['properties']['location_text'], 'Philadelphia')
+        self.assertNotIn('geom', feature['properties'])
+
+    def test_empty_feature_collection(self):
+        for params in ({'archived': 'True'}, {'limit': 1, 'offset': 10}):
+            collection = self.get_geojson(reverse('record-list'), params)
+            self.assertEqual(collection['type'], 'FeatureCollection')
+            self.assertEqual(collection['features'], [])
+
+    def test_detail(self):
+        url = reverse('record-detail', args=[self.record.pk])
+        feature = self.get_geojson(url, {'fields': 'location_text'})
+        self.assertEqual(feature['id'], str(self.record.pk))
+        self.assertEqual(feature['properties'], {'location_text': 'Philadelphia'})
+
+    def test_srid(self):
+        collection = self.get_geojson(reverse('record-list'), {'srid': 3857, 'precision': 0})
+        geometry = collection['features'][0]['geometry']
+        self.assertEqual(geometry['crs']['properties']['name'], 'EPSG:3857')
+        self.assertEqual(geometry['coordinates'], [-8367175, 4859020])
+
+    def test_other_actions_not_acceptable(self):
+        """Test that responses other than Records can't be requested as GeoJSON"""
+        for url in (reverse('record-changes'), reverse('record-export')):
+            response = self.client.get(url, {'record_type': str(self.record.record_type_id)},
+                                       HTTP_ACCEPT='application/geo+json')
+            self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        response = self.client.post(reverse('record-list'), {}, format='json',
+                                    HTTP_ACCEPT='application/geo+json')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_invalid_parameters(self):
+        url = reverse('record-list')
+        for params in ({'precision': 16}, {'precision': 'a'}, {'srid': 999999},
+                       {'srid': 'wgs84'}):
+            response = self.client.get(url, dict(params, format='geojson'))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FlatGeobufTestCase(GroutAPITestCase):
+
+    def setUp(self):
+        super(FlatGeobufTestCase, self).setUp()
+        if connection.ops.spatial_version < FLATGEOBUF_MIN_POSTGIS_VERSION:
+            self.skipTest('FlatGeobuf output requires a newer version of PostGIS')
+        record_type = RecordType.objects.create(label='foo', plural_label='foos')
+        schema = RecordSchema.objects.create(schema={}, version=1, record_type=record_type)
+        for x in range(3):
+            Record.objects.create(schema=schema, data={'x': x}, geom=Point(x, x),
+                                  location_text='Philadelphia', occurred_from=timezone.now(),
+                                  occurred_to=timezone.now())
+        Record.objects.create(schema=schema, data={}, occurred_from=timezone.now(),
+                              occurred_to=timezone.now())
+
+    def get_flatgeobuf(self, url, params=None, **headers):
+        return self.client.get(url, dict(params or {}, format='fgb'), **headers)
+
+    def test_records(self):
+        response = self.get_flatgeobuf(reverse('record-list'), {'fields': 'uuid,data,geom'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.content[:4], FLATGEOBUF_MAGIC)
+        self.assertIn(b'location_text', self.get_flatgeobuf(reverse('record-list')).content)
+        self.assertNotIn(b'location_text', response.content)
+
+    def test_range(self):
+        url = reverse('record-list')
+        content = self.get_flatgeobuf(url).content
+        response = self.get_flatgeobuf(url, HTTP_RANGE='bytes=4-11')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 4-11/{0}'.format(len(content)))
+        self.assertEqual(response.content, content[4:12])
+
+        response = self.get_flatgeobuf(url, HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], 'bytes */{0}'.format(len(content)))
+
+        # Ranges of a file that has changed since the client's copy are ignored.
+        response = self.get_flatgeobuf(url, HTTP_RANGE='bytes=4-11', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, content)
+
+    @override_settings(GROUT={'SRID': 4326, 'FLATGEOBUF_CACHE': 'default'})
+    def test_ranges_read_cached_file(self):
+        """Test that range requests for an unchanged file don't build it again"""
+        url = reverse('record-list')
+        with CaptureQueriesContext(connection) as queries:
+            content = self.get_flatgeobuf(url).content
+            response = self.get_flatgeobuf(url, HTTP_RANGE='bytes=4-11')
+        self.assertEqual(response.content, content[4:12])
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if 'ST_AsFlatGeobuf' in query['sql']]), 1)
+
+    def test_boundary_polygon_validators(self):
+        boundary = Boundary.objects.create(label='fooOK', source_file='foo.zip',
+                                           status=Boundary.StatusTypes.COMPLETE)
+        coords = ((0, 0), (0, 1), (1, 1), (1, 0), (0, 0))
+        BoundaryPolygon.objects.create(data={'name': 'square'}, boundary=boundary,
+                                       geom=MultiPolygon(Polygon(LinearRing(coords))))
+        for url in (reverse('boundarypolygon-list'),
+                    '{}geojson/'.format(reverse('boundary-detail', args=[boundary.pk]))):
+            response = self.get_flatgeobuf(url)
+            self.assertIn('Last-Modified', response)
+            etag = response['ETag']
+            response = self.get_flatgeobuf(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            response = self.get_flatgeobuf(url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=etag)
+            self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(response.content, FLATGEOBUF_MAGIC)
+
+    def test_boundary_polygons(self):
+        boundary = Boundary.objects.create(label='fooOK', source_file='foo.zip',
+                                           status=Boundary.StatusTypes.COMPLETE)
+        coords = ((0, 0), (0, 1), (1, 1), (1, 0), (0, 0))
+        BoundaryPolygon.objects.create(data={'name': 'square'}, boundary=boundary,
+                                       geom=MultiPolygon(Polygon(LinearRing(coords))))
+        for url in (reverse('boundarypolygon-list'),
+                    '{}geojson/'.format(reverse('boundary-detail', args=[boundary.pk]))):
+            response = self.get_flatgeobuf(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+            self.assertEqual(response.content[:4], FLATGEOBUF_MAGIC)
+            self.assertIn(b'square', response.content)
+
+    def test_errors(self):
+        response = self.get_flatgeobuf(reverse('record-list'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Content-Type'], 'application/json')